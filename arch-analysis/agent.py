@@ -1,6 +1,7 @@
 import uuid
-from typing import Dict, Any, Callable, Optional
-from langgraph.types import Command
+from typing import Dict, Any, Callable, List, Optional
+from compaction import checkpoint_report
+from streaming import EventCallback, EventEmitter, full_text_callback
 
 class ArchitectureProcessor:
     """
@@ -8,168 +9,356 @@ class ArchitectureProcessor:
     This maintains state between calls to make the pattern clearer.
     """
     
-    def __init__(self, graph):
-        """Initialize with the LangGraph graph object"""
+    def __init__(self, graph, speculator=None, flush_interval: float = 0.05, flush_bytes: int = 512):
+        """
+        Initialize with the LangGraph graph object.
+
+        Args:
+            graph: The compiled agent workflow graph
+            speculator: Optional `Speculator` (e.g. `workflow.mermaid_speculator`) that
+                starts Mermaid generation in the background while human review is pending
+            flush_interval: Seconds over which streamed tokens are coalesced into one update
+                (0 delivers every token)
+            flush_bytes: Pending bytes after which an update is delivered regardless of time
+        """
         self.graph = graph
+        self.speculator = speculator
         self.thread_id = None
         self.thread_config = None
-    
+        self.tracer = None
+        self._speculated_spec = None
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+
+    def _speculate(self, state: Dict[str, Any]):
+        """Start speculative Mermaid generation for the architecture under review"""
+        # With a component model the diagram is compiled locally, nothing to speculate
+        if self.speculator and state.get("architecture_spec") and not state.get("architecture_model"):
+            if state["architecture_spec"] != self._speculated_spec:
+                self._discard_speculation()
+            self._speculated_spec = state["architecture_spec"]
+            self.speculator.submit(self._speculated_spec, session=self.thread_id)
+
+    def _discard_speculation(self):
+        """Drop speculative work for a spec that was not approved (no-op once it was used)"""
+        if self.speculator and self._speculated_spec:
+            self.speculator.discard(self._speculated_spec, session=self.thread_id)
+        self._speculated_spec = None
+
+    def close(self):
+        """
+        End the session: cancel its speculative work and delete its checkpoints.
+        The processor can start a new session afterwards.
+        """
+        self._end_speculation()
+        if self.thread_id and self.graph.checkpointer:
+            self.graph.checkpointer.delete_thread(self.thread_id)
+        self.thread_id = None
+        self.thread_config = None
+
+    def _end_speculation(self):
+        self._discard_speculation()
+        if self.speculator and self.thread_id:
+            self.speculator.discard_session(self.thread_id)
+
+    def _new_session(self):
+        """Start a new thread, traced unless ARCH_TRACING=0"""
+        from tracing import SessionTracer, tracing_enabled
+
+        self.thread_id = str(uuid.uuid4())
+        self.thread_config = {"configurable": {"thread_id": self.thread_id}}
+        self.tracer = SessionTracer(self.thread_id) if tracing_enabled() else None
+        if self.tracer:
+            self.thread_config["callbacks"] = [self.tracer.handler]
+
+    def _traced(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Export the spans of the call that produced `result` and attach the session summary"""
+        if self.tracer:
+            self.tracer.flush()
+            result["trace"] = self.tracer.summary()
+        return result
+
+    def checkpoint_report(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Checkpoint size per step of the current thread (see compaction.checkpoint_report)"""
+        if not self.thread_config:
+            return []
+        return checkpoint_report(self.graph, self.thread_config, limit=limit)
+
+    def _initial_state(self, user_input: str) -> Dict[str, Any]:
+        return {
+            "raw_input": user_input,
+            "refined_description": "",
+            "architecture_spec": "",
+            "mermaid_code": "",
+            "architecture_model": {},
+            "section_drafts": [],
+            "input_assessment": {},
+            "current_state": "",
+            "next_state": "",
+            "messages": [{"role": "user", "content": user_input}],
+            "human_feedback": []
+        }
+
+    def _emitter(
+        self,
+        message_callback: Optional[Callable[[str], None]],
+        event_callback: Optional[EventCallback]
+    ) -> EventEmitter:
+        """Emitter dispatching to the event callback and, through the full-text adapter, the message callback"""
+        callbacks = []
+        if event_callback:
+            callbacks.append(event_callback)
+        if message_callback:
+            callbacks.append(full_text_callback(message_callback))
+        return EventEmitter(callbacks, flush_interval=self.flush_interval, flush_bytes=self.flush_bytes)
+
+    @staticmethod
+    def _stream_modes(event_callback: Optional[EventCallback]) -> List[str]:
+        # Node start/end come from the debug stream, only requested when someone listens to them
+        return ["messages", "updates", "debug"] if event_callback else ["messages", "updates"]
+
+    @staticmethod
+    def _needs_review(state: Dict[str, Any]) -> bool:
+        return (state.get("next_state", "") == "human_review" or
+                state.get("current_state", "") == "human_review")
+
+    def _interrupted(self, emitter: EventEmitter, state: Dict[str, Any],
+                     status_callback: Optional[Callable[[str], None]], review_status: str) -> Dict[str, Any]:
+        if status_callback:
+            status_callback(review_status)
+
+        self._speculate(state)
+        emitter.interrupt(state)
+
+        # Return a status object with all necessary info
+        return self._traced({
+            "status": "feedback_required",
+            "message": emitter.message.text(),
+            "state": state
+        })
+
+    def _completed(self, emitter: EventEmitter, state: Dict[str, Any],
+                   status_callback: Optional[Callable[[str], None]]) -> Dict[str, Any]:
+        self._discard_speculation()
+        if status_callback:
+            status_callback("Architecture analysis completed!")
+
+        emitter.completed(state)
+        return self._traced({
+            "status": "completed",
+            "message": emitter.message.text(),
+            "state": state
+        })
+
     def start_processing(
         self, 
         user_input: str,
-        message_callback: Callable[[str], None],
-        status_callback: Optional[Callable[[str], None]] = None
+        message_callback: Optional[Callable[[str], None]] = None,
+        status_callback: Optional[Callable[[str], None]] = None,
+        event_callback: Optional[EventCallback] = None
     ) -> Dict[str, Any]:
         """
         Start processing an architecture request.
         
         Args:
             user_input: The initial user prompt as a string
-            message_callback: Function to call with message updates
+            message_callback: Function to call with the whole message so far
             status_callback: Function to call with status updates
+            event_callback: Function to call with streaming events (see streaming.py)
             
         Returns:
             Either the final state (dict) or a status object indicating feedback is needed
         """
+        # Free the checkpoints and speculative work of the previous run before starting a new thread
+        self.close()
+
         # Generate a thread ID for this session
-        self.thread_id = str(uuid.uuid4())
-        self.thread_config = {"configurable": {"thread_id": self.thread_id}}
-        
-        # Create the initial state
-        initial_state = {
-            "raw_input": user_input,
-            "refined_description": "",
-            "architecture_spec": "",
-            "mermaid_code": "",
-            "current_state": "",
-            "next_state": "",
-            "messages": [{"role": "user", "content": user_input}],
-            "human_feedback": []
-        }
+        self._new_session()
         
         if status_callback:
             status_callback("Analyzing architecture description...")
         
-        current_message = ""
+        return self._run(self._initial_state(user_input), message_callback, status_callback,
+                         event_callback, "Human review required")
+    
+    def continue_with_feedback(
+        self,
+        feedback: str,
+        message_callback: Optional[Callable[[str], None]] = None,
+        status_callback: Optional[Callable[[str], None]] = None,
+        event_callback: Optional[EventCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Continue processing with user feedback.
         
-        # Process the stream
+        Args:
+            feedback: The user feedback as a string
+            message_callback: Function to call with the whole message so far
+            status_callback: Function to call with status updates
+            event_callback: Function to call with streaming events (see streaming.py)
+            
+        Returns:
+            Either the final state (dict) or a status object indicating more feedback is needed
+        """
+        if not self.thread_id or not self.thread_config:
+            raise ValueError("No active session. Call start_processing first.")
+        
+        if status_callback:
+            status_callback("Processing feedback...")
+        
+        from langgraph.types import Command
+
+        # Resume the graph with the feedback and stream it from where we left off,
+        # so the tokens of the update are shown live and no node runs twice
+        return self._run(Command(resume=feedback), message_callback, status_callback,
+                         event_callback, "Additional human review required")
+
+    def _run(
+        self,
+        graph_input: Any,
+        message_callback: Optional[Callable[[str], None]],
+        status_callback: Optional[Callable[[str], None]],
+        event_callback: Optional[EventCallback],
+        review_status: str
+    ) -> Dict[str, Any]:
+        """Stream the graph until the next human review interrupt or the end"""
+        emitter = self._emitter(message_callback, event_callback)
+
         for mode, data in self.graph.stream(
-            initial_state,
+            graph_input,
             config=self.thread_config,
-            stream_mode=["messages", "updates"]
+            stream_mode=self._stream_modes(event_callback)
         ):
-            if mode == "messages":
-                msg, metadata = data
-                if hasattr(msg, "content"):
-                    current_message += msg.content
-                    message_callback(current_message)
-            
-            elif mode == "updates" and "__interrupt__" in data:
+            if mode == "updates" and "__interrupt__" in data:
                 # Get the current state
                 current_state = self.graph.get_state(self.thread_config)
                 if hasattr(current_state, "values"):
                     current_state = current_state.values
-                
+
                 # Check if human review is required
-                if (current_state.get("next_state", "") == "human_review" or 
-                    current_state.get("current_state", "") == "human_review"):
-                    
-                    if status_callback:
-                        status_callback("Human review required")
-                    
-                    # Return a status object with all necessary info
-                    return {
-                        "status": "feedback_required",
-                        "message": current_message,
-                        "state": current_state
-                    }
-        
-        # If we get here, processing completed without requiring feedback
+                if self._needs_review(current_state):
+                    return self._interrupted(emitter, current_state, status_callback, review_status)
+            else:
+                emitter.handle(mode, data)
+
+        # If we get here, processing has completed
         final_state = self.graph.get_state(self.thread_config)
         if hasattr(final_state, "values"):
             final_state = final_state.values
-        
+
+        return self._completed(emitter, final_state, status_callback)
+
+
+class AsyncArchitectureProcessor(ArchitectureProcessor):
+    """
+    Async counterpart of ArchitectureProcessor.
+
+    Drives a graph built with `create_agent_graph(use_async=True)` through
+    `astream`, so one event loop can multiplex many concurrent sessions. The
+    returned status dicts are the same as the synchronous processor's.
+    """
+
+    async def aclose(self):
+        """Async version of close"""
+        self._end_speculation()
+        if self.thread_id and self.graph.checkpointer:
+            await self.graph.checkpointer.adelete_thread(self.thread_id)
+        self.thread_id = None
+        self.thread_config = None
+
+    async def astart_processing(
+        self,
+        user_input: str,
+        message_callback: Optional[Callable[[str], None]] = None,
+        status_callback: Optional[Callable[[str], None]] = None,
+        event_callback: Optional[EventCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Start processing an architecture request.
+
+        Args:
+            user_input: The initial user prompt as a string
+            message_callback: Function to call with the whole message so far
+            status_callback: Function to call with status updates
+            event_callback: Function to call with streaming events (see streaming.py)
+
+        Returns:
+            Either the final state (dict) or a status object indicating feedback is needed
+        """
+        # Free the checkpoints and speculative work of the previous run before starting a new thread
+        await self.aclose()
+
+        # Generate a thread ID for this session
+        self._new_session()
+
         if status_callback:
-            status_callback("Architecture analysis completed!")
-        
-        return {
-            "status": "completed",
-            "message": current_message,
-            "state": final_state
-        }
-    
-    def continue_with_feedback(
+            status_callback("Analyzing architecture description...")
+
+        return await self._arun(self._initial_state(user_input), message_callback, status_callback,
+                                event_callback, "Human review required")
+
+    async def acontinue_with_feedback(
         self,
         feedback: str,
-        message_callback: Callable[[str], None],
-        status_callback: Optional[Callable[[str], None]] = None
+        message_callback: Optional[Callable[[str], None]] = None,
+        status_callback: Optional[Callable[[str], None]] = None,
+        event_callback: Optional[EventCallback] = None
     ) -> Dict[str, Any]:
         """
         Continue processing with user feedback.
-        
+
         Args:
             feedback: The user feedback as a string
-            message_callback: Function to call with message updates
+            message_callback: Function to call with the whole message so far
             status_callback: Function to call with status updates
-            
+            event_callback: Function to call with streaming events (see streaming.py)
+
         Returns:
             Either the final state (dict) or a status object indicating more feedback is needed
         """
         if not self.thread_id or not self.thread_config:
-            raise ValueError("No active session. Call start_processing first.")
-        
+            raise ValueError("No active session. Call astart_processing first.")
+
         if status_callback:
             status_callback("Processing feedback...")
-        
-        # Resume the graph with the feedback
-        self.graph.invoke(Command(resume=feedback), self.thread_config)
-        
-        current_message = ""
-        
-        # Continue processing from where we left off
-        for mode, data in self.graph.stream(
-            None,  # No initial state needed when continuing
+
+        from langgraph.types import Command
+
+        # Resume the graph with the feedback and stream it from where we left off
+        return await self._arun(Command(resume=feedback), message_callback, status_callback,
+                                event_callback, "Additional human review required")
+
+    async def _arun(
+        self,
+        graph_input: Any,
+        message_callback: Optional[Callable[[str], None]],
+        status_callback: Optional[Callable[[str], None]],
+        event_callback: Optional[EventCallback],
+        review_status: str
+    ) -> Dict[str, Any]:
+        """Stream the graph until the next human review interrupt or the end"""
+        emitter = self._emitter(message_callback, event_callback)
+
+        async for mode, data in self.graph.astream(
+            graph_input,
             config=self.thread_config,
-            stream_mode=["messages", "updates"]
+            stream_mode=self._stream_modes(event_callback)
         ):
-            if mode == "messages":
-                msg, metadata = data
-                if hasattr(msg, "content"):
-                    current_message += msg.content
-                    message_callback(current_message)
-            
-            elif mode == "updates" and "__interrupt__" in data:
+            if mode == "updates" and "__interrupt__" in data:
                 # Get the current state
-                current_state = self.graph.get_state(self.thread_config)
+                current_state = await self.graph.aget_state(self.thread_config)
                 if hasattr(current_state, "values"):
                     current_state = current_state.values
-                
-                # Check if more feedback is needed
-                if (current_state.get("next_state", "") == "human_review" or 
-                    current_state.get("current_state", "") == "human_review"):
-                    
-                    if status_callback:
-                        status_callback("Additional human review required")
-                    
-                    # Return a status object indicating more feedback is needed
-                    return {
-                        "status": "feedback_required",
-                        "message": current_message,
-                        "state": current_state
-                    }
-        
+
+                # Check if human review is required
+                if self._needs_review(current_state):
+                    return self._interrupted(emitter, current_state, status_callback, review_status)
+            else:
+                emitter.handle(mode, data)
+
         # If we get here, processing has completed
-        final_state = self.graph.get_state(self.thread_config)
+        final_state = await self.graph.aget_state(self.thread_config)
         if hasattr(final_state, "values"):
             final_state = final_state.values
-        
-        if status_callback:
-            status_callback("Architecture analysis completed!")
-        
-        return {
-            "status": "completed",
-            "message": current_message,
-            "state": final_state
-        }
-
 
+        return self._completed(emitter, final_state, status_callback)
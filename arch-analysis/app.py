@@ -1,7 +1,11 @@
+import os
 import streamlit as st
 from agent import ArchitectureProcessor
+from streaming import MessageBuffer, NodeEnd, NodeStart, TokenDelta
+from mermaid_stream import MermaidStreamExtractor
+from worker import JobCancelled, worker_pool
 import streamlit.components.v1 as components
-from workflow import create_agent_graph
+from workflow import create_agent_graph, mermaid_speculator
 from helper import render_mermaid_code, display_mermaid  # Import the new function
 
 # Page configuration
@@ -19,10 +23,32 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# ----- Shared Resources -----
+@st.cache_resource
+def get_shared_graph():
+    """
+    The compiled graph and its checkpointer, built once per server process and
+    shared by every session; sessions only differ by their thread_id
+    """
+    # Persist paused reviews to SQLite when ARCH_CHECKPOINT_DB is set, else the
+    # default SharedMemorySaver bounded by ARCH_MAX_THREADS
+    checkpointer = None
+    if os.getenv("ARCH_CHECKPOINT_DB"):
+        from checkpoint import SqliteCheckpointer
+        checkpointer = SqliteCheckpointer(os.environ["ARCH_CHECKPOINT_DB"], keep_last=5)
+    return create_agent_graph(checkpointer=checkpointer)
+
 # ----- Session State Initialization -----
-if 'processor' not in st.session_state:
-    graph = create_agent_graph()
-    st.session_state.processor = ArchitectureProcessor(graph)
+def get_processor() -> ArchitectureProcessor:
+    """
+    The session's processor, created on first use so that the page renders
+    before the graph (and langgraph with it) is built
+    """
+    if st.session_state.get("processor") is None:
+        # Start the Mermaid diagram while the user reviews when ARCH_SPECULATIVE_MERMAID=1
+        speculator = mermaid_speculator if os.getenv("ARCH_SPECULATIVE_MERMAID") == "1" else None
+        st.session_state.processor = ArchitectureProcessor(get_shared_graph(), speculator=speculator)
+    return st.session_state.processor
 
 defaults = {
     "processing": False,
@@ -33,6 +59,7 @@ defaults = {
     "messages": [],
     "form_submitted": False,
     "result": None,
+    "job_error": None,
 }
 for key, val in defaults.items():
     if key not in st.session_state:
@@ -55,18 +82,139 @@ def handle_feedback():
         st.session_state.processing = True
         st.session_state.feedback_text = feedback_text
 
-def message_handler(message):
-    """Updates the streaming placeholder with partial assistant messages."""
-    st.session_state.current_message = message
-    if "streaming_placeholder" in st.session_state:
-        st.session_state.streaming_placeholder.markdown(
-            f"<div class='assistant-message'><strong>Assistant:</strong> {message}</div>",
-            unsafe_allow_html=True
-        )
+NODE_STATUS = {
+    "refine": "Refining the description...",
+    "architecture": "Designing the architecture...",
+    "arch_section": "Writing the architecture sections in parallel...",
+    "arch_merge": "Checking the sections for consistency...",
+    "gen_mermaid": "Drawing the diagram...",
+}
+
+# Seconds between two polls of the background job while it runs
+POLL_INTERVAL = float(os.getenv("ARCH_POLL_INTERVAL", "0.25"))
+
+def event_handler(event):
+    """Applies a streaming event of the background job to the partial assistant message."""
+    if isinstance(event, NodeStart):
+        if event.node in NODE_STATUS:
+            status_handler(NODE_STATUS[event.node])
+    elif isinstance(event, TokenDelta):
+        buffer = st.session_state.setdefault("message_buffer", MessageBuffer())
+        buffer.append(event.text)
+        st.session_state.current_message = buffer.text()
+        if event.node == "gen_mermaid":
+            # The diagram tab renders the statements generated so far (poll_diagram)
+            st.session_state.setdefault("mermaid_stream", MermaidStreamExtractor()).feed(event.text)
+    elif isinstance(event, NodeEnd):
+        if event.node == "gen_mermaid" and st.session_state.get("mermaid_stream"):
+            st.session_state.mermaid_stream.close()
 
 def status_handler(status):
     st.session_state.status = status
 
+def finish_job(job):
+    """Stores the result (or error) of the finished background job and reruns the page."""
+    del st.session_state.job
+    # Shown after the rerun, like the status of the result
+    st.session_state.job_error = None
+    if st.session_state.get("feedback_text"):
+        # Continue with feedback
+        try:
+            result = job.result()
+            del st.session_state.feedback_text
+        except JobCancelled:
+            result = {
+                "status": "error",
+                "message": "Processing cancelled.",
+                "state": st.session_state.result.get("state", {}) if st.session_state.result else {}
+            }
+        except Exception as e:
+            st.session_state.job_error = f"Error processing feedback: {str(e)}"
+            result = {
+                "status": "error",
+                "message": f"Error: {str(e)}",
+                "state": st.session_state.result.get("state", {}) if st.session_state.result else {}
+            }
+    else:
+        # Initial processing
+        try:
+            result = job.result()
+        except JobCancelled:
+            result = {
+                "status": "error",
+                "message": "Processing cancelled.",
+                "state": {}
+            }
+        except Exception as e:
+            st.session_state.job_error = f"Error processing input: {str(e)}"
+            result = {
+                "status": "error", 
+                "message": f"Error: {str(e)}",
+                "state": {}
+            }
+
+    st.session_state.result = result
+
+    # Check if more feedback is needed
+    if result["status"] == "feedback_required":
+        st.session_state.feedback_requested = True
+    else:
+        st.session_state.feedback_requested = False
+
+    # Save final assistant message
+    st.session_state.messages.append({"role": "assistant", "content": result["message"]})
+
+    # Save mermaid code if available
+    if "mermaid_code" in result.get("state", {}):
+        st.session_state.mermaid_code = result["state"]["mermaid_code"]
+
+    # Set processing to false after all work is done
+    st.session_state.processing = False
+    st.rerun()
+
+def poll_job():
+    """
+    Drains the updates of the background job into the streaming placeholder.
+    Runs as a fragment every POLL_INTERVAL seconds while the job is running and
+    finishes the job (rerunning the whole page) once it is done.
+    """
+    job = st.session_state.get("job")
+    if job is None:
+        return
+    for kind, update in job.poll():
+        if kind == "status":
+            status_handler(update)
+        else:
+            event_handler(update)
+
+    st.session_state.streaming_placeholder = st.empty()
+    st.session_state.streaming_placeholder.markdown(
+        f"<div class='assistant-message'><strong>Assistant:</strong> {st.session_state.current_message}</div>",
+        unsafe_allow_html=True
+    )
+    if job.done():
+        finish_job(job)
+
+    col_status, col_cancel = st.columns([4, 1])
+    with col_status:
+        st.caption(st.session_state.get("status", "Processing architecture..."))
+    with col_cancel:
+        if st.button("Cancel", disabled=job.cancelled):
+            job.cancel()
+
+def poll_diagram():
+    """
+    Renders the partial diagram of a Mermaid answer that is still streaming.
+    Runs as a fragment every POLL_INTERVAL seconds while the job is running.
+    """
+    extractor = st.session_state.get("mermaid_stream")
+    partial = extractor.diagram() if extractor else None
+    if partial:
+        components.html(render_mermaid_code(partial), height=1000, scrolling=True)
+        st.caption(f"Drawing the diagram... {extractor.statements} statements so far")
+    else:
+        st.info("The architecture diagram will appear here once generated.")
+
 # ----- Custom CSS -----
 st.markdown("""
 <style>
@@ -182,11 +330,13 @@ with col1:
                     unsafe_allow_html=True
                 )
 
-        # Placeholder for streaming text
-        if "streaming_placeholder" not in st.session_state:
-            st.session_state.streaming_placeholder = st.empty()
+        # Streaming text of the background job, refreshed by polling its queue
+        if st.session_state.get("job"):
+            st.fragment(run_every=POLL_INTERVAL)(poll_job)()
 
         # After all messages, show status messages here
+        if st.session_state.job_error:
+            st.error(st.session_state.job_error)
         if st.session_state.result:
             # If feedback is required
             if st.session_state.feedback_requested:
@@ -216,6 +366,9 @@ with col2:
                 )
             else:
                 st.error("There was an error rendering the Mermaid diagram.")
+        elif st.session_state.get("job"):
+            # Growing diagram while gen_mermaid streams, refreshed with the job's updates
+            st.fragment(run_every=POLL_INTERVAL)(poll_diagram)()
         else:
             st.info("The architecture diagram will appear here once generated.")
 
@@ -229,58 +382,20 @@ with col2:
 # PROCESSING LOGIC
 # ================================
 if st.session_state.processing:
-    # Add a spinner to show visual feedback during processing
-    with st.spinner("Processing architecture..."):
-        if hasattr(st.session_state, "feedback_text") and st.session_state.feedback_text:
-            # Continue with feedback
-            try:
-                result = st.session_state.processor.continue_with_feedback(
-                    st.session_state.feedback_text,
-                    message_callback=message_handler,
-                    status_callback=status_handler
-                )
-                del st.session_state.feedback_text
-            except Exception as e:
-                st.error(f"Error processing feedback: {str(e)}")
-                result = {
-                    "status": "error",
-                    "message": f"Error: {str(e)}",
-                    "state": st.session_state.result.get("state", {}) if st.session_state.result else {}
-                }
-        else:
-            # Initial processing
-            try:
-                result = st.session_state.processor.start_processing(
-                    st.session_state.user_input,
-                    message_callback=message_handler,
-                    status_callback=status_handler
-                )
-            except Exception as e:
-                st.error(f"Error processing input: {str(e)}")
-                result = {
-                    "status": "error", 
-                    "message": f"Error: {str(e)}",
-                    "state": {}
-                }
-
-        st.session_state.result = result
-
-        # Check if more feedback is needed
-        if result["status"] == "feedback_required":
-            st.session_state.feedback_requested = True
+    job = st.session_state.get("job")
+    if job is None:
+        # Hand the call to the worker pool shared by all sessions; the page
+        # polls the job (poll_job) instead of waiting for the model
+        processor = get_processor()
+        st.session_state.message_buffer = MessageBuffer()
+        st.session_state.mermaid_stream = MermaidStreamExtractor()
+        st.session_state.current_message = ""
+        st.session_state.job_error = None
+        if st.session_state.get("feedback_text"):
+            st.session_state.job = worker_pool.submit(processor.continue_with_feedback, st.session_state.feedback_text)
         else:
-            st.session_state.feedback_requested = False
-
-        # Save final assistant message
-        st.session_state.messages.append({"role": "assistant", "content": result["message"]})
-
-        # Save mermaid code if available
-        if "mermaid_code" in result.get("state", {}):
-            st.session_state.mermaid_code = result["state"]["mermaid_code"]
-
-    # Set processing to false after all work is done
-    st.session_state.processing = False
-    st.rerun()  # Use a single rerun at the end of processing
+            st.session_state.job = worker_pool.submit(processor.start_processing, st.session_state.user_input)
+        st.rerun()
 
 # ================================
 # FEEDBACK SECTION
@@ -310,7 +425,16 @@ if st.session_state.feedback_requested and st.session_state.form_submitted:
 # ================================
 if st.session_state.form_submitted:
     if st.button("Start Over"):
-        processor = st.session_state.processor
+        processor = st.session_state.get("processor")
+        job = st.session_state.get("job")
+        if job:
+            # Cancelling only takes effect at the job's next streamed event: leave the
+            # processor to the job, which ends its session once it has stopped, and
+            # let the next analysis create a new one
+            job.cancel()
+            if processor is not None:
+                job.add_done_callback(processor.close)
+            processor = None
         for key in list(st.session_state.keys()):
             if key != "processor":
                 del st.session_state[key]
@@ -0,0 +1,226 @@
+"""
+Lazy, pluggable chat model backends.
+
+Nodes ask for their model with `get_llm(node)`. Nothing is imported or
+constructed until the first call, so importing `workflow` neither loads a
+provider SDK nor needs credentials. Models are created by the factory
+registered for their provider (`init_chat_model` by default), wrapped in the
+response cache when it is enabled, and shared by every node using the same provider and model.
+
+A node can also use a pool of backends (`ARCH_LLM_POOL`): each call goes to the
+backend that currently meets the latency SLO and fails over to the next one on
+errors (model_router.py). The response cache wraps the pool, so cached answers
+do not count as backend latency.
+
+Configuration:
+    ARCH_LLM_PROVIDER           Default provider (default "openai")
+    ARCH_LLM_MODEL              Default model (default "gpt-4o-mini")
+    ARCH_LLM_PROVIDER_<NODE>    Provider for one node, NODE being REFINE, ARCHITECTURE, REVIEW or MERMAID
+    ARCH_LLM_MODEL_<NODE>       Model for one node
+    ARCH_LLM_POOL               Comma-separated provider:model backends routed by latency, used instead of
+                                ARCH_LLM_PROVIDER/ARCH_LLM_MODEL when set
+    ARCH_LLM_POOL_<NODE>        Pool for one node
+    ARCH_LLM_SLO, ARCH_LLM_SLO_<NODE>
+                                p95 latency target in seconds (time to the first token) of a pool
+    ARCH_LLM_ROUTER_WINDOW      Seconds of latency samples the routing is based on (default 300)
+    ARCH_LLM_ROUTER_COOLDOWN    Seconds a failed backend is only tried last (default 30)
+    ARCH_LLM_CACHE, ARCH_LLM_CACHE_DIR, ARCH_LLM_CACHE_MAX_BYTES, ARCH_LLM_CACHE_TTL
+                                Response cache settings; the cache is off unless ARCH_LLM_CACHE=1 (see README)
+    ARCH_LLM_CASSETTE           Record/replay every call through this cassette file instead of the cache
+    ARCH_LLM_CASSETTE_MODE      record, replay or auto (default "auto")
+    ARCH_LLM_CASSETTE_SPEED     Replay speed relative to the recording, 0 for no delays (default 1.0)
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+NODES = ("refine", "architecture", "review", "mermaid")
+DEFAULT_PROVIDER = "openai"
+DEFAULT_MODEL = "gpt-4o-mini"
+
+_lock = threading.RLock()
+# Factories by provider name, each taking the model name and returning a chat model
+_factories: Dict[str, Callable[[str], Any]] = {}
+# Constructed models by (provider, model), or ("pool", backends, slo) for a pool,
+# shared by the nodes configured alike
+_models: Dict[Tuple, Any] = {}
+# Latency routers of the constructed pools, by pool name ("provider:model,...@<slo>s")
+_routers: Dict[str, Any] = {}
+# Models installed with set_llm, by node (None for all nodes)
+_overrides: Dict[Optional[str], Any] = {}
+_response_cache = None
+_cassette = None
+
+
+def register_backend(provider: str, factory: Callable[[str], Any]):
+    """
+    Register a factory for a provider name.
+
+    Args:
+        provider: Name used in ARCH_LLM_PROVIDER / ARCH_LLM_PROVIDER_<NODE>
+        factory: Callable taking the model name and returning a LangChain chat model
+    """
+    with _lock:
+        _factories[provider] = factory
+        for key in [key for key in _models if key[0] == provider
+                    or (key[0] == "pool" and any(name == provider for name, _ in key[1]))]:
+            del _models[key]
+
+
+def _init_chat_model(provider: str, model: str):
+    from langchain.chat_models import init_chat_model
+    # OpenAI only reports token usage for streamed calls when asked to (used by tracing)
+    kwargs = {"stream_usage": True} if provider == "openai" else {}
+    return init_chat_model(model, model_provider=provider, **kwargs)
+
+
+def backend_config(node: Optional[str] = None) -> Tuple[str, str]:
+    """The (provider, model) configured for a node"""
+    suffix = f"_{node.upper()}" if node else ""
+    provider = os.getenv(f"ARCH_LLM_PROVIDER{suffix}") or os.getenv("ARCH_LLM_PROVIDER", DEFAULT_PROVIDER)
+    model = os.getenv(f"ARCH_LLM_MODEL{suffix}") or os.getenv("ARCH_LLM_MODEL", DEFAULT_MODEL)
+    return provider, model
+
+
+def pool_config(node: Optional[str] = None) -> Tuple[List[Tuple[str, str]], Optional[float]]:
+    """
+    The (provider, model) backends of the pool configured for a node and its SLO.
+
+    A node-specific pool wins over a node-specific provider or model, which wins
+    over the default pool. Returns an empty list when the node uses a single model.
+    """
+    suffix = f"_{node.upper()}" if node else ""
+    spec = os.getenv(f"ARCH_LLM_POOL{suffix}")
+    if not spec and not (os.getenv(f"ARCH_LLM_PROVIDER{suffix}") or os.getenv(f"ARCH_LLM_MODEL{suffix}")):
+        spec = os.getenv("ARCH_LLM_POOL")
+    pool = []
+    for entry in (spec or "").split(","):
+        if entry.strip():
+            # The model name may contain colons itself (e.g. ollama:llama3:8b)
+            provider, _, model = entry.strip().partition(":")
+            pool.append((provider, model) if model else (DEFAULT_PROVIDER, provider))
+    slo = os.getenv(f"ARCH_LLM_SLO{suffix}") or os.getenv("ARCH_LLM_SLO")
+    return pool, float(slo) if slo else None
+
+
+def get_response_cache():
+    """The shared on-disk response cache, or None unless enabled with ARCH_LLM_CACHE=1"""
+    global _response_cache
+    if os.getenv("ARCH_LLM_CACHE", "0") != "1":
+        return None
+    with _lock:
+        if _response_cache is None:
+            from llm_cache import ResponseCache
+            _response_cache = ResponseCache(
+                os.getenv("ARCH_LLM_CACHE_DIR", ".llm_cache"),
+                max_bytes=int(os.getenv("ARCH_LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+                ttl_seconds=float(os.getenv("ARCH_LLM_CACHE_TTL", 7 * 24 * 3600)),
+            )
+        return _response_cache
+
+
+def get_cassette():
+    """The shared cassette when ARCH_LLM_CASSETTE is set, else None"""
+    global _cassette
+    path = os.getenv("ARCH_LLM_CASSETTE")
+    if not path:
+        return None
+    with _lock:
+        if _cassette is None or _cassette.path != path:
+            from cassette import Cassette
+            _cassette = Cassette(path, mode=os.getenv("ARCH_LLM_CASSETTE_MODE", "auto"))
+        return _cassette
+
+
+def _build(provider: str, model: str):
+    factory = _factories.get(provider)
+    return factory(model) if factory else _init_chat_model(provider, model)
+
+
+def _build_pool(pool: List[Tuple[str, str]], slo: Optional[float]):
+    from model_router import COOLDOWN_SECONDS, WINDOW_SECONDS, LatencyRouter, RoutedChatModel
+    names = [f"{provider}:{model}" for provider, model in pool]
+    router = LatencyRouter(
+        names, slo=slo,
+        window_seconds=float(os.getenv("ARCH_LLM_ROUTER_WINDOW", WINDOW_SECONDS)),
+        cooldown=float(os.getenv("ARCH_LLM_ROUTER_COOLDOWN", COOLDOWN_SECONDS)),
+    )
+    _routers[",".join(names) + (f"@{slo}s" if slo is not None else "")] = router
+    return RoutedChatModel(backends={name: _build(provider, model) for name, (provider, model) in zip(names, pool)},
+                           router=router)
+
+
+def _wrapped(build: Callable[[], Any]):
+    """The model returned by build, wrapped in the cassette or the response cache"""
+    cassette = get_cassette()
+    if cassette is not None:
+        # Replaying needs neither the provider package nor credentials
+        from cassette import CassetteChatModel
+        return CassetteChatModel(
+            llm=None if cassette.mode == "replay" else build(),
+            cassette=cassette,
+            speed=float(os.getenv("ARCH_LLM_CASSETTE_SPEED", 1.0)),
+        )
+    llm = build()
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        from llm_cache import CachedChatModel
+        llm = CachedChatModel(llm=llm, response_cache=response_cache)
+    return llm
+
+
+def get_llm(node: Optional[str] = None):
+    """
+    The chat model for a node, created on first use.
+
+    Args:
+        node: One of NODES, or None for the default model
+
+    Returns:
+        The model installed with set_llm for the node, else the configured
+        backend or pool wrapped in the cassette or the response cache
+    """
+    if node in _overrides:
+        return _overrides[node]
+    if None in _overrides:
+        return _overrides[None]
+    pool, slo = pool_config(node)
+    with _lock:
+        if len(pool) > 1:
+            key = ("pool", tuple(pool), slo)
+            if key not in _models:
+                _models[key] = _wrapped(lambda: _build_pool(pool, slo))
+            return _models[key]
+        provider, model = pool[0] if pool else backend_config(node)
+        if (provider, model) not in _models:
+            _models[(provider, model)] = _wrapped(lambda: _build(provider, model))
+        return _models[(provider, model)]
+
+
+def router_stats() -> Dict[str, Any]:
+    """Latency and failover statistics of the constructed pools, by pool name"""
+    with _lock:
+        routers = dict(_routers)
+    return {name: router.stats() for name, router in routers.items()}
+
+
+def set_llm(llm: Any, node: Optional[str] = None):
+    """
+    Use `llm` as is (no response cache) for a node, or for all nodes when node is None.
+    Pass llm=None to remove the override.
+    """
+    with _lock:
+        if llm is None:
+            _overrides.pop(node, None)
+        else:
+            _overrides[node] = llm
+
+
+def reset():
+    """Forget constructed models, overrides and the cassette, e.g. after changing the environment"""
+    global _cassette
+    with _lock:
+        _cassette = None
+        _models.clear()
+        _routers.clear()
+        _overrides.clear()
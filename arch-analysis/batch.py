@@ -0,0 +1,213 @@
+"""
+Headless batch mode: run the architecture workflow over a JSONL file of descriptions.
+
+Each input line is a JSON object with a `description` (or `raw_input`) and an
+optional `id` and `feedback` list. Results are appended to the output JSONL as
+soon as each record finishes, and records whose id is already in the output
+file are skipped, so an interrupted run can simply be started again. A line
+that is not a JSON object gets an error result with its line number, like a
+record whose processing fails, and the run goes on.
+
+Usage:
+    python batch.py descriptions.jsonl -o results.jsonl -c 16
+    cat descriptions.jsonl | python batch.py - -o results.jsonl --policy scripted
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from agent import AsyncArchitectureProcessor
+
+APPROVAL = "done"
+
+
+def iter_records(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Parse JSONL lines into records, giving every record an id.
+
+    A malformed line is yielded as a record with its `line` number and a
+    `parse_error`, which process_record turns into an error result.
+    """
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError(f"expected a JSON object, got {type(record).__name__}")
+        except ValueError as e:
+            yield {"id": f"line-{line_no}", "line": line_no, "parse_error": str(e)}
+            continue
+        record.setdefault("id", f"line-{line_no}")
+        record["id"] = str(record["id"])
+        yield record
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids of records already written successfully to the output file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A partially written last line from an interrupted run
+                continue
+            if result.get("status") == "completed":
+                done.add(str(result["id"]))
+    return done
+
+
+def review_responses(record: Dict[str, Any], policy: str, max_rounds: int) -> List[str]:
+    """
+    The replies given at each human_review interrupt.
+
+    `auto` approves the first architecture. `scripted` sends the record's
+    `feedback` list in order and approves once it is exhausted.
+    """
+    if policy == "auto":
+        return [APPROVAL]
+    if policy == "scripted":
+        feedback = [str(item) for item in record.get("feedback", [])][:max_rounds]
+        return feedback + [APPROVAL]
+    raise ValueError(f"Unknown review policy: {policy}")
+
+
+async def process_record(graph, record: Dict[str, Any], policy: str, max_rounds: int) -> Dict[str, Any]:
+    """Run one description through the graph, answering reviews from the policy"""
+    if "parse_error" in record:
+        return {
+            "id": record["id"],
+            "status": "error",
+            "error": f"line {record['line']}: invalid JSON: {record['parse_error']}",
+            "line": record["line"],
+            "review_rounds": 0,
+            "seconds": 0.0,
+        }
+    processor = AsyncArchitectureProcessor(graph)
+    started = time.perf_counter()
+    description = record.get("description") or record.get("raw_input") or ""
+    rounds = 0
+    try:
+        result = await processor.astart_processing(description, message_callback=lambda message: None)
+        for response in review_responses(record, policy, max_rounds):
+            if result["status"] != "feedback_required":
+                break
+            result = await processor.acontinue_with_feedback(response, message_callback=lambda message: None)
+            rounds += 1
+        state = result.get("state", {})
+        return {
+            "id": record["id"],
+            "status": result["status"],
+            "refined_description": state.get("refined_description", ""),
+            "architecture_spec": state.get("architecture_spec", ""),
+            "mermaid_code": state.get("mermaid_code", ""),
+            "review_rounds": rounds,
+            "seconds": round(time.perf_counter() - started, 3),
+            "trace": result.get("trace"),
+        }
+    except Exception as e:
+        return {
+            "id": record["id"],
+            "status": "error",
+            "error": str(e),
+            "review_rounds": rounds,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+    finally:
+        # Finished threads are never resumed, so free their checkpoints
+        if processor.thread_id and graph.checkpointer:
+            await graph.checkpointer.adelete_thread(processor.thread_id)
+
+
+async def run_batch(
+    records: Iterable[Dict[str, Any]],
+    output_path: str,
+    concurrency: int = 8,
+    policy: str = "auto",
+    max_rounds: int = 5,
+    graph=None,
+) -> Dict[str, Any]:
+    """
+    Process records concurrently and append each result to `output_path` as it finishes.
+
+    Args:
+        records: Iterable of input records (read lazily, so stdin can be streamed)
+        output_path: JSONL file receiving one result per record
+        concurrency: Maximum number of records in flight
+        policy: Review policy, `auto` or `scripted`
+        max_rounds: Maximum number of scripted feedback rounds per record
+        graph: Graph built with `create_agent_graph(use_async=True)`; created when None
+
+    Returns:
+        Summary counts of the run
+    """
+    if graph is None:
+        from workflow import create_agent_graph
+        graph = create_agent_graph(use_async=True)
+
+    skip = completed_ids(output_path)
+    summary = {"completed": 0, "failed": 0, "skipped": 0}
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    records = iter(records)
+
+    async def produce():
+        while True:
+            # Reading may block (e.g. on stdin), keep it off the event loop
+            record = await asyncio.to_thread(next, records, None)
+            if record is None:
+                break
+            if record["id"] in skip:
+                summary["skipped"] += 1
+                continue
+            await queue.put(record)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    with open(output_path, "a", encoding="utf-8") as output:
+        async def work():
+            while (record := await queue.get()) is not None:
+                result = await process_record(graph, record, policy, max_rounds)
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+                summary["completed" if result["status"] == "completed" else "failed"] += 1
+                print(f"[{result['status']}] {result['id']} in {result['seconds']}s", file=sys.stderr)
+
+        await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run the architecture workflow over a JSONL file of descriptions.")
+    parser.add_argument("input", help="Input JSONL file, or '-' to read from stdin")
+    parser.add_argument("-o", "--output", required=True, help="Output JSONL file (appended to, used for resuming)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Maximum number of descriptions in flight")
+    parser.add_argument("--policy", choices=["auto", "scripted"], default="auto",
+                        help="auto approves the first architecture; scripted replays each record's 'feedback' list")
+    parser.add_argument("--max-rounds", type=int, default=5, help="Maximum scripted feedback rounds per record")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    try:
+        summary = asyncio.run(run_batch(
+            iter_records(source),
+            args.output,
+            concurrency=args.concurrency,
+            policy=args.policy,
+            max_rounds=args.max_rounds,
+        ))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
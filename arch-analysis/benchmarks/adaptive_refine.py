@@ -0,0 +1,161 @@
+"""
+Benchmark of the adaptive refine routing.
+
+Every description of `fixtures/input_samples.jsonl` (short and sloppy ones,
+long clean ones and structured specifications) is run through
+ArchitectureProcessor.start_processing up to the human review twice: with the
+`assess` node, and with every description going through the full refine
+prompt. The stub model answers a full refinement with as many tokens as the
+description has words, streamed at `--tokens-per-second` after a `--latency`
+first-token delay, as a provider rewriting the text would.
+
+Reported per route chosen by the assessment:
+    samples        descriptions routed there
+    refine_s       mean time of the refine stage (assess and refine nodes) with routing
+    baseline_s     mean time of the refine stage when every description is fully refined
+    saved_s        mean time saved before architecture generation starts
+    tokens_saved   refine output tokens saved in total (InputRouter.stats estimate)
+
+The time saved over all runs is also compared with InputRouter.stats()'s
+`refine_seconds_saved` estimate.
+
+Usage:
+    python benchmarks/adaptive_refine.py
+    python benchmarks/adaptive_refine.py --tokens-per-second 50 --check -o refine.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import backends  # noqa: E402
+from agent import ArchitectureProcessor  # noqa: E402
+from input_quality import ROUTES, WORD  # noqa: E402
+from stub_model import StubChatModel  # noqa: E402
+
+SAMPLES = os.path.join(os.path.dirname(ROOT), "fixtures", "input_samples.jsonl")
+
+
+def refine_stage(processor: ArchitectureProcessor) -> float:
+    return sum(span["attributes"]["duration_seconds"] for span in processor.tracer.spans
+               if span["name"] in ("assess", "refine") and span["attributes"]["span.kind"] == "node")
+
+
+def run_sample(text: str, adaptive: bool, args: argparse.Namespace) -> Dict[str, Any]:
+    from workflow import create_agent_graph, input_router
+
+    # A full refinement is about as long as the description it rewrites
+    backends.set_llm(StubChatModel(first_token_latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                   refine_tokens=len(WORD.findall(text)), spec_tokens=60))
+    processor = ArchitectureProcessor(create_agent_graph(parallel_sections=False, adaptive_refine=adaptive))
+    saved_before = input_router.stats()["refine_tokens_saved"]
+    started = time.perf_counter()
+    result = processor.start_processing(text)
+    return {
+        "status": result["status"],
+        "route": result["state"]["input_assessment"].get("route", "full"),
+        "refine_s": refine_stage(processor),
+        "first_review_s": time.perf_counter() - started,
+        "tokens_saved": input_router.stats()["refine_tokens_saved"] - saved_before,
+        "refined": result["state"]["refined_description"],
+    }
+
+
+def run_all(samples: List[Dict[str, Any]], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    runs = []
+    for sample in samples:
+        routed, baseline = run_sample(sample["text"], True, args), run_sample(sample["text"], False, args)
+        runs.append({
+            "expected_route": sample["route"],
+            "route": routed["route"],
+            "words": len(WORD.findall(sample["text"])),
+            "refine_s": routed["refine_s"],
+            "baseline_s": baseline["refine_s"],
+            "first_review_s": routed["first_review_s"],
+            "baseline_first_review_s": baseline["first_review_s"],
+            "tokens_saved": routed["tokens_saved"],
+            # A skipped or light refinement must still hand the description on
+            "kept_description": routed["route"] == "full" or sample["text"] in routed["refined"],
+            "completed": routed["status"] == baseline["status"] == "feedback_required",
+        })
+        print(f"{routed['route']:<5} {runs[-1]['words']:>4} words: {runs[-1]['refine_s']:.2f}s "
+              f"instead of {runs[-1]['baseline_s']:.2f}s", file=sys.stderr)
+    return runs
+
+
+def by_route(runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    report = {}
+    for route in ROUTES:
+        routed = [run for run in runs if run["route"] == route]
+        if routed:
+            report[route] = {
+                "samples": len(routed),
+                "refine_s": statistics.mean(run["refine_s"] for run in routed),
+                "baseline_s": statistics.mean(run["baseline_s"] for run in routed),
+                "saved_s": statistics.mean(run["baseline_s"] - run["refine_s"] for run in routed),
+                "tokens_saved": sum(run["tokens_saved"] for run in routed),
+            }
+    return report
+
+
+def summary(report: Dict[str, Dict[str, Any]]) -> str:
+    lines = [f"{'route':<6} {'samples':>7} {'refine s':>9} {'baseline s':>11} {'saved s':>8} {'tokens saved':>13}"]
+    for route, stats in report.items():
+        lines.append(f"{route:<6} {stats['samples']:>7} {stats['refine_s']:>9.2f} {stats['baseline_s']:>11.2f} "
+                     f"{stats['saved_s']:>8.2f} {stats['tokens_saved']:>13}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the refine stage with and without adaptive routing.")
+    parser.add_argument("samples", nargs="?", default=SAMPLES, help="JSONL file of descriptions with their expected route")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub first-token latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="Stub token rate")
+    parser.add_argument("--check", action="store_true",
+                        help="Fail when a run does not reach the review, a skipped or light refinement loses "
+                             "the description, or routing makes the refine stage slower")
+    args = parser.parse_args(argv)
+
+    # Offline, deterministic runs: no response cache or cassette, the stub for every node
+    os.environ["ARCH_LLM_CACHE"] = "0"
+    os.environ.pop("ARCH_LLM_CASSETTE", None)
+    os.environ.pop("ARCH_SEMANTIC_CACHE", None)
+
+    with open(args.samples, "r", encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    from workflow import input_router
+
+    runs = run_all(samples, args)
+    report = by_route(runs)
+    print(summary(report))
+    measured = sum(run["baseline_s"] - run["refine_s"] for run in runs if run["route"] != "full")
+    estimated = input_router.stats()["refine_seconds_saved"]
+    print(f"refine time saved: {measured:.2f}s measured, "
+          + (f"{estimated:.2f}s estimated by the input router" if estimated is not None else "no estimate"))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": {key: value for key, value in vars(args).items() if key != "output"},
+                       "routes": report, "runs": runs,
+                       "seconds_saved": {"measured": measured, "estimated": estimated}}, f, indent=2)
+    if args.check:
+        failures = [f"{run['words']}-word sample: did not reach the review" for run in runs if not run["completed"]]
+        failures += [f"{run['words']}-word sample: description lost on the {run['route']} route"
+                     for run in runs if not run["kept_description"]]
+        failures += [f"{route} route: refine stage slower than the baseline"
+                     for route, stats in report.items() if route != "full" and stats["saved_s"] <= 0]
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
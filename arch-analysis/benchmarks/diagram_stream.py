@@ -0,0 +1,128 @@
+"""
+Benchmark of progressive diagram rendering from a streamed Mermaid answer.
+
+A synthetic flowchart of `--nodes` components (in subgraphs of eight, with one
+edge per component) is streamed as the model would: word and whitespace
+tokens, wrapped in a ```mermaid block, at `--tokens-per-second` after a
+`--latency` first-token delay, and the partial diagram is read every
+`--poll-interval` seconds as the app does. The times are simulated from the
+token positions, so the run takes no longer than the extractor itself.
+
+Reported per size:
+    first_diagram_s   simulated time until the first renderable partial diagram
+    complete_s        simulated time until the whole answer has streamed (what the
+                      UI waited for before progressive rendering)
+    partials          partial diagrams rendered
+    coverage_at_half  share of the statements shown when half of the answer has streamed
+    overhead_ms       CPU time spent in MermaidStreamExtractor for the whole stream
+
+Usage:
+    python benchmarks/diagram_stream.py
+    python benchmarks/diagram_stream.py --nodes 20 100 300 --tokens-per-second 40 --check
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mermaid_stream import MermaidStreamExtractor  # noqa: E402
+from mermaid_validator import validate  # noqa: E402
+
+GROUP_SIZE = 8
+
+
+def synthetic_diagram(nodes: int) -> str:
+    lines = ["```mermaid", "flowchart TD"]
+    for start in range(0, nodes, GROUP_SIZE):
+        lines.append(f'    subgraph group{start // GROUP_SIZE}["Group {start // GROUP_SIZE}"]')
+        for i in range(start, min(start + GROUP_SIZE, nodes)):
+            lines.append(f'        service{i}["Service {i}"];')
+        lines.append("    end")
+    for i in range(1, nodes):
+        lines.append(f"    service{i // 2} --> service{i};")
+    lines.append("```")
+    return "\n".join(lines)
+
+
+def run_stream(nodes: int, latency: float, tokens_per_second: float, poll_interval: float) -> Dict[str, Any]:
+    text = synthetic_diagram(nodes)
+    tokens = re.findall(r"\S+|\s+", text)
+    extractor = MermaidStreamExtractor()
+
+    def at(position: int) -> float:
+        return latency + (position + 1) / tokens_per_second
+
+    # The UI reads the diagram once per poll, after feeding the deltas queued since the last one
+    partials = []
+    cpu = 0.0
+    next_poll = poll_interval
+    for position, token in enumerate(tokens):
+        started = time.perf_counter()
+        extractor.feed(token)
+        if position == len(tokens) - 1:
+            extractor.close()
+        if at(position) >= next_poll or position == len(tokens) - 1:
+            next_poll += poll_interval * (1 + int((at(position) - next_poll) / poll_interval))
+            before = extractor.partial
+            if extractor.diagram() is not before:
+                partials.append((position, extractor.statements))
+        cpu += time.perf_counter() - started
+
+    half = len(tokens) // 2
+    shown_at_half = max([statements for position, statements in partials if position <= half], default=0)
+    return {
+        "nodes": nodes,
+        "tokens": len(tokens),
+        "first_diagram_s": at(partials[0][0]) if partials else None,
+        "complete_s": at(len(tokens) - 1),
+        "partials": len(partials),
+        "coverage_at_half": shown_at_half / extractor.statements if extractor.statements else 0.0,
+        "overhead_ms": cpu * 1000,
+        "final_valid": extractor.partial is not None and not validate(extractor.partial),
+    }
+
+
+def summary(runs: List[Dict[str, Any]]) -> str:
+    lines = [f"{'nodes':>6} {'tokens':>7} {'first s':>8} {'complete s':>11} {'partials':>9} {'@half':>6} {'cpu ms':>8}"]
+    for run in runs:
+        lines.append(
+            f"{run['nodes']:>6} {run['tokens']:>7} {run['first_diagram_s']:>8.2f} {run['complete_s']:>11.2f} "
+            f"{run['partials']:>9} {run['coverage_at_half']:>6.0%} {run['overhead_ms']:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark progressive Mermaid rendering from a token stream.")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[20, 100, 300], help="Components per diagram")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated first-token latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Simulated token rate")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="Seconds between two reads of the diagram")
+    parser.add_argument("--check", action="store_true",
+                        help="Fail when a final partial is invalid or the extractor costs more than the stream time")
+    args = parser.parse_args(argv)
+
+    runs = [run_stream(nodes, args.latency, args.tokens_per_second, args.poll_interval) for nodes in args.nodes]
+    print(summary(runs))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": {key: value for key, value in vars(args).items() if key != "output"},
+                       "runs": runs}, f, indent=2)
+    if args.check:
+        failures = [f"{run['nodes']} nodes: final diagram does not validate" for run in runs if not run["final_valid"]]
+        failures += [f"{run['nodes']} nodes: extractor overhead exceeds the stream time"
+                     for run in runs if run["overhead_ms"] / 1000 >= run["complete_s"]]
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Cold-start benchmark: time to import the workflow modules in a fresh interpreter.
+
+Every measurement runs in a new Python process, so nothing is shared between
+runs except the OS file cache. The report lists the median import time per
+module and which heavy packages the import pulled in. With --ref the same
+measurement is run against the tree of an older git revision, e.g. the
+commit before lazy backend initialization, to show the difference.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --ref HEAD~1 --repeat 9 workflow agent
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_PACKAGES = ["langchain", "langchain_core", "langgraph", "langchain_openai", "openai", "streamlit"]
+
+# Run in the child interpreter: import one module and report the time and loaded packages
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [p for p in {heavy!r} if p in sys.modules]}}))
+"""
+
+
+def measure(module: str, source_dir: str, repeat: int) -> Dict:
+    """Median import time of `module` from `source_dir` over `repeat` fresh interpreters"""
+    env = dict(os.environ, PYTHONPATH=source_dir)
+    # Older revisions construct the OpenAI client at import time and fail without a key
+    env.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+    samples = []
+    loaded: List[str] = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_PACKAGES)],
+            cwd=source_dir, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        loaded = result["loaded"]
+    return {"module": module, "median_seconds": statistics.median(samples), "min_seconds": min(samples), "loaded": loaded}
+
+
+def checkout(ref: str, destination: str) -> str:
+    """Extract this directory as of `ref` into `destination` and return its path"""
+    output = subprocess.run(["git", "rev-parse", "--show-toplevel", "--show-prefix"], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout.splitlines()
+    toplevel, prefix = output[0], output[1] if len(output) > 1 else ""
+    archive = os.path.join(destination, "tree.tar")
+    subprocess.run(["git", "archive", "--format=tar", "-o", archive, f"{ref}:{prefix}" if prefix else ref],
+                   cwd=toplevel, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(destination)
+    return destination
+
+
+def report(rows: List[Dict], baseline: Optional[List[Dict]] = None) -> str:
+    lines = [f"{'module':<12} {'median s':>9} {'min s':>7}  {'baseline s':>10}  loaded"]
+    for i, row in enumerate(rows):
+        before = f"{baseline[i]['median_seconds']:>10.3f}" if baseline else f"{'-':>10}"
+        lines.append(f"{row['module']:<12} {row['median_seconds']:>9.3f} {row['min_seconds']:>7.3f}  {before}  "
+                     f"{', '.join(row['loaded']) or '-'}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of the workflow modules.")
+    parser.add_argument("modules", nargs="*", default=["workflow", "agent", "batch"], help="Modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--ref", help="Also measure the tree of this git revision as a baseline")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    rows = [measure(module, ROOT, args.repeat) for module in args.modules]
+    baseline = None
+    if args.ref:
+        with tempfile.TemporaryDirectory() as directory:
+            source_dir = checkout(args.ref, directory)
+            baseline = [measure(module, source_dir, args.repeat) for module in args.modules]
+
+    if args.json:
+        print(json.dumps({"current": rows, "baseline": baseline}, indent=2))
+    else:
+        print(report(rows, baseline))
+
+
+if __name__ == "__main__":
+    main()
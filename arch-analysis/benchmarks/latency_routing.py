@@ -0,0 +1,262 @@
+"""
+Benchmark of latency-SLO routing and failover over a pool of backends.
+
+Two local StubChatModel backends are registered as the provider "stub":
+"stub:primary", the preferred and fastest one, and "stub:secondary", slower but
+within the SLO. The refine node is given the pool through ARCH_LLM_POOL_REFINE
+and ARCH_LLM_SLO_REFINE, and `--calls` streamed calls are made through
+backends.get_llm("refine") in three phases:
+
+    normal     both backends healthy
+    degraded   scenario "degrade": the primary's first-token latency rises to
+               `--degraded-latency`; scenario "outage": every primary call fails
+    recovered  the primary is healthy again
+
+The same calls are then made with the primary alone as the baseline.
+
+With `--check`, the failover rules of RoutedChatModel are also checked on their
+own, on a two-backend pool built directly: a failure before the first chunk
+moves the call to the other backend, a failure after it raises to the caller,
+and with every backend cooling down the best-ranked one is still tried.
+
+Reported per scenario and phase:
+    primary %     calls answered by the primary
+    p50 s, p95 s  time to the first token seen by the caller
+    slo %         calls whose first token came within the SLO
+    base slo %    the same with the primary alone
+    errors        calls that raised to the caller, with the baseline's after the slash
+    failovers     calls moved to another backend after an error
+
+Usage:
+    python benchmarks/latency_routing.py
+    python benchmarks/latency_routing.py --calls 150 --slo 0.1 --check -o router.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import backends  # noqa: E402
+from model_router import LatencyRouter, RoutedChatModel, percentile  # noqa: E402
+from stub_model import StubChatModel  # noqa: E402
+
+SCENARIOS = ["degrade", "outage"]
+PHASES = ["normal", "degraded", "recovered"]
+PROMPT = "Original description:\nan online shop with orders, payments and notifications"
+
+
+class FlakyStubChatModel(StubChatModel):
+    """
+    StubChatModel whose calls fail before the first token while `failing` is set,
+    and whose streams fail after the first chunk while `failing_mid_stream` is set
+    """
+
+    failing: bool = False
+    failing_mid_stream: bool = False
+
+    def _check(self):
+        if self.failing:
+            raise ConnectionError("stub backend unavailable")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._check()
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._check()
+        for i, chunk in enumerate(super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)):
+            if i and self.failing_mid_stream:
+                raise ConnectionError("stub backend dropped the stream")
+            yield chunk
+
+
+def set_phase(stubs: Dict[str, FlakyStubChatModel], scenario: str, phase: str, args: argparse.Namespace):
+    degraded = phase == "degraded"
+    stubs["primary"].first_token_latency = args.degraded_latency if degraded and scenario == "degrade" else args.latency
+    stubs["primary"].failing = degraded and scenario == "outage"
+
+
+def call(llm) -> Dict[str, Any]:
+    """One streamed call: time to the first token and the backend that answered"""
+    started = time.perf_counter()
+    ttft, backend = None, None
+    try:
+        for chunk in llm.stream(PROMPT):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+                backend = chunk.response_metadata.get("routed_backend", "stub:primary")
+    except Exception:
+        return {"error": True, "ttft": None, "backend": None}
+    return {"error": False, "ttft": ttft, "backend": backend}
+
+
+def failovers() -> int:
+    return sum(pool["failovers"] for pool in backends.router_stats().values())
+
+
+def run_calls(stubs: Dict[str, FlakyStubChatModel], scenario: str, pool: str,
+              args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """The calls of every phase and the failovers among them"""
+    os.environ["ARCH_LLM_POOL_REFINE"] = pool
+    backends.reset()
+    llm = backends.get_llm("refine")
+    per_phase = args.calls // len(PHASES)
+    calls = {}
+    for phase in PHASES:
+        set_phase(stubs, scenario, phase, args)
+        before = failovers()
+        calls[phase] = {"runs": [call(llm) for _ in range(per_phase)], "failovers": failovers() - before}
+    return calls
+
+
+def phase_report(routed_phase: Dict[str, Any], baseline_phase: Dict[str, Any], slo: float) -> Dict[str, Any]:
+    routed, baseline = routed_phase["runs"], baseline_phase["runs"]
+    ttfts = [run["ttft"] for run in routed if not run["error"]]
+    within = lambda runs: sum(1 for run in runs if not run["error"] and run["ttft"] <= slo) / len(runs)
+    return {
+        "calls": len(routed),
+        "primary_share": sum(1 for run in routed if run["backend"] == "stub:primary") / len(routed),
+        "p50_s": percentile(ttfts, 0.5) if ttfts else None,
+        "p95_s": percentile(ttfts, 0.95) if ttfts else None,
+        "slo_attainment": within(routed),
+        "baseline_slo_attainment": within(baseline),
+        "errors": sum(1 for run in routed if run["error"]),
+        "baseline_errors": sum(1 for run in baseline if run["error"]),
+        "failovers": routed_phase["failovers"],
+    }
+
+
+def run_scenario(stubs: Dict[str, FlakyStubChatModel], scenario: str, args: argparse.Namespace) -> Dict[str, Any]:
+    routed = run_calls(stubs, scenario, "stub:primary,stub:secondary", args)
+    stats = backends.router_stats()
+    baseline = run_calls(stubs, scenario, "stub:primary", args)
+    phases = {phase: phase_report(routed[phase], baseline[phase], args.slo) for phase in PHASES}
+    print(f"{scenario}: " + ", ".join(f"{phase} {report['primary_share']:.0%} on primary"
+                                      for phase, report in phases.items()), file=sys.stderr)
+    return {"phases": phases, "router": stats}
+
+
+def failover_checks() -> List[str]:
+    """Failures of the failover rules, checked on a pool of a primary and a secondary stub"""
+    def pool(cooldown: float = 60.0):
+        stubs = {name: FlakyStubChatModel(first_token_latency=0, tokens_per_second=0, refine_tokens=5)
+                 for name in ("primary", "secondary")}
+        router = LatencyRouter(list(stubs), cooldown=cooldown)
+        return stubs, router, RoutedChatModel(backends=stubs, router=router)
+
+    failures = []
+
+    stubs, router, llm = pool()
+    stubs["primary"].failing = True
+    try:
+        chunks = list(llm.stream(PROMPT))
+        if chunks[0].response_metadata.get("routed_backend") != "secondary" or router.failovers != 1:
+            failures.append("failure before the first chunk: the call did not move to the secondary")
+    except Exception as e:
+        failures.append(f"failure before the first chunk: raised to the caller ({e})")
+
+    stubs, router, llm = pool()
+    stubs["primary"].failing_mid_stream = True
+    received = []
+    try:
+        for chunk in llm.stream(PROMPT):
+            received.append(chunk)
+        failures.append("failure after the first chunk: the stream ended without an error")
+    except ConnectionError:
+        if len(received) != 1 or router.failovers or router.stats()["backends"]["secondary"]["calls"]:
+            failures.append("failure after the first chunk: the call moved to another backend")
+
+    stubs, router, llm = pool()
+    for stub in stubs.values():
+        stub.failing = True
+    try:
+        llm.invoke(PROMPT)
+    except ConnectionError:
+        pass
+    for stub in stubs.values():
+        stub.failing = False
+    if router.order() != ["primary", "secondary"]:
+        failures.append(f"every backend cooling down: order {router.order()} is not the configured one")
+    result = llm.invoke(PROMPT)
+    if result.response_metadata.get("routed_backend") != "primary":
+        failures.append("every backend cooling down: the call was not sent to the best-ranked backend")
+    return failures
+
+
+def seconds(value: Optional[float]) -> str:
+    return f"{value:>6.3f}" if value is not None else f"{'-':>6}"
+
+
+def summary(report: Dict[str, Dict[str, Any]]) -> str:
+    lines = [f"{'scenario':<9} {'phase':<10} {'primary %':>9} {'p50 s':>6} {'p95 s':>6} {'slo %':>6} "
+             f"{'base slo %':>10} {'errors':>7} {'failovers':>9}"]
+    for scenario, result in report.items():
+        for phase, stats in result["phases"].items():
+            lines.append(
+                f"{scenario:<9} {phase:<10} {stats['primary_share']:>9.0%} {seconds(stats['p50_s'])} "
+                f"{seconds(stats['p95_s'])} {stats['slo_attainment']:>6.0%} {stats['baseline_slo_attainment']:>10.0%} "
+                f"{stats['errors']:>3}/{stats['baseline_errors']:<3} {stats['failovers']:>9}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark latency-SLO routing and failover over stub backends.")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS, help="Scenarios to run")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--calls", type=int, default=90, help="Calls per scenario, split evenly across the phases")
+    parser.add_argument("--slo", type=float, default=0.1, help="p95 time-to-first-token target in seconds")
+    parser.add_argument("--latency", type=float, default=0.02, help="First-token latency of the healthy primary")
+    parser.add_argument("--secondary-latency", type=float, default=0.06, help="First-token latency of the secondary")
+    parser.add_argument("--degraded-latency", type=float, default=0.3, help="First-token latency of the degraded primary")
+    parser.add_argument("--window", type=float, default=0.5, help="Seconds of latency samples the router keeps")
+    parser.add_argument("--cooldown", type=float, default=0.5, help="Seconds a failed backend is only tried last")
+    parser.add_argument("--check", action="store_true",
+                        help="Fail when a routed call raises to the caller, traffic does not move off the degraded "
+                             "primary and back, or routing does not improve SLO attainment while it is degraded")
+    args = parser.parse_args(argv)
+
+    # Offline, deterministic runs: no response cache or cassette, the stub backends for the refine node
+    os.environ["ARCH_LLM_CACHE"] = "0"
+    os.environ.pop("ARCH_LLM_CASSETTE", None)
+    os.environ["ARCH_LLM_SLO_REFINE"] = str(args.slo)
+    os.environ["ARCH_LLM_ROUTER_WINDOW"] = str(args.window)
+    os.environ["ARCH_LLM_ROUTER_COOLDOWN"] = str(args.cooldown)
+    stubs = {
+        name: FlakyStubChatModel(first_token_latency=latency, tokens_per_second=0, refine_tokens=20)
+        for name, latency in (("primary", args.latency), ("secondary", args.secondary_latency))
+    }
+    backends.register_backend("stub", lambda model: stubs[model])
+
+    report = {scenario: run_scenario(stubs, scenario, args) for scenario in args.scenarios}
+    print(summary(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": {key: value for key, value in vars(args).items() if key != "output"},
+                       "scenarios": report}, f, indent=2)
+    if args.check:
+        failures = failover_checks()
+        for scenario, result in report.items():
+            phases = result["phases"]
+            failures += [f"{scenario}/{phase}: {stats['errors']} calls raised to the caller"
+                         for phase, stats in phases.items() if stats["errors"]]
+            if phases["degraded"]["primary_share"] >= 0.5:
+                failures.append(f"{scenario}: most calls stayed on the degraded primary")
+            if phases["recovered"]["primary_share"] < 0.5:
+                failures.append(f"{scenario}: calls did not return to the recovered primary")
+            if phases["degraded"]["slo_attainment"] <= phases["degraded"]["baseline_slo_attainment"]:
+                failures.append(f"{scenario}: routing did not improve SLO attainment while degraded")
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark of parallel section generation for the initial architecture.
+
+Every `--spec-tokens` size is run twice against StubChatModel, through
+ArchitectureProcessor.start_processing up to the human review: with the single
+`architecture` call, and with the graph built with `parallel_sections=True`
+(one concurrent `arch_section` run per section, then `arch_merge`). The stub
+streams at `--tokens-per-second` after a `--latency` first-token delay, as a
+provider would, so the runs take real time.
+
+Reported per size:
+    serial_s         wall time of the architecture step with one call
+    parallel_s       wall time of the sections and the merge
+    longest_section_s  the slowest `arch_section` run, the lower bound of the fan-out
+    merge_s          the `arch_merge` run (joining, consistency call, component model)
+    speedup          serial_s / parallel_s
+
+Usage:
+    python benchmarks/section_fanout.py
+    python benchmarks/section_fanout.py --spec-tokens 1200 6000 --tokens-per-second 100 --check
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import backends  # noqa: E402
+from agent import ArchitectureProcessor  # noqa: E402
+from sections import SECTION_TITLES, split_sections  # noqa: E402
+from stub_model import StubChatModel, filler_text  # noqa: E402
+
+
+def node_seconds(processor: ArchitectureProcessor, node: str) -> List[float]:
+    return [span["attributes"]["duration_seconds"] for span in processor.tracer.spans
+            if span["name"] == node and span["attributes"]["span.kind"] == "node"]
+
+
+def run_generation(parallel: bool, description: str) -> Dict[str, Any]:
+    """Time the architecture step of one session up to its human review"""
+    from workflow import create_agent_graph
+
+    processor = ArchitectureProcessor(create_agent_graph(parallel_sections=parallel))
+    started = time.perf_counter()
+    result = processor.start_processing(description)
+    wall = time.perf_counter() - started
+    _, sections = split_sections(result["state"]["architecture_spec"])
+    return {
+        "status": result["status"],
+        # The refine step is the same in both variants
+        "seconds": wall - sum(node_seconds(processor, "refine")),
+        "longest_section_s": max(node_seconds(processor, "arch_section"), default=None),
+        "merge_s": sum(node_seconds(processor, "arch_merge")),
+        "sections": len(sections),
+        "component_model": bool(result["state"]["architecture_model"]),
+    }
+
+
+def run_size(spec_tokens: int, args: argparse.Namespace) -> Dict[str, Any]:
+    backends.set_llm(StubChatModel(first_token_latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                   spec_tokens=spec_tokens, refine_tokens=50))
+    description = filler_text(100)
+    serial, parallel = run_generation(False, description), run_generation(True, description)
+    return {
+        "spec_tokens": spec_tokens,
+        "serial_s": serial["seconds"],
+        "parallel_s": parallel["seconds"],
+        "longest_section_s": parallel["longest_section_s"],
+        "merge_s": parallel["merge_s"],
+        "speedup": serial["seconds"] / parallel["seconds"],
+        "complete": all(run["status"] == "feedback_required" and run["component_model"]
+                        and run["sections"] == len(SECTION_TITLES) for run in (serial, parallel)),
+    }
+
+
+def summary(runs: List[Dict[str, Any]]) -> str:
+    lines = [f"{'spec tokens':>11} {'serial s':>9} {'parallel s':>11} {'longest s':>10} {'merge s':>8} {'speedup':>8}"]
+    for run in runs:
+        lines.append(
+            f"{run['spec_tokens']:>11} {run['serial_s']:>9.2f} {run['parallel_s']:>11.2f} "
+            f"{run['longest_section_s']:>10.2f} {run['merge_s']:>8.2f} {run['speedup']:>7.1f}x"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark parallel generation of the architecture sections.")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--spec-tokens", type=int, nargs="+", default=[1200, 3000, 6000],
+                        help="Length of a generated specification")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub first-token latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="Stub token rate")
+    parser.add_argument("--check", action="store_true",
+                        help="Fail when a spec is incomplete or the parallel variant is not faster")
+    args = parser.parse_args(argv)
+
+    # Offline, deterministic runs: no response cache or cassette, the stub for every node
+    os.environ["ARCH_LLM_CACHE"] = "0"
+    os.environ.pop("ARCH_LLM_CASSETTE", None)
+    os.environ.pop("ARCH_SEMANTIC_CACHE", None)
+
+    runs = [run_size(spec_tokens, args) for spec_tokens in args.spec_tokens]
+    print(summary(runs))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": {key: value for key, value in vars(args).items() if key != "output"},
+                       "runs": runs}, f, indent=2)
+    if args.check:
+        failures = [f"{run['spec_tokens']} tokens: incomplete specification or component model"
+                    for run in runs if not run["complete"]]
+        failures += [f"{run['spec_tokens']} tokens: parallel generation is not faster"
+                     for run in runs if run["parallel_s"] >= run["serial_s"]]
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
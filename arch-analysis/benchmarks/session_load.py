@@ -0,0 +1,184 @@
+"""
+Load test of many concurrent app sessions against a local stub model.
+
+Each session gets its own ArchitectureProcessor, as in the Streamlit app, and
+is driven through the worker pool: the description, `--rounds` feedback rounds,
+and it is left paused at human review, the state in which sessions spend most
+of their life. Two setups are compared:
+
+    per-session  every session compiles its own graph with its own checkpointer
+                 (what app.py did before the graph was shared)
+    shared       one compiled graph and one SharedMemorySaver for all sessions,
+                 sessions only differ by thread_id (what app.py does now)
+
+Reported per setup: wall time, graph build time, memory retained per paused
+session and peak memory (tracemalloc). Every session is then checked for state
+leaking from another session: its result and its whole checkpoint history must
+only mention its own session number.
+
+Usage:
+    python benchmarks/session_load.py --sessions 10 50
+    python benchmarks/session_load.py --sessions 100 --rounds 2 --check -o load.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import backends  # noqa: E402
+from agent import ArchitectureProcessor  # noqa: E402
+from stub_model import StubChatModel, filler_text  # noqa: E402
+from worker import WorkerPool  # noqa: E402
+
+MODES = ["per-session", "shared"]
+# Descriptions and feedback carry their session number; the stub model lowercases review replies
+SESSION_MARKER = re.compile(r"[Ss]ession (\d+):")
+
+
+def session_input(i: int) -> str:
+    return f"Session {i}: {filler_text(50, seed=i)}"
+
+
+def session_feedback(i: int, round_: int) -> str:
+    return f"Session {i}: add a cache in front of service {round_}"
+
+
+def leaks(processor: ArchitectureProcessor, i: int) -> List[str]:
+    """Markers of other sessions found anywhere in the checkpoint history of session `i`"""
+    found = set()
+    for snapshot in processor.graph.get_state_history(processor.thread_config):
+        for other in set(SESSION_MARKER.findall(repr(snapshot.values))) - {str(i)}:
+            found.add(f"session {i}: state of session {other} in checkpoint {snapshot.config['configurable']['checkpoint_id']}")
+    return sorted(found)
+
+
+def run_load(mode: str, sessions: int, rounds: int, workers: int) -> Dict[str, Any]:
+    from checkpoint import SharedMemorySaver
+    from workflow import create_agent_graph
+
+    pool = WorkerPool(max_workers=workers)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+
+    build_seconds = 0.0
+    shared_graph = None
+    processors = []
+    for _ in range(sessions):
+        build_started = time.perf_counter()
+        if mode == "shared":
+            if shared_graph is None:
+                shared_graph = create_agent_graph(checkpointer=SharedMemorySaver())
+            graph = shared_graph
+        else:
+            graph = create_agent_graph()
+        build_seconds += time.perf_counter() - build_started
+        processors.append(ArchitectureProcessor(graph))
+
+    jobs = [pool.submit(processor.start_processing, session_input(i)) for i, processor in enumerate(processors)]
+    results = [job.future.result() for job in jobs]
+    for round_ in range(rounds):
+        jobs = [pool.submit(processor.continue_with_feedback, session_feedback(i, round_))
+                for i, processor in enumerate(processors)]
+        results = [job.future.result() for job in jobs]
+    wall = time.perf_counter() - started
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    found = []
+    for i, (processor, result) in enumerate(zip(processors, results)):
+        if result["status"] != "feedback_required":
+            found.append(f"session {i}: status {result['status']}")
+        if result["state"]["raw_input"] != session_input(i):
+            found.append(f"session {i}: result of another session")
+        found.extend(leaks(processor, i))
+
+    return {
+        "mode": mode,
+        "sessions": sessions,
+        "rounds": rounds,
+        "wall_seconds": wall,
+        "build_seconds": build_seconds,
+        "retained_bytes_per_session": (current - baseline) / sessions,
+        "peak_memory_bytes": peak - baseline,
+        "leaks": found,
+    }
+
+
+def summary(results: Dict[str, Any]) -> str:
+    lines = [f"{'mode':<12} {'sessions':>8} {'wall s':>8} {'build ms':>9} {'KB/session':>11} {'peak MB':>8} {'leaks':>6}"]
+    for run in results["runs"]:
+        lines.append(
+            f"{run['mode']:<12} {run['sessions']:>8} {run['wall_seconds']:>8.2f} {run['build_seconds'] * 1000:>9.1f} "
+            f"{run['retained_bytes_per_session'] / 1e3:>11.1f} {run['peak_memory_bytes'] / 1e6:>8.2f} {len(run['leaks']):>6}"
+        )
+    return "\n".join(lines)
+
+
+def check(results: Dict[str, Any]) -> List[str]:
+    """Leaks, and shared runs not retaining less memory per session than per-session runs"""
+    failures = [leak for run in results["runs"] for leak in run["leaks"]]
+    by_key = {(run["mode"], run["sessions"]): run for run in results["runs"]}
+    for (mode, sessions), run in by_key.items():
+        other = by_key.get(("per-session", sessions))
+        if mode == "shared" and other and run["retained_bytes_per_session"] >= other["retained_bytes_per_session"]:
+            failures.append(f"{sessions} sessions: shared graph retains no less memory per session")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load test concurrent sessions with a shared or per-session graph.")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10, 50], help="Concurrent sessions per run")
+    parser.add_argument("--rounds", type=int, default=1, help="Feedback rounds per session")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--workers", type=int, default=16, help="Size of the worker pool")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub first-token latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Stub token rate, 0 for no delay")
+    parser.add_argument("--check", action="store_true",
+                        help="Fail on state leaking between sessions or when sharing does not save memory")
+    args = parser.parse_args(argv)
+
+    os.environ["ARCH_LLM_CACHE"] = "0"
+    os.environ.pop("ARCH_LLM_CASSETTE", None)
+    backends.set_llm(StubChatModel(first_token_latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                   spec_tokens=600))
+    # One warm-up session first, so that imports and module-level caches are not counted for the first run
+    run_load("shared", 1, args.rounds, 1)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "runs": [],
+    }
+    for sessions in args.sessions:
+        for mode in args.modes:
+            run = run_load(mode, sessions, args.rounds, args.workers)
+            results["runs"].append(run)
+            print(f"{mode} x {sessions} sessions: {run['wall_seconds']:.2f}s", file=sys.stderr)
+
+    print(summary(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.check:
+        failures = check(results)
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
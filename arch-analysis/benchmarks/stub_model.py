@@ -0,0 +1,177 @@
+"""
+Local stub chat model for benchmarks.
+
+`StubChatModel` answers the workflow prompts with deterministic text of a
+configurable length, streamed word by word after a fixed first-token latency
+and at a fixed token rate, so benchmark runs measure the workflow rather than
+a provider. It recognizes the prompts in prompt.py: refinement (a light
+refinement finds nothing to correct), full architecture generation/update,
+section updates (it returns exactly the requested sections), parallel section
+generation (the one requested section) and its merge (the component model
+only), Mermaid generation and the structured review call. Section 4 carries a
+```json example payload, as real specs often do, so the component model block
+has to be told apart from it.
+"""
+import asyncio
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from sections import SECTION_HEADING, SECTION_TITLES
+
+FILLER = ("the service stores orders in a relational database and publishes events to a queue so that "
+          "workers can process payments asynchronously while the gateway handles authentication and "
+          "rate limiting for every client request").split()
+COMPONENT_MODEL = {
+    "components": [
+        {"id": "webClient", "label": "Web Client", "kind": "client"},
+        {"id": "apiGateway", "label": "API Gateway", "kind": "service", "group": "Edge"},
+        {"id": "orderService", "label": "Order Service", "kind": "service", "group": "Core"},
+        {"id": "paymentWorker", "label": "Payment Worker", "kind": "service", "group": "Core"},
+        {"id": "orderQueue", "label": "Order Queue", "kind": "queue"},
+        {"id": "ordersDb", "label": "Orders DB", "kind": "database"},
+        {"id": "paymentProvider", "label": "Payment Provider", "kind": "external"},
+    ],
+    "relationships": [
+        {"source": "webClient", "target": "apiGateway", "label": "HTTPS"},
+        {"source": "apiGateway", "target": "orderService", "label": "REST"},
+        {"source": "orderService", "target": "ordersDb", "label": "SQL"},
+        {"source": "orderService", "target": "orderQueue", "label": "OrderCreated", "kind": "async"},
+        {"source": "orderQueue", "target": "paymentWorker", "kind": "async"},
+        {"source": "paymentWorker", "target": "paymentProvider", "label": "REST"},
+    ],
+}
+MERMAID = """```mermaid
+flowchart TD
+    webClient(["Web Client"]);
+    apiGateway["API Gateway"];
+    orderService["Order Service"];
+    ordersDb[("Orders DB")];
+    webClient --> apiGateway;
+    apiGateway --> orderService;
+    orderService --> ordersDb;
+```"""
+EXAMPLE_PAYLOAD = {"orderId": "o-123", "items": [{"sku": "A1", "quantity": 2}], "total": 42.5}
+APPROVALS = {"done", "ok", "okay", "looks good", "lgtm", "approved", "yes"}
+
+
+def filler_text(words: int, seed: int = 0) -> str:
+    """Deterministic prose of about `words` words"""
+    return " ".join(FILLER[(seed + i) % len(FILLER)] for i in range(max(1, words)))
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Deterministic streaming chat model with a configurable latency profile.
+
+    Attributes:
+        first_token_latency: Seconds before the first chunk of every call
+        tokens_per_second: Rate of the following chunks (one word each), 0 for no delay
+        refine_tokens: Length of the refined description
+        spec_tokens: Length of a full architecture specification
+        component_model: Append the JSON component model to architecture answers
+    """
+
+    first_token_latency: float = 0.05
+    tokens_per_second: float = 2000.0
+    refine_tokens: int = 300
+    spec_tokens: int = 1200
+    component_model: bool = True
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"spec_tokens": self.spec_tokens, "refine_tokens": self.refine_tokens}
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _section(self, number: int, title: str, words: int) -> str:
+        text = f"## {number}. {title}\n{filler_text(words, seed=number + self.calls)}\n"
+        if number == 4:
+            text += f"Example payload:\n```json\n{json.dumps(EXAMPLE_PAYLOAD)}\n```\n"
+        return text
+
+    def _answer(self, messages: List[BaseMessage], kwargs: Dict[str, Any]) -> Tuple[str, Optional[Dict]]:
+        """The text of the answer, or the arguments of a tool call for structured output"""
+        self.calls += 1
+        prompt = "\n".join(str(message.content) for message in messages)
+        if kwargs.get("tools"):
+            reply = str(messages[-1].content).strip().lower()
+            satisfied = reply in APPROVALS
+            return "", {"is_satisfied": satisfied, "specific_feedback": "" if satisfied else reply}
+        if "Mermaid.js diagram expert" in prompt:
+            return MERMAID, None
+        if "wrong text => corrected text" in prompt:
+            return "NONE", None
+        model = f"\n```json\n{json.dumps(COMPONENT_MODEL)}\n```" if self.component_model else ""
+        words_per_section = max(1, self.spec_tokens // len(SECTION_TITLES))
+        if "SECTION TO WRITE:" in prompt:
+            match = SECTION_HEADING.search(prompt.split("SECTION TO WRITE:", 1)[1])
+            return self._section(int(match.group(2)), match.group(3).strip(), words_per_section), None
+        if "written independently and in parallel" in prompt:
+            return model.lstrip("\n"), None
+        if "SECTIONS TO REVISE:" in prompt:
+            to_revise = prompt.split("SECTIONS TO REVISE:", 1)[1].split("OTHER SECTIONS", 1)[0]
+            sections = [self._section(int(match.group(2)), match.group(3).strip(), words_per_section)
+                        for match in SECTION_HEADING.finditer(to_revise)]
+            return "\n".join(sections) + model, None
+        if "## 1." in prompt:
+            sections = [self._section(i, title, words_per_section) for i, title in enumerate(SECTION_TITLES, 1)]
+            return "\n".join(sections) + model, None
+        return filler_text(self.refine_tokens, seed=self.calls), None
+
+    @staticmethod
+    def _chunks(text: str, tool_args: Optional[Dict]) -> List[AIMessageChunk]:
+        if tool_args is not None:
+            return [AIMessageChunk(content="", tool_call_chunks=[
+                tool_call_chunk(name="HumanFeedback", args=json.dumps(tool_args), id="call_stub", index=0)
+            ])]
+        return [AIMessageChunk(content=token) for token in re.findall(r"\S+\s*|\s+", text)]
+
+    def _deadlines(self, count: int) -> Iterator[float]:
+        """Monotonic times at which each chunk is due"""
+        start = time.perf_counter() + self.first_token_latency
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for i in range(count):
+            yield start + i * interval
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text, tool_args = self._answer(messages, kwargs)
+        chunks = self._chunks(text, tool_args)
+        *_, last = self._deadlines(len(chunks))
+        time.sleep(max(0.0, last - time.perf_counter()))
+        if tool_args is not None:
+            message = AIMessage(content="", tool_calls=[{"name": "HumanFeedback", "args": tool_args, "id": "call_stub"}])
+        else:
+            message = AIMessage(content=text)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text, tool_args = self._answer(messages, kwargs)
+        chunks = self._chunks(text, tool_args)
+        for chunk, deadline in zip(chunks, self._deadlines(len(chunks))):
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        text, tool_args = self._answer(messages, kwargs)
+        chunks = self._chunks(text, tool_args)
+        for chunk, deadline in zip(chunks, self._deadlines(len(chunks))):
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=chunk)
@@ -0,0 +1,364 @@
+"""
+Per-node benchmark of the architecture workflow against a local stub model.
+
+Each scenario drives ArchitectureProcessor.start_processing and
+continue_with_feedback through a number of feedback rounds and an approval,
+with descriptions from small to very large. The model is a StubChatModel with
+a configurable first-token latency and token rate, so no provider is called.
+
+Reported per scenario:
+    nodes       runs and wall time per graph node
+    llm         calls, time to first token and duration per node
+    callbacks   calls of the processor's message callback, time spent in them
+                and characters passed (the callback receives the whole message so far)
+    checkpoint  calls and time of every checkpointer operation (save = put/put_writes,
+                load = get_tuple/list)
+    memory      peak traced allocation during a second, traced run of the scenario
+
+Usage:
+    python benchmarks/workflow_bench.py -o bench.json
+    python benchmarks/workflow_bench.py --rounds 0 5 --sizes small large --checkpointer sqlite
+    python benchmarks/workflow_bench.py -o new.json --compare bench.json
+    python benchmarks/workflow_bench.py --rounds 0 1 5 --sizes small --check
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.callbacks import BaseCallbackHandler  # noqa: E402
+from langgraph.checkpoint.base import BaseCheckpointSaver  # noqa: E402
+
+import backends  # noqa: E402
+from agent import ArchitectureProcessor  # noqa: E402
+from sections import SECTION_TITLES, split_sections  # noqa: E402
+from stub_model import StubChatModel, filler_text  # noqa: E402
+
+# Description length in words
+SIZES = {"small": 50, "medium": 500, "large": 5000, "xlarge": 20000}
+ROUNDS = [0, 1, 5, 20]
+# Review replies cycled through the feedback rounds; the question is left to the LLM evaluator
+FEEDBACK = [
+    "Add a Redis cache in front of the orders database",
+    "Use Kafka for the data flow between the order service and the workers",
+    "what about deploying to multiple regions?",
+    "Replace the payment provider integration with Stripe webhooks",
+]
+APPROVAL = "done"
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Collects node wall times and per-call LLM timings from LangChain callbacks"""
+
+    def __init__(self):
+        self.node_runs: Dict[str, List[float]] = defaultdict(list)
+        self.llm_calls: Dict[str, List[Dict[str, float]]] = defaultdict(list)
+        self._nodes: Dict[Any, tuple] = {}
+        self._llms: Dict[Any, Dict[str, Any]] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # The node's own run, not the prompt/model runnables inside it
+        if node and kwargs.get("name") == node:
+            self._nodes[run_id] = (node, time.perf_counter())
+
+    def _end_node(self, run_id):
+        if run_id in self._nodes:
+            node, started = self._nodes.pop(run_id)
+            self.node_runs[node].append(time.perf_counter() - started)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_node(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        # human_review ends with an interrupt, which surfaces as an error
+        self._end_node(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node", "-")
+        self._llms[run_id] = {"node": node, "started": time.perf_counter(), "ttft": None}
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        call = self._llms.get(run_id)
+        if call is not None and call["ttft"] is None:
+            call["ttft"] = time.perf_counter() - call["started"]
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        call = self._llms.pop(run_id, None)
+        if call is not None:
+            duration = time.perf_counter() - call["started"]
+            self.llm_calls[call["node"]].append({
+                "seconds": duration,
+                "ttft": call["ttft"] if call["ttft"] is not None else duration,
+            })
+
+
+class InstrumentedGraph:
+    """Compiled graph proxy that adds the NodeTimer to every stream/invoke call"""
+
+    def __init__(self, graph, handler: BaseCallbackHandler):
+        self.graph = graph
+        self.handler = handler
+
+    def _config(self, config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        config = dict(config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [self.handler]
+        return config
+
+    def stream(self, graph_input, config=None, **kwargs):
+        return self.graph.stream(graph_input, self._config(config), **kwargs)
+
+    def invoke(self, graph_input, config=None, **kwargs):
+        return self.graph.invoke(graph_input, self._config(config), **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+
+class TimedCheckpointer(BaseCheckpointSaver):
+    """Checkpointer wrapper that records the time of every operation"""
+
+    def __init__(self, inner: BaseCheckpointSaver):
+        super().__init__(serde=inner.serde)
+        self.inner = inner
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+
+    def _timed(self, operation: str, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.timings[operation].append(time.perf_counter() - started)
+
+    def put(self, *args, **kwargs):
+        return self._timed("put", self.inner.put, *args, **kwargs)
+
+    def put_writes(self, *args, **kwargs):
+        return self._timed("put_writes", self.inner.put_writes, *args, **kwargs)
+
+    def get_tuple(self, *args, **kwargs):
+        return self._timed("get_tuple", self.inner.get_tuple, *args, **kwargs)
+
+    def list(self, *args, **kwargs):
+        return iter(self._timed("list", lambda: list(self.inner.list(*args, **kwargs))))
+
+    def delete_thread(self, *args, **kwargs):
+        return self._timed("delete_thread", self.inner.delete_thread, *args, **kwargs)
+
+    def get_next_version(self, current, channel):
+        return self.inner.get_next_version(current, channel)
+
+
+def expected_node_runs(rounds: int) -> Dict[str, int]:
+    """
+    Node runs of a session with `rounds` feedback rounds and an approval: every
+    reply resumes human_review once, every change request regenerates once
+    """
+    return {"refine": 1, "architecture": rounds + 1, "human_review": rounds + 1, "gen_mermaid": 1}
+
+
+def check_node_runs(scenario: Dict[str, Any]) -> List[str]:
+    """Differences between the node runs of a scenario and expected_node_runs"""
+    expected = expected_node_runs(scenario["rounds"])
+    actual = {node: stats["runs"] for node, stats in scenario["nodes"].items()}
+    return [
+        f"{scenario['size']} x {scenario['rounds']} rounds: {node} ran {actual.get(node, 0)} times, expected {runs}"
+        for node, runs in expected.items() if actual.get(node, 0) != runs
+    ]
+
+
+def check_spec(scenario: Dict[str, Any], component_model: bool) -> List[str]:
+    """Sections or component model lost from the final architecture or the streamed message of a scenario"""
+    name = f"{scenario['size']} x {scenario['rounds']} rounds"
+    failures = []
+    if scenario["spec_sections"] != len(SECTION_TITLES):
+        failures.append(f"{name}: the final spec has {scenario['spec_sections']} of {len(SECTION_TITLES)} sections")
+    if component_model and not scenario["component_model"]:
+        failures.append(f"{name}: the component model was lost")
+    if scenario["message_sections"] != len(SECTION_TITLES):
+        failures.append(f"{name}: the streamed message has {scenario['message_sections']} of "
+                        f"{len(SECTION_TITLES)} sections")
+    if scenario["model_in_message"]:
+        failures.append(f"{name}: the component model block was streamed to the user")
+    return failures
+
+
+def make_checkpointer(kind: str, directory: str) -> BaseCheckpointSaver:
+    if kind == "sqlite":
+        from checkpoint import SqliteCheckpointer
+        return SqliteCheckpointer(os.path.join(directory, "bench.db"))
+    from langgraph.checkpoint.memory import MemorySaver
+    return MemorySaver()
+
+
+def run_scenario(description: str, rounds: int, checkpointer_kind: str) -> Dict[str, Any]:
+    """Run one description through `rounds` feedback rounds and the approval"""
+    from workflow import create_agent_graph
+
+    handler = NodeTimer()
+    callback_stats = {"calls": 0, "seconds": 0.0, "chars": 0}
+
+    def message_callback(message: str):
+        # Stands in for the UI: the cost measured is that of producing and passing the message
+        started = time.perf_counter()
+        callback_stats["calls"] += 1
+        callback_stats["chars"] += len(message)
+        callback_stats["seconds"] += time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        checkpointer = TimedCheckpointer(make_checkpointer(checkpointer_kind, directory))
+        processor = ArchitectureProcessor(InstrumentedGraph(create_agent_graph(checkpointer=checkpointer), handler))
+        started = time.perf_counter()
+        result = processor.start_processing(description, message_callback)
+        # The message streamed up to the first review: the refined description and the spec
+        first_message = result["message"]
+        for i in range(rounds):
+            result = processor.continue_with_feedback(FEEDBACK[i % len(FEEDBACK)], message_callback)
+        if result["status"] == "feedback_required":
+            result = processor.continue_with_feedback(APPROVAL, message_callback)
+        wall = time.perf_counter() - started
+        if hasattr(checkpointer.inner, "close"):
+            checkpointer.inner.close()
+
+    state = result.get("state", {})
+    return {
+        "status": result["status"],
+        "wall_seconds": wall,
+        "spec_sections": len(split_sections(state.get("architecture_spec", ""))[1]),
+        "component_model": bool(state.get("architecture_model")),
+        # The refined description runs into the first heading, so look for every heading itself
+        "message_sections": sum(1 for i, title in enumerate(SECTION_TITLES, 1) if f"## {i}. {title}" in first_message),
+        "model_in_message": '"components"' in first_message,
+        "nodes": {
+            node: {"runs": len(times), "total_seconds": sum(times), "mean_seconds": statistics.mean(times),
+                   "max_seconds": max(times)}
+            for node, times in handler.node_runs.items()
+        },
+        "llm": {
+            node: {"calls": len(calls), "total_seconds": sum(c["seconds"] for c in calls),
+                   "ttft_mean_seconds": statistics.mean(c["ttft"] for c in calls),
+                   "ttft_max_seconds": max(c["ttft"] for c in calls)}
+            for node, calls in handler.llm_calls.items()
+        },
+        "callbacks": callback_stats,
+        "checkpoint": {
+            operation: {"calls": len(times), "total_seconds": sum(times), "mean_seconds": statistics.mean(times)}
+            for operation, times in checkpointer.timings.items()
+        },
+    }
+
+
+def peak_memory(description: str, rounds: int, checkpointer_kind: str) -> int:
+    """Peak traced allocation of a scenario (in a separate run, tracing slows everything down)"""
+    tracemalloc.start()
+    try:
+        run_scenario(description, rounds, checkpointer_kind)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> str:
+    """Wall time and peak memory of matching scenarios in two result files"""
+    before = {(s["size"], s["rounds"]): s for s in previous["scenarios"]}
+    lines = [f"{'size':<7} {'rounds':>6} {'wall s':>8} {'before':>8} {'ratio':>6}  {'peak MB':>8} {'before':>8}"]
+    for scenario in current["scenarios"]:
+        old = before.get((scenario["size"], scenario["rounds"]))
+        if old is None:
+            continue
+        lines.append(
+            f"{scenario['size']:<7} {scenario['rounds']:>6} {scenario['wall_seconds']:>8.3f} "
+            f"{old['wall_seconds']:>8.3f} {scenario['wall_seconds'] / old['wall_seconds']:>6.2f}  "
+            f"{(scenario.get('peak_memory_bytes') or 0) / 1e6:>8.2f} {(old.get('peak_memory_bytes') or 0) / 1e6:>8.2f}"
+        )
+    return "\n".join(lines)
+
+
+def summary(results: Dict[str, Any]) -> str:
+    lines = [f"{'size':<7} {'rounds':>6} {'wall s':>8} {'ttft ms':>8} {'cb calls':>9} {'cb MB':>7} "
+             f"{'ckpt ms':>8} {'peak MB':>8}  node runs"]
+    for scenario in results["scenarios"]:
+        ttfts = [llm["ttft_mean_seconds"] for llm in scenario["llm"].values()]
+        checkpoint_seconds = sum(op["total_seconds"] for op in scenario["checkpoint"].values())
+        runs = " ".join(f"{node}={stats['runs']}" for node, stats in scenario["nodes"].items())
+        lines.append(
+            f"{scenario['size']:<7} {scenario['rounds']:>6} {scenario['wall_seconds']:>8.3f} "
+            f"{(statistics.mean(ttfts) if ttfts else 0) * 1000:>8.1f} {scenario['callbacks']['calls']:>9} "
+            f"{scenario['callbacks']['chars'] / 1e6:>7.2f} {checkpoint_seconds * 1000:>8.1f} "
+            f"{(scenario.get('peak_memory_bytes') or 0) / 1e6:>8.2f}  {runs}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the architecture workflow per node against a stub model.")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--rounds", type=int, nargs="+", default=ROUNDS, help="Feedback rounds per scenario")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES), help="Description sizes")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub first-token latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0, help="Stub token rate, 0 for no delay")
+    parser.add_argument("--spec-tokens", type=int, default=1200, help="Length of a generated specification")
+    parser.add_argument("--no-component-model", action="store_true",
+                        help="Do not emit the component model, so Mermaid code comes from the LLM")
+    parser.add_argument("--checkpointer", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced run measuring peak memory")
+    parser.add_argument("--compare", help="Previous result file to compare wall time and memory with")
+    parser.add_argument("--check", action="store_true",
+                        help="Fail unless every node ran the expected number of times per feedback round and "
+                             "the final spec and the streamed message kept all their sections, the spec its "
+                             "component model and the message none")
+    args = parser.parse_args(argv)
+
+    # Offline, deterministic runs: no response cache or cassette, the stub for every node
+    os.environ["ARCH_LLM_CACHE"] = "0"
+    os.environ.pop("ARCH_LLM_CASSETTE", None)
+    os.environ.pop("ARCH_PARALLEL_SECTIONS", None)
+    stub = StubChatModel(first_token_latency=args.latency, tokens_per_second=args.tokens_per_second,
+                         spec_tokens=args.spec_tokens, component_model=not args.no_component_model)
+    backends.set_llm(stub)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "scenarios": [],
+    }
+    for size in args.sizes:
+        description = filler_text(SIZES[size])
+        for rounds in args.rounds:
+            scenario = {"size": size, "description_words": SIZES[size], "rounds": rounds}
+            scenario.update(run_scenario(description, rounds, args.checkpointer))
+            scenario["peak_memory_bytes"] = None if args.no_memory else peak_memory(description, rounds, args.checkpointer)
+            results["scenarios"].append(scenario)
+            print(f"{size} x {rounds} rounds: {scenario['wall_seconds']:.3f}s", file=sys.stderr)
+
+    print(summary(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print(compare(results, json.load(f)))
+    if args.check:
+        failures = [failure for scenario in results["scenarios"] for failure in check_node_runs(scenario)]
+        failures += [failure for scenario in results["scenarios"]
+                     for failure in check_spec(scenario, not args.no_component_model)]
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
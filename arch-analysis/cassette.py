@@ -0,0 +1,280 @@
+"""
+Record/replay of chat model calls for offline benchmarks and regression tests.
+
+A cassette is a JSONL file with one interaction per line: the prompt, the
+bound tool names, the streamed chunks and the delay before each chunk. In
+replay mode `CassetteChatModel` serves every call from the cassette, sleeping
+the recorded delays (scaled by `speed`) between chunks, so the graph, the
+`messages` stream and ArchitectureProcessor behave as they do live, without a
+provider or credentials.
+
+Modes:
+    record  Call the live model for every request and rewrite the cassette
+    replay  Serve every request from the cassette, raise CassetteMiss otherwise
+    auto    Replay known requests, record the others (appending to the cassette)
+
+Identical requests recorded several times are replayed in recorded order; the
+last recording is reused once they are exhausted.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, message_chunk_to_message
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables.config import ensure_config
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import ConfigDict
+
+from llm_cache import _CHUNK_FIELDS, message_to_chunk
+
+MODES = ("record", "replay", "auto")
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode for a request that is not on the cassette"""
+
+
+def _prompt(messages: List[BaseMessage]) -> List[Dict[str, Any]]:
+    prompt = []
+    for message in messages:
+        entry = {"type": message.type, "content": message.content}
+        if getattr(message, "tool_calls", None):
+            entry["tool_calls"] = [{"name": tc["name"], "args": tc["args"]} for tc in message.tool_calls]
+        prompt.append(entry)
+    return prompt
+
+
+def _tool_names(kwargs: Dict[str, Any]) -> List[str]:
+    """Names of the bound tools, whatever format the provider converted them to"""
+    names = []
+    for tool in kwargs.get("tools") or []:
+        if isinstance(tool, dict):
+            names.append(tool.get("function", {}).get("name") or tool.get("name", ""))
+    return sorted(names)
+
+
+def request_key(prompt: List[Dict[str, Any]], tools: List[str], stop: Optional[List[str]]) -> str:
+    """
+    Key of a request. It ignores the model name and provider-specific kwargs so
+    that a cassette recorded with one provider replays without constructing it.
+    """
+    payload = json.dumps({"prompt": prompt, "tools": tools, "stop": stop or []}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Interactions of one cassette file, indexed by request key"""
+
+    def __init__(self, path: str, mode: str = "auto"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.recorded = 0
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._interactions: Dict[str, List[Dict[str, Any]]] = {}
+        self._positions: Dict[str, int] = {}
+        if mode == "record" or not os.path.exists(path):
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            open(path, "w", encoding="utf-8").close()
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    self._interactions.setdefault(interaction["key"], []).append(interaction)
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """The next recorded interaction for a key, or None when it has to be recorded"""
+        if self.mode == "record":
+            return None
+        with self._lock:
+            recordings = self._interactions.get(key)
+            if not recordings:
+                if self.mode == "replay":
+                    raise CassetteMiss(f"Request {key[:12]} is not on cassette {self.path}")
+                return None
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            self.replayed += 1
+            return recordings[min(position, len(recordings) - 1)]
+
+    def append(self, interaction: Dict[str, Any]):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(interaction) + "\n")
+            recordings = self._interactions.setdefault(interaction["key"], [])
+            recordings.append(interaction)
+            # A request recorded now is not replayed again in the same session
+            self._positions[interaction["key"]] = len(recordings)
+            self.recorded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "interactions": sum(len(recordings) for recordings in self._interactions.values()),
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+            }
+
+
+class _Recorder:
+    """Collects the chunks of one live call and the delay before each of them"""
+
+    def __init__(self):
+        self.chunks: List[Dict[str, Any]] = []
+        self.delays: List[float] = []
+        self._last = time.perf_counter()
+
+    def add(self, chunk: ChatGenerationChunk):
+        now = time.perf_counter()
+        self.delays.append(round(now - self._last, 6))
+        self._last = now
+        self.chunks.append(chunk.message.model_dump(include=_CHUNK_FIELDS))
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model that records the calls of a live model to a Cassette and replays them.
+
+    In replay mode `llm` may be None: tools are then bound in the OpenAI format
+    and nothing provider-specific is imported or constructed.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    llm: Optional[BaseChatModel] = None
+    cassette: Cassette
+    # Replay speed relative to the recording: 2.0 replays twice as fast, 0 without delays
+    speed: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cassette-{self.llm._llm_type}" if self.llm else "cassette"
+
+    def bind_tools(self, tools, **kwargs):
+        if self.llm is not None:
+            bound = self.llm.bind_tools(tools, **kwargs)
+            return self.bind(**bound.kwargs)
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _request(self, messages: List[BaseMessage], stop: Optional[List[str]],
+                 kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]:
+        prompt = _prompt(messages)
+        tools = _tool_names(kwargs)
+        key = request_key(prompt, tools, stop)
+        return key, {"prompt": prompt, "tools": tools, "stop": stop}, self.cassette.lookup(key)
+
+    def _live(self) -> BaseChatModel:
+        if self.llm is None:
+            raise CassetteMiss(f"No live model to record with (cassette {self.cassette.path})")
+        return self.llm
+
+    def _save(self, key: str, request: Dict[str, Any], recorder: _Recorder, run_manager):
+        # Streaming calls do not get a run manager; the node is then read from the current config
+        metadata = getattr(run_manager, "metadata", None) or ensure_config().get("metadata", {})
+        self.cassette.append({
+            "key": key,
+            "node": metadata.get("langgraph_node"),
+            "model": self.llm._llm_type,
+            **request,
+            "chunks": recorder.chunks,
+            "delays": recorder.delays,
+        })
+
+    def _delay(self, seconds: float) -> float:
+        return seconds / self.speed if self.speed > 0 else 0.0
+
+    @staticmethod
+    def _result(interaction: Dict[str, Any]) -> ChatResult:
+        message = None
+        for data in interaction["chunks"]:
+            chunk = AIMessageChunk(**data)
+            message = chunk if message is None else message + chunk
+        return ChatResult(generations=[ChatGeneration(message=message_chunk_to_message(message))])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key, request, interaction = self._request(messages, stop, kwargs)
+        if interaction is not None:
+            time.sleep(self._delay(sum(interaction["delays"])))
+            return self._result(interaction)
+
+        recorder = _Recorder()
+        result = self._live()._generate(messages, stop=stop, **kwargs)
+        recorder.add(ChatGenerationChunk(message=message_to_chunk(result.generations[0].message)))
+        self._save(key, request, recorder, run_manager)
+        return result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        key, request, interaction = self._request(messages, stop, kwargs)
+        if interaction is not None:
+            for data, delay in zip(interaction["chunks"], interaction["delays"]):
+                time.sleep(self._delay(delay))
+                yield ChatGenerationChunk(message=AIMessageChunk(**data))
+            return
+
+        recorder = _Recorder()
+        for chunk in self._live()._stream(messages, stop=stop, **kwargs):
+            recorder.add(chunk)
+            yield chunk
+        self._save(key, request, recorder, run_manager)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key, request, interaction = self._request(messages, stop, kwargs)
+        if interaction is not None:
+            await asyncio.sleep(self._delay(sum(interaction["delays"])))
+            return self._result(interaction)
+
+        recorder = _Recorder()
+        result = await self._live()._agenerate(messages, stop=stop, **kwargs)
+        recorder.add(ChatGenerationChunk(message=message_to_chunk(result.generations[0].message)))
+        self._save(key, request, recorder, run_manager)
+        return result
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        key, request, interaction = self._request(messages, stop, kwargs)
+        if interaction is not None:
+            for data, delay in zip(interaction["chunks"], interaction["delays"]):
+                await asyncio.sleep(self._delay(delay))
+                yield ChatGenerationChunk(message=AIMessageChunk(**data))
+            return
+
+        recorder = _Recorder()
+        async for chunk in self._live()._astream(messages, stop=stop, **kwargs):
+            recorder.add(chunk)
+            yield chunk
+        self._save(key, request, recorder, run_manager)
@@ -0,0 +1,479 @@
+import asyncio
+import random
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+
+class CompactSerializer(JsonPlusSerializer):
+    """
+    msgpack serializer that additionally zlib-compresses larger payloads.
+
+    AgentState is dominated by long markdown strings (descriptions, specs,
+    message history) which compress well, so checkpoints shrink several times
+    compared to the plain msgpack encoding.
+    """
+
+    def __init__(self, min_compress_size: int = 512, level: int = 6):
+        super().__init__()
+        self.min_compress_size = min_compress_size
+        self.level = level
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = super().dumps_typed(obj)
+        if len(data) >= self.min_compress_size:
+            return f"{type_}+zlib", zlib.compress(data, self.level)
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.endswith("+zlib"):
+            return super().loads_typed((type_[:-5], zlib.decompress(payload)))
+        return super().loads_typed(data)
+
+
+class SqliteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    File-backed checkpointer built on SQLite in WAL mode.
+
+    Checkpoints are written in one transaction each. Intermediate task writes
+    are buffered and flushed together with the next checkpoint (or on the next
+    read), except interrupt/error/resume writes which are flushed immediately so
+    a paused human review survives a restart.
+    """
+
+    def __init__(
+        self,
+        path: str = "checkpoints.db",
+        *,
+        serde: Optional[JsonPlusSerializer] = None,
+        batch_size: int = 64,
+        keep_last: Optional[int] = None,
+    ):
+        super().__init__(serde=serde or CompactSerializer())
+        self.path = path
+        self.batch_size = batch_size
+        self.keep_last = keep_last
+        self._lock = threading.RLock()
+        self._pending_writes: List[tuple] = []
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                type TEXT,
+                checkpoint BLOB,
+                metadata_type TEXT,
+                metadata BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT,
+                value BLOB,
+                task_path TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            """
+        )
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self.conn.close()
+
+    def __enter__(self) -> "SqliteCheckpointer":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # ----- Write path -----
+
+    def flush(self):
+        """Write all buffered task writes in a single transaction"""
+        with self._lock:
+            if not self._pending_writes:
+                return
+            rows, self._pending_writes = self._pending_writes, []
+            with self._transaction():
+                self._insert_writes(rows)
+
+    def _transaction(self):
+        # The connection runs in autocommit mode, so open the transaction
+        # explicitly; using the connection as a context manager commits or rolls back
+        self.conn.execute("BEGIN")
+        return self.conn
+
+    def _insert_writes(self, rows: List[tuple]):
+        replace = [row for row in rows if row[4] < 0]
+        ignore = [row for row in rows if row[4] >= 0]
+        sql = "INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        if replace:
+            self.conn.executemany("INSERT OR REPLACE " + sql, replace)
+        if ignore:
+            self.conn.executemany("INSERT OR IGNORE " + sql, ignore)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, data = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            rows, self._pending_writes = self._pending_writes, []
+            with self._transaction():
+                self._insert_writes(rows)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        type_,
+                        data,
+                        metadata_type,
+                        metadata_data,
+                    ),
+                )
+            if self.keep_last:
+                self.prune(self.keep_last, thread_id=thread_id)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        urgent = False
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self.serde.dumps_typed(value)
+            rows.append((
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                type_,
+                data,
+                task_path,
+            ))
+            urgent = urgent or channel in WRITES_IDX_MAP
+        with self._lock:
+            self._pending_writes.extend(rows)
+            if urgent or len(self._pending_writes) >= self.batch_size:
+                self.flush()
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        """
+        Zero-padded "<counter>.<random>" string versions, as MemorySaver produces,
+        so versions compare correctly as strings; int versions of older
+        databases are continued
+        """
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ----- Read path -----
+
+    def _row_to_tuple(self, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, data, metadata_type, metadata_data = row
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed((type_, data)),
+            metadata=self.serde.loads_typed((metadata_type, metadata_data)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((w_type, value)))
+                for task_id, channel, w_type, value in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            self.flush()
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._row_to_tuple(row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (f"SELECT thread_id, checkpoint_ns, checkpoint_id, metadata_type, metadata FROM checkpoints "
+                 f"{where} ORDER BY checkpoint_id DESC")
+        if limit is not None and not filter:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            self.flush()
+            # Only the keys and metadata are read to pick the rows, the checkpoint blobs
+            # of the rows returned are read afterwards
+            keys = []
+            for thread_id, checkpoint_ns, checkpoint_id, metadata_type, metadata_data in self.conn.execute(query, params):
+                if limit is not None and len(keys) >= limit:
+                    break
+                if filter:
+                    metadata = self.serde.loads_typed((metadata_type, metadata_data))
+                    if not all(metadata.get(k) == v for k, v in filter.items()):
+                        continue
+                keys.append((thread_id, checkpoint_ns, checkpoint_id))
+            results = [
+                self._row_to_tuple(self.conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", key
+                ).fetchone())
+                for key in keys
+            ]
+        yield from results
+
+    # ----- Maintenance -----
+
+    def prune(self, keep_last: int, thread_id: Optional[str] = None) -> int:
+        """
+        Keep only the latest `keep_last` checkpoints per thread (and namespace).
+
+        Args:
+            keep_last: Number of most recent checkpoints to keep, at least 1
+            thread_id: Restrict pruning to one thread; all threads when None
+
+        Returns:
+            The number of checkpoints deleted
+        """
+        if keep_last < 1:
+            raise ValueError("keep_last must be at least 1")
+        thread_clause = "WHERE thread_id = ?" if thread_id else ""
+        params = (thread_id,) if thread_id else ()
+        with self._lock:
+            self.flush()
+            with self._transaction():
+                stale = self.conn.execute(
+                    f"""
+                    SELECT thread_id, checkpoint_ns, checkpoint_id FROM (
+                        SELECT thread_id, checkpoint_ns, checkpoint_id,
+                               ROW_NUMBER() OVER (
+                                   PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                               ) AS rank
+                        FROM checkpoints {thread_clause}
+                    ) WHERE rank > ?
+                    """,
+                    (*params, keep_last),
+                ).fetchall()
+                self.conn.executemany(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    stale,
+                )
+                self.conn.executemany(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    stale,
+                )
+        return len(stale)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self.flush()
+            with self._transaction():
+                self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                self.conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+    # ----- Async API (SQLite calls run in a worker thread) -----
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+class SharedMemorySaver(MemorySaver):
+    """
+    In-memory checkpointer safe to share between the sessions of a server.
+
+    MemorySaver's dicts are read and written without a lock; here every
+    operation holds one, and `list` returns a snapshot. Since the saver
+    outlives the sessions using it, only the `max_threads` most recently
+    written threads are kept (0 keeps all), so abandoned sessions do not
+    accumulate.
+    """
+
+    def __init__(self, *, serde: Optional[JsonPlusSerializer] = None, max_threads: int = 1000):
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        self._lock = threading.RLock()
+        self._threads: "OrderedDict[str, None]" = OrderedDict()
+
+    def _touch(self, thread_id: str):
+        self._threads[thread_id] = None
+        self._threads.move_to_end(thread_id)
+        while self.max_threads and len(self._threads) > self.max_threads:
+            oldest, _ = self._threads.popitem(last=False)
+            super().delete_thread(oldest)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with self._lock:
+            # Reading through the defaultdict would re-create deleted or evicted threads
+            if config["configurable"]["thread_id"] not in self.storage:
+                return None
+            return super().get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], **kwargs: Any) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            if config and config["configurable"]["thread_id"] not in self.storage:
+                return iter([])
+            return iter(list(super().list(config, **kwargs)))
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        with self._lock:
+            self._touch(config["configurable"]["thread_id"])
+            return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        with self._lock:
+            return super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._threads.pop(thread_id, None)
+            super().delete_thread(thread_id)
@@ -0,0 +1,113 @@
+"""
+Bounded conversation memory for `AgentState.messages`.
+
+Every node appends the artifact it produced (refined description, architecture
+spec, Mermaid code) to `messages`, although the same text already lives in its
+own state field. `compact_messages` is the reducer used for `messages`: it
+merges like `add_messages` and then keeps the conversation under a byte budget
+by replacing older turns with short references, always leaving the most recent
+turns verbatim.
+
+Configuration (read once at import):
+    ARCH_MESSAGES_MAX_BYTES   Budget for the content of all messages (default 16384, 0 disables compaction)
+    ARCH_MESSAGES_KEEP_LAST   Number of most recent messages never compacted (default 2)
+"""
+import hashlib
+import os
+from typing import Any, Dict, List, Optional
+
+MAX_BYTES = int(os.getenv("ARCH_MESSAGES_MAX_BYTES", 16 * 1024))
+KEEP_LAST = int(os.getenv("ARCH_MESSAGES_KEEP_LAST", 2))
+
+# Characters of a compacted message without an artifact field that are kept as its summary
+SUMMARY_CHARS = 200
+
+
+def _content_bytes(message: Any) -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return len(content.encode("utf-8"))
+
+
+def _compacted(message: Any) -> Any:
+    """A short stand-in for `message` with the same id, so it replaces the original in place"""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    artifact = message.additional_kwargs.get("artifact")
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+    if artifact:
+        # Nodes start their message with a one-line title ("Generated architecture specification:")
+        title = content.strip().splitlines()[0].rstrip(":") if content.strip() else artifact
+        summary = f"[{title}: {len(content)} characters, sha256 {digest}. The latest version is in state['{artifact}'].]"
+    else:
+        summary = content[:SUMMARY_CHARS].rstrip()
+        if len(content) > SUMMARY_CHARS:
+            summary += f"... [{len(content) - SUMMARY_CHARS} more characters compacted, sha256 {digest}]"
+    return message.model_copy(update={
+        "content": summary,
+        "additional_kwargs": {**message.additional_kwargs, "compacted": True},
+    })
+
+
+def compact(messages: List[Any], max_bytes: int = MAX_BYTES, keep_last: int = KEEP_LAST) -> List[Any]:
+    """
+    Replace the oldest messages with references until the content fits `max_bytes`.
+
+    The last `keep_last` messages are never touched, so the budget may still
+    be exceeded when they alone are larger than it.
+    """
+    if max_bytes <= 0:
+        return messages
+    total = sum(_content_bytes(message) for message in messages)
+    if total <= max_bytes:
+        return messages
+    compacted = list(messages)
+    for i in range(max(0, len(compacted) - keep_last)):
+        if total <= max_bytes:
+            break
+        if compacted[i].additional_kwargs.get("compacted"):
+            continue
+        replacement = _compacted(compacted[i])
+        total += _content_bytes(replacement) - _content_bytes(compacted[i])
+        compacted[i] = replacement
+    return compacted
+
+
+def compact_messages(left: List[Any], right: Any) -> List[Any]:
+    """Reducer for AgentState.messages: `add_messages` followed by `compact`"""
+    from langgraph.graph import add_messages
+    return compact(add_messages(left, right))
+
+
+def checkpoint_report(graph, config: Dict[str, Any], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Serialized size of every checkpoint of a thread, oldest first.
+
+    Args:
+        graph: A compiled graph with a checkpointer
+        config: Config identifying the thread, e.g. ArchitectureProcessor.thread_config
+        limit: Only report the most recent `limit` checkpoints
+
+    Returns:
+        One record per step with the checkpoint size in bytes, the size of its
+        `messages` channel and the number of messages
+    """
+    checkpointer = graph.checkpointer
+    report = []
+    for checkpoint_tuple in checkpointer.list(config, limit=limit):
+        channel_values = checkpoint_tuple.checkpoint.get("channel_values", {})
+        messages = channel_values.get("messages", [])
+        report.append({
+            "step": checkpoint_tuple.metadata.get("step"),
+            "source": checkpoint_tuple.metadata.get("source"),
+            "bytes": len(checkpointer.serde.dumps_typed(checkpoint_tuple.checkpoint)[1]),
+            "messages_bytes": len(checkpointer.serde.dumps_typed(messages)[1]),
+            "messages": len(messages),
+        })
+    return list(reversed(report))
+
+
+def format_report(report: List[Dict[str, Any]]) -> str:
+    lines = [f"{'step':>4}  {'source':<6}  {'bytes':>9}  {'messages':>9}  {'count':>5}"]
+    for row in report:
+        lines.append(f"{row['step']:>4}  {row['source'] or '':<6}  {row['bytes']:>9}  "
+                     f"{row['messages_bytes']:>9}  {row['messages']:>5}")
+    return "\n".join(lines)
@@ -0,0 +1,197 @@
+"""
+Local, deterministic classifier for human review replies.
+
+Obvious approvals ("done", "looks good") and obvious change requests ("add a
+Redis cache") are settled without a model round trip; anything uncertain is
+left to the LLM evaluator in `human_review_node`. A local change verdict
+triggers a regeneration, so it is only given for a clause starting with an
+imperative verb and no approval phrase anywhere in the reply: "we need
+multi-region", "I prefer this version" or "looks good, use it" go to the LLM.
+
+Run `python feedback_classifier.py [samples.jsonl]` to report how often the
+classifier short-circuits and how often it agrees with the labelled LLM
+verdicts in `fixtures/feedback_samples.jsonl`.
+"""
+import json
+import os
+import re
+import sys
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from schema import HumanFeedback
+
+# Phrases that on their own mean the reviewer accepts the architecture
+APPROVAL_PHRASES = [
+    "looks good to me", "looks great", "looks good", "looks fine", "sounds good", "all good",
+    "good to go", "ship it", "that works", "works for me", "no changes", "no more changes",
+    "no further changes", "nothing to change", "i am satisfied", "i'm satisfied", "im satisfied",
+    "approved", "approve", "lgtm", "done", "ok", "okay", "yes", "yep", "yeah", "perfect",
+    "great", "good", "fine", "excellent", "awesome", "nice", "accept", "accepted",
+]
+# Words that may accompany an approval without changing its meaning
+FILLER_WORDS = {"thanks", "thank", "you", "it", "this", "that", "is", "all", "very", "so", "really",
+                "now", "we", "are", "i", "am", "and", "the", "architecture", "design", "spec", "to", "me"}
+# Verbs that ask for a change when they start a clause ("add a cache", "please use Kafka")
+IMPERATIVE_VERBS = {"add", "remove", "delete", "drop", "replace", "swap", "switch", "use", "change", "include",
+                    "introduce", "split", "merge", "move", "rename", "update", "incorporate", "consider",
+                    "integrate", "migrate", "extract", "make"}
+# Words leading into the verb of a clause
+CLAUSE_LEADS = re.compile(r"^((and|but|also|then|so|please|just|kindly|maybe|(can|could|would|will) you)\s+)+")
+CLAUSE_SPLIT = re.compile(r"[,.;:!?\n]+|\s+(?:and|but|then)\s+")
+# Objects that refer to the presented architecture itself ("use it", "use this one")
+REFERENCE_WORDS = {"it", "this", "that", "one", "version", "as", "is", "the", "current", "architecture",
+                   "design", "spec", "them", "these", "those", "please", "thanks"}
+# Negations that turn a change verb into an approval ("no need to change anything")
+NEGATED_CHANGE_PATTERN = re.compile(
+    r"\b(no need to|don't|do not|dont|nothing to|no further|no more|not necessary to)\b"
+)
+POLITE_QUESTION_PATTERN = re.compile(r"^(can|could|would|will) you\b|^please\b")
+
+
+def _normalize(text: str) -> str:
+    text = text.lower().replace("’", "'")
+    text = re.sub(r"[^\w\s'?]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _is_approval(normalized: str) -> bool:
+    remainder = f" {normalized.replace('?', '')} "
+    matched = False
+    for phrase in APPROVAL_PHRASES:
+        if f" {phrase} " in remainder:
+            remainder = remainder.replace(f" {phrase} ", " ")
+            matched = True
+    return matched and all(word in FILLER_WORDS for word in remainder.split())
+
+
+def _has_approval_phrase(normalized: str) -> bool:
+    padded = f" {normalized.replace('?', '')} "
+    return any(f" {phrase} " in padded for phrase in APPROVAL_PHRASES)
+
+
+def _is_change_request(text: str) -> bool:
+    """Whether a clause of `text` starts with an imperative verb acting on something new"""
+    for clause in CLAUSE_SPLIT.split(text.lower().replace("’", "'")):
+        words = CLAUSE_LEADS.sub("", _normalize(clause)).split()
+        if words and words[0] in IMPERATIVE_VERBS and not all(word in REFERENCE_WORDS for word in words[1:]):
+            return True
+    return False
+
+
+def classify_feedback(text: str) -> Optional[HumanFeedback]:
+    """
+    Classify a review reply without the LLM.
+
+    Returns:
+        A HumanFeedback when the reply is an obvious approval or change
+        request, None when the LLM should decide
+    """
+    if not isinstance(text, str):
+        return None
+    normalized = _normalize(text)
+    if not normalized:
+        return None
+
+    # "No need to change anything", "don't change it": approval if nothing else is asked for
+    if NEGATED_CHANGE_PATTERN.search(normalized):
+        rest = NEGATED_CHANGE_PATTERN.sub(" ", normalized)
+        rest = re.sub(r"\b(change|changes|modify|anything|else|more|further)\b", " ", rest)
+        if not rest.split() or _is_approval(rest) or all(word in FILLER_WORDS for word in rest.split()):
+            return HumanFeedback(is_satisfied=True, specific_feedback="")
+        return None
+
+    # Any other negation ("not good", "no") is left to the LLM unless a change is spelled out
+    if re.search(r"\b(not|no|nope|never|isn't|doesn't|aren't|wrong|bad)\b", normalized):
+        if _is_change_request(text) and not _has_approval_phrase(normalized):
+            return HumanFeedback(is_satisfied=False, specific_feedback=text.strip())
+        return None
+
+    if _is_approval(normalized):
+        return HumanFeedback(is_satisfied=True, specific_feedback="")
+
+    # Mixed replies ("looks good, but add a cache", "great, use it") are left to the LLM
+    if _has_approval_phrase(normalized):
+        return None
+    # Questions are only change requests when phrased as a polite imperative
+    if "?" in normalized and not POLITE_QUESTION_PATTERN.search(normalized):
+        return None
+    if _is_change_request(text):
+        return HumanFeedback(is_satisfied=False, specific_feedback=text.strip())
+    return None
+
+
+class FeedbackClassifier:
+    """Thread-safe wrapper around classify_feedback that counts its decisions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.approvals = 0
+        self.change_requests = 0
+        self.fallbacks = 0
+
+    def classify(self, text: str) -> Optional[HumanFeedback]:
+        feedback = classify_feedback(text)
+        with self._lock:
+            self.total += 1
+            if feedback is None:
+                self.fallbacks += 1
+            elif feedback.is_satisfied:
+                self.approvals += 1
+            else:
+                self.change_requests += 1
+        return feedback
+
+    def stats(self) -> Dict[str, Any]:
+        """How often the LLM round trip was short-circuited"""
+        with self._lock:
+            short_circuited = self.approvals + self.change_requests
+            return {
+                "total": self.total,
+                "short_circuited": short_circuited,
+                "short_circuit_rate": short_circuited / self.total if self.total else 0.0,
+                "approvals": self.approvals,
+                "change_requests": self.change_requests,
+                "llm_fallbacks": self.fallbacks,
+            }
+
+
+def evaluate(samples: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compare the classifier with labelled LLM verdicts.
+
+    Args:
+        samples: Records with `text` and the LLM's `is_satisfied` verdict
+
+    Returns:
+        Coverage (share settled locally) and agreement with the LLM on those
+    """
+    total = decided = agreed = 0
+    disagreements = []
+    for sample in samples:
+        total += 1
+        feedback = classify_feedback(sample["text"])
+        if feedback is None:
+            continue
+        decided += 1
+        if feedback.is_satisfied == sample["is_satisfied"]:
+            agreed += 1
+        else:
+            disagreements.append(sample["text"])
+    return {
+        "samples": total,
+        "short_circuited": decided,
+        "short_circuit_rate": decided / total if total else 0.0,
+        "agreement": agreed / decided if decided else 0.0,
+        "disagreements": disagreements,
+    }
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "fixtures", "feedback_samples.jsonl"
+    )
+    with open(path, "r", encoding="utf-8") as f:
+        report = evaluate(json.loads(line) for line in f if line.strip())
+    print(json.dumps(report, indent=2))
@@ -1,88 +1,144 @@
-import re
-from typing import Optional, Union
+import hashlib
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from functools import lru_cache
+from string import Template
+from typing import Optional, Tuple, Union
 
-def convert_mermaid_block(text: str) -> str:
+from mermaid_validator import strip_backticks, strip_fences
+
+MERMAID_VERSION = "10.9.1"
+MERMAID_CDN_URL = f"https://cdn.jsdelivr.net/npm/mermaid@{MERMAID_VERSION}/dist/mermaid.min.js"
+MERMAID_REGISTRY_URL = "https://registry.npmjs.org/mermaid/{version}"
+# Vendored bundle (`python helper.py` fetches it), served by Streamlit's static file
+# serving (.streamlit/config.toml) at <server.baseUrlPath>/app/static/
+MERMAID_ASSET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "mermaid.min.js")
+MERMAID_ASSET_PATH = "app/static/mermaid.min.js"
+# Rendered documents kept in memory, least recently used evicted first
+HTML_CACHE_SIZE = int(os.getenv("ARCH_MERMAID_HTML_CACHE", "64"))
+
+
+def _base_url_path() -> str:
+    try:
+        import streamlit as st
+        return (st.get_option("server.baseUrlPath") or "").strip("/")
+    except Exception:
+        return ""
+
+
+def mermaid_script_src() -> str:
     """
-    1. If the input text is wrapped in triple backticks with 'mermaid' on the opening line,
-       extract the content without the markdown delimiters.
-    2. Replace single backticks with actual triple double quotes.
+    URL the diagram iframes load mermaid.js from: ARCH_MERMAID_JS_URL if set,
+    the vendored bundle if present, otherwise the CDN (with a warning).
+    Checked on every render, so a bundle vendored while the app runs is used.
     """
-    pattern = r"```\s*mermaid\s*\n(.*?)\n```"
-    match = re.search(pattern, text, re.DOTALL)
-    if match:
-        text = match.group(1)
-    text = text.replace('`', '"""')
-    return text
+    if os.getenv("ARCH_MERMAID_JS_URL"):
+        return os.environ["ARCH_MERMAID_JS_URL"]
+    if os.path.exists(MERMAID_ASSET):
+        # Absolute, so it resolves the same from any page and under server.baseUrlPath
+        return "/" + "/".join(part for part in (_base_url_path(), MERMAID_ASSET_PATH) if part)
+    warnings.warn(f"{MERMAID_ASSET} not found, diagrams load mermaid.js from {MERMAID_CDN_URL}; "
+                  f"run `python helper.py` to vendor it", RuntimeWarning)
+    return MERMAID_CDN_URL
 
-def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
+
+def vendor_mermaid(version: str = MERMAID_VERSION, path: str = MERMAID_ASSET) -> str:
     """
-    Render Mermaid code using client-side rendering with mermaid.js.
-    Includes a fullscreen toggle, zoom controls, and error handling.
-    Updated to add a delay for proper initialization.
+    Download mermaid.min.js of a mermaid release into static/ from the npm registry.
+
+    The package tarball is checked against the integrity hash the registry
+    publishes for the release before dist/mermaid.min.js is extracted.
+
+    Returns:
+        The SHA-256 of the written bundle
     """
-    try:
-        # Clean up the mermaid code if it has markdown fences
-        clean_code = convert_mermaid_block(mermaid_code)
-        
-        # Escape special characters for embedding in JavaScript if needed
-        escaped_code = clean_code.replace('"', '\\"').replace('\n', '\\n')
+    import base64
+    import io
+    import json
+    import tarfile
+    import urllib.request
+
+    with urllib.request.urlopen(MERMAID_REGISTRY_URL.format(version=version), timeout=30) as response:
+        dist = json.load(response)["dist"]
+    with urllib.request.urlopen(dist["tarball"], timeout=120) as response:
+        tarball = response.read()
+    algorithm, _, expected = dist["integrity"].partition("-")
+    if base64.b64encode(hashlib.new(algorithm, tarball).digest()).decode() != expected:
+        raise ValueError(f"{dist['tarball']} does not match the registry integrity {dist['integrity']}")
+    with tarfile.open(fileobj=io.BytesIO(tarball), mode="r:gz") as archive:
+        bundle = archive.extractfile("package/dist/mermaid.min.js").read()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(bundle)
+    os.replace(f"{path}.tmp", path)
+    return hashlib.sha256(bundle).hexdigest()
 
-        html = f"""
-<!DOCTYPE html>
+def convert_mermaid_block(text: str) -> str:
+    """
+    1. If the input text is wrapped in triple backticks with 'mermaid' on the opening line,
+       extract the content without the markdown delimiters.
+    2. Remove stray backticks outside quoted labels (quoted "`markdown`" labels are kept).
+    """
+    return strip_backticks(strip_fences(text))
+
+# The document around the diagram code; rendering is a concatenation of its parts for the script URL
+_HTML_TEMPLATE = Template("""<!DOCTYPE html>
 <html>
 <head>
-    <script src="https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.min.js"></script>
+    <script src="$script_src"></script>
     <script>
-        document.addEventListener('DOMContentLoaded', function() {{
+        document.addEventListener('DOMContentLoaded', function() {
             // Delay initialization to ensure all resources are loaded
-            setTimeout(function() {{
-                try {{
-                    mermaid.initialize({{
+            setTimeout(function() {
+                try {
+                    mermaid.initialize({
                         startOnLoad: true,
                         theme: 'default',
                         securityLevel: 'loose',
                         fontFamily: 'arial, sans-serif',
-                        flowchart: {{
+                        flowchart: {
                             htmlLabels: true,
                             curve: 'linear'
-                        }},
-                        er: {{
+                        },
+                        er: {
                             layoutDirection: 'TB',
                             entityPadding: 15
-                        }},
-                        sequence: {{
+                        },
+                        sequence: {
                             diagramMarginX: 50,
                             diagramMarginY: 30,
                             actorMargin: 50,
                             boxMargin: 10
-                        }}
-                    }});
+                        }
+                    });
                     // Reinitialize Mermaid on all elements with the class "mermaid"
                     mermaid.init(undefined, document.querySelectorAll('.mermaid'));
-                }} catch (e) {{
+                } catch (e) {
                     const errorDiv = document.getElementById('error-message');
                     errorDiv.style.display = 'block';
                     errorDiv.innerHTML = 'Error initializing mermaid: ' + e.message;
-                }}
-            }}, 300); // Delay of 300ms, adjust as needed
+                }
+            }, 300); // Delay of 300ms, adjust as needed
 
-            window.onerror = function(msg, url, line) {{
+            window.onerror = function(msg, url, line) {
                 const errorDiv = document.getElementById('error-message');
                 errorDiv.style.display = 'block';
                 errorDiv.innerHTML = 'Error rendering diagram: ' + msg + ' (line ' + line + ')';
                 return true;
-            }};
-        }});
+            };
+        });
     </script>
     <style>
-        body {{
+        body {
             margin: 0;
             padding: 0;
             background-color: transparent;
             font-family: Arial, sans-serif;
             overflow: hidden;
-        }}
-        #error-message {{
+        }
+        #error-message {
             display: none;
             color: red;
             background-color: #ffeeee;
@@ -91,9 +147,9 @@ def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
             padding: 10px;
             margin: 10px;
             font-family: 'Courier New', monospace;
-        }}
+        }
         /* Main zoom controls */
-        .zoom-controls {{
+        .zoom-controls {
             position: absolute;
             top: 10px;
             right: 10px;
@@ -102,8 +158,8 @@ def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
             border-radius: 4px;
             padding: 5px;
             z-index: 1000;
-        }}
-        .zoom-controls button {{
+        }
+        .zoom-controls button {
             background: white;
             border: 1px solid #ccc;
             border-radius: 4px;
@@ -112,22 +168,22 @@ def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
             width: 30px;
             height: 30px;
             font-size: 16px;
-        }}
+        }
         /* Main mermaid container */
-        #main-mermaid {{
+        #main-mermaid {
             display: flex;
             justify-content: center;
             align-items: center;
             width: 100%;
             min-height: 100px;
             font-family: 'Arial', sans-serif;
-        }}
-        #main-mermaid svg {{
+        }
+        #main-mermaid svg {
             max-width: 100%;
             height: auto !important;
-        }}
+        }
         /* Fullscreen container */
-        #fullscreen-container {{
+        #fullscreen-container {
             position: fixed;
             top: 0;
             left: 0;
@@ -141,21 +197,21 @@ def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
             align-items: center;
             box-sizing: border-box;
             overflow: hidden;
-        }}
-        #fullscreen-mermaid {{
+        }
+        #fullscreen-mermaid {
             width: 100%;
             height: 90%;
             display: flex;
             justify-content: center;
             align-items: center;
-        }}
-        #fullscreen-mermaid svg {{
+        }
+        #fullscreen-mermaid svg {
             width: 95% !important;
             height: 95% !important;
             max-width: none !important;
             max-height: none !important;
-        }}
-        .close-fullscreen {{
+        }
+        .close-fullscreen {
             position: absolute;
             top: 20px;
             right: 20px;
@@ -166,9 +222,9 @@ def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
             cursor: pointer;
             font-size: 16px;
             z-index: 10000;
-        }}
+        }
         /* Fullscreen zoom controls (only visible in fullscreen mode) */
-        .fullscreen-zoom-controls {{
+        .fullscreen-zoom-controls {
             position: absolute;
             top: 10px;
             left: 10px;
@@ -177,8 +233,8 @@ def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
             border-radius: 4px;
             padding: 5px;
             z-index: 1000;
-        }}
-        .fullscreen-zoom-controls button {{
+        }
+        .fullscreen-zoom-controls button {
             background: white;
             border: 1px solid #ccc;
             border-radius: 4px;
@@ -187,13 +243,13 @@ def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
             width: 30px;
             height: 30px;
             font-size: 16px;
-        }}
-        @media (max-width: 768px) {{
-            #fullscreen-mermaid svg {{
+        }
+        @media (max-width: 768px) {
+            #fullscreen-mermaid svg {
                 width: 100% !important;
                 height: auto !important;
-            }}
-        }}
+            }
+        }
     </style>
 </head>
 <body>
@@ -207,7 +263,7 @@ def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
     </div>
     <!-- Main diagram container -->
     <div id="main-mermaid" class="mermaid">
-{clean_code}
+{code}
     </div>
     <!-- Fullscreen container -->
     <div id="fullscreen-container">
@@ -226,72 +282,72 @@ def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
         let scale = 1;
         let fullscreenScale = 1;
 
-        function zoomIn() {{
+        function zoomIn() {
             scale += 0.1;
             applyZoom();
-        }}
+        }
         
-        function zoomOut() {{
-            if (scale > 0.3) {{
+        function zoomOut() {
+            if (scale > 0.3) {
                 scale -= 0.1;
                 applyZoom();
-            }}
-        }}
+            }
+        }
         
-        function resetZoom() {{
+        function resetZoom() {
             scale = 1;
             applyZoom();
-        }}
+        }
         
-        function applyZoom() {{
+        function applyZoom() {
             const container = document.getElementById('main-mermaid');
             const svg = container.querySelector('svg');
-            if (svg) {{
+            if (svg) {
                 svg.style.transform = 'scale(' + scale + ')';
                 svg.style.transformOrigin = 'center center';
-            }}
-        }}
+            }
+        }
 
         // Fullscreen zoom functions
-        function zoomInFullscreen() {{
+        function zoomInFullscreen() {
             fullscreenScale += 0.1;
             applyFullscreenZoom();
-        }}
+        }
 
-        function zoomOutFullscreen() {{
-            if (fullscreenScale > 0.3) {{
+        function zoomOutFullscreen() {
+            if (fullscreenScale > 0.3) {
                 fullscreenScale -= 0.1;
                 applyFullscreenZoom();
-            }}
-        }}
+            }
+        }
 
-        function resetFullscreenZoom() {{
+        function resetFullscreenZoom() {
             fullscreenScale = 1;
             applyFullscreenZoom();
-        }}
+        }
 
-        function applyFullscreenZoom() {{
+        function applyFullscreenZoom() {
             const container = document.getElementById('fullscreen-mermaid');
             const svg = container.querySelector('svg');
-            if (svg) {{
+            if (svg) {
                 svg.style.transform = 'scale(' + fullscreenScale + ')';
                 svg.style.transformOrigin = 'center center';
-            }}
-        }}
+            }
+        }
 
-        function toggleFullScreen() {{
+        function toggleFullScreen() {
             const fullscreenContainer = document.getElementById('fullscreen-container');
             const fullscreenMermaid = document.getElementById('fullscreen-mermaid');
             const mainMermaid = document.getElementById('main-mermaid');
 
-            if (fullscreenContainer.style.display !== 'flex') {{
+            if (fullscreenContainer.style.display !== 'flex') {
                 // Enter fullscreen mode
                 fullscreenContainer.style.display = 'flex';
                 fullscreenMermaid.innerHTML = mainMermaid.innerHTML;
-                setTimeout(() => {{
+                setTimeout(() => {
                     mermaid.init(undefined, fullscreenMermaid);
                     const fullscreenSvg = fullscreenMermaid.querySelector('svg');
-                    if (fullscreenSvg) {{
+                    if (fullscreenSvg) {
                         fullscreenSvg.setAttribute('width', '100%');
                         fullscreenSvg.setAttribute('height', '100%');
                         fullscreenSvg.style.width = '100%';
@@ -299,32 +355,32 @@ def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
                         fullscreenSvg.style.maxWidth = 'none';
                         fullscreenSvg.style.maxHeight = 'none';
                         applyFullscreenZoom();
-                    }}
-                }}, 50);
+                    }
+                }, 50);
                 
-                if (document.documentElement.requestFullscreen) {{
+                if (document.documentElement.requestFullscreen) {
                     document.documentElement.requestFullscreen();
-                }} else if (document.documentElement.mozRequestFullScreen) {{
+                } else if (document.documentElement.mozRequestFullScreen) {
                     document.documentElement.mozRequestFullScreen();
-                }} else if (document.documentElement.webkitRequestFullscreen) {{
+                } else if (document.documentElement.webkitRequestFullscreen) {
                     document.documentElement.webkitRequestFullscreen();
-                }} else if (document.documentElement.msRequestFullscreen) {{
+                } else if (document.documentElement.msRequestFullscreen) {
                     document.documentElement.msRequestFullscreen();
-                }}
-            }} else {{
+                }
+            } else {
                 // Exit fullscreen mode
                 fullscreenContainer.style.display = 'none';
-                if (document.exitFullscreen) {{
+                if (document.exitFullscreen) {
                     document.exitFullscreen();
-                }} else if (document.mozCancelFullScreen) {{
+                } else if (document.mozCancelFullScreen) {
                     document.mozCancelFullScreen();
-                }} else if (document.webkitExitFullscreen) {{
+                } else if (document.webkitExitFullscreen) {
                     document.webkitExitFullscreen();
-                }} else if (document.msExitFullscreen) {{
+                } else if (document.msExitFullscreen) {
                     document.msExitFullscreen();
-                }}
-            }}
-        }}
+                }
+            }
+        }
 
         // Listen for browser fullscreen changes
         document.addEventListener('fullscreenchange', handleFullscreenChange);
@@ -332,37 +388,79 @@ def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
         document.addEventListener('mozfullscreenchange', handleFullscreenChange);
         document.addEventListener('MSFullscreenChange', handleFullscreenChange);
         
-        function handleFullscreenChange() {{
+        function handleFullscreenChange() {
             if (!document.fullscreenElement && 
                 !document.webkitFullscreenElement && 
                 !document.mozFullScreenElement && 
-                !document.msFullscreenElement) {{
+                !document.msFullscreenElement) {
                 const fullscreenContainer = document.getElementById('fullscreen-container');
-                if (fullscreenContainer.style.display === 'flex') {{
+                if (fullscreenContainer.style.display === 'flex') {
                     fullscreenContainer.style.display = 'none';
-                }}
-            }}
-        }}
+                }
+            }
+        }
 
         // Adjust SVG size on window resize
-        window.addEventListener('resize', function() {{
+        window.addEventListener('resize', function() {
             const fullscreenContainer = document.getElementById('fullscreen-container');
-            if (fullscreenContainer.style.display === 'flex') {{
+            if (fullscreenContainer.style.display === 'flex') {
                 const fullscreenSvg = document.getElementById('fullscreen-mermaid').querySelector('svg');
-                if (fullscreenSvg) {{
+                if (fullscreenSvg) {
                     fullscreenSvg.setAttribute('width', '100%');
                     fullscreenSvg.setAttribute('height', '100%');
-                }}
-            }}
-        }});
+                }
+            }
+        });
     </script>
 </body>
 </html>
-"""
-        return html
+""")
+
+
+@lru_cache(maxsize=4)
+def _html_parts(script_src: str) -> Tuple[str, str]:
+    head, tail = _HTML_TEMPLATE.safe_substitute(script_src=script_src).split("{code}")
+    return head, tail
+
+
+_html_cache: "OrderedDict[str, str]" = OrderedDict()
+_html_cache_lock = threading.Lock()
+_html_cache_stats = {"hits": 0, "misses": 0}
+
+def render_mermaid_code(mermaid_code: str) -> Union[str, None]:
+    """
+    Render Mermaid code using client-side rendering with mermaid.js.
+    Includes a fullscreen toggle, zoom controls, and error handling.
+    Documents are memoized by a hash of the code, so reruns with an unchanged
+    diagram reuse the same string.
+    """
+    script_src = mermaid_script_src()
+    key = hashlib.sha256(f"{script_src}\n{mermaid_code}".encode("utf-8")).hexdigest()
+    with _html_cache_lock:
+        html = _html_cache.get(key)
+        if html is not None:
+            _html_cache.move_to_end(key)
+            _html_cache_stats["hits"] += 1
+            return html
+    try:
+        # Clean up the mermaid code if it has markdown fences
+        clean_code = convert_mermaid_block(mermaid_code)
+        head, tail = _html_parts(script_src)
+        html = head + clean_code + tail
     except Exception as e:
         print(f"Error generating mermaid diagram: {str(e)}")
         return None
+    with _html_cache_lock:
+        _html_cache_stats["misses"] += 1
+        _html_cache[key] = html
+        while len(_html_cache) > HTML_CACHE_SIZE:
+            _html_cache.popitem(last=False)
+    return html
+
+def html_cache_info() -> dict:
+    """Hits, misses and size of the rendered HTML cache"""
+    with _html_cache_lock:
+        return {**_html_cache_stats, "entries": len(_html_cache), "max_entries": HTML_CACHE_SIZE}
 
 def display_mermaid(mermaid_code: str, height: int = 800) -> Optional[str]:
     """
@@ -370,3 +468,12 @@ def display_mermaid(mermaid_code: str, height: int = 800) -> Optional[str]:
     The height parameter is used for the main view, but fullscreen will use 100% of the viewport.
     """
     return render_mermaid_code(mermaid_code)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Vendor the pinned mermaid.js bundle into static/.")
+    parser.add_argument("--version", default=MERMAID_VERSION, help="mermaid release to fetch")
+    args = parser.parse_args()
+    print(f"{MERMAID_ASSET}: mermaid {args.version}, sha256 {vendor_mermaid(args.version)}")
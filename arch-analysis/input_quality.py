@@ -0,0 +1,261 @@
+"""
+Local, deterministic assessment of a project description before refinement.
+
+`assess` measures the length, the structure (headings, bullet points,
+paragraphs) and the typo density of the raw input and picks how much of the
+refine stage it needs:
+
+    full   short or sloppy descriptions go through the normal refine prompt,
+           which rewrites and expands them
+    light  longer, clean descriptions only get their typos fixed: the model
+           lists corrections (`wrong => right`) that are applied locally, so
+           its answer is a few lines instead of the whole text again
+    skip   polished, structured specifications go straight to architecture
+           generation
+
+Typos are found without a dictionary: common misspellings and missing
+apostrophes, doubled words, letters repeated three times, vowel-less words,
+a lowercase "i" and sentences starting in lowercase.
+
+Run `python input_quality.py [samples.jsonl]` to report how often the routes
+agree with the labelled samples in `fixtures/input_samples.jsonl`.
+"""
+import json
+import os
+import re
+import sys
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sections import estimate_tokens
+
+ROUTES = ["full", "light", "skip"]
+# Descriptions shorter than this are cheap to refine and gain the most from it
+LIGHT_MIN_WORDS = 120
+# A spec worth passing on as is: at least this long and structured
+SKIP_MIN_WORDS = 250
+SKIP_MIN_HEADINGS = 2
+SKIP_MIN_BULLETS = 4
+# Suspected typos per word
+SKIP_MAX_TYPO_RATE = 0.002
+LIGHT_MAX_TYPO_RATE = 0.02
+
+MISSPELLINGS = {
+    "teh", "recieve", "recieved", "seperate", "seperately", "adress", "wich", "occured", "occurence",
+    "databse", "databsae", "architecure", "arhitecture", "managment", "enviroment", "authentification",
+    "dependancy", "existant", "sucess", "sucessful", "succesful", "performace", "availabilty",
+    "scalibility", "requirment", "requirments", "paymnet", "payemnt", "acess", "accross", "begining",
+    "definately", "independant", "neccessary", "necesary", "publically", "refered", "relevent", "untill",
+    "wierd", "writting", "usefull", "mesage", "mesages", "servise", "sevice", "aplication", "applicaton",
+    "notifcation", "notfication", "reponse", "responce", "fucntion", "funtion", "buisness", "bussiness",
+    "comunication", "comunicate", "intergration", "intergrate", "secuirty", "securty", "realtime",
+    "thier", "wether", "alot", "shoud", "woud", "becuase", "beacuse", "recomend", "tommorow", "platfrom",
+    # Missing apostrophes
+    "dont", "cant", "wont", "doesnt", "isnt", "arent", "shouldnt", "wouldnt", "couldnt", "didnt",
+    "im", "ive", "thats", "whats", "theres", "lets",
+}
+# Lowercase words without vowels that are not typos
+VOWELLESS_WORDS = {"html", "http", "https", "sql", "nosql", "crm", "cdn", "dns", "tcp", "grpc", "ssh", "rpc",
+                   "xml", "pdf", "sms", "mqtt", "rtmp", "cqrs", "ssl", "tls", "jwt", "cms", "pwm", "hmm",
+                   "npm", "rpm", "psql", "lcd", "mvp", "crud", "kyc", "ttl", "cpu", "gpu", "vps", "www"}
+ABBREVIATIONS = {"e.g.", "i.e.", "etc.", "vs.", "approx.", "incl.", "resp.", "cf."}
+
+WORD = re.compile(r"[A-Za-z][A-Za-z'-]*")
+HEADING = re.compile(r"^\s*(#{1,6}\s+\S|\d+(\.\d+)*[.)]?\s+[A-Z][A-Za-z ]{2,}:?\s*$|[A-Z][A-Z &/-]{3,}:?\s*$)", re.MULTILINE)
+BULLET = re.compile(r"^\s*([-*•]|\d+[.)])\s+\S", re.MULTILINE)
+DOUBLED_WORD = re.compile(r"\b([A-Za-z]+)\s+\1\b", re.IGNORECASE)
+REPEATED_LETTER = re.compile(r"([a-z])\1\1")
+LOWERCASE_I = re.compile(r"(?<![\w'./-])i(?![\w'./-])")
+LOWERCASE_SENTENCE = re.compile(r"(\S+)\s+(?=[a-z])")
+
+
+@dataclass
+class InputAssessment:
+    route: str
+    words: int
+    headings: int
+    bullets: int
+    paragraphs: int
+    typos: int
+    typo_rate: float
+    # Output tokens a full refinement would generate (about the length of the input)
+    refine_tokens: int
+    reasons: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def count_typos(text: str) -> int:
+    """Suspected typos in `text`"""
+    words = WORD.findall(text)
+    typos = sum(1 for word in words if word.lower() in MISSPELLINGS)
+    typos += sum(1 for word in words if word.islower() and len(word) >= 4
+                 and not re.search(r"[aeiouy]", word) and word not in VOWELLESS_WORDS)
+    typos += sum(1 for word in words if REPEATED_LETTER.search(word.lower())
+                 and not word.isupper() and word.lower() not in VOWELLESS_WORDS)
+    typos += len(DOUBLED_WORD.findall(text))
+    typos += len(LOWERCASE_I.findall(text))
+    for line in text.splitlines():
+        for match in LOWERCASE_SENTENCE.finditer(line):
+            previous = match.group(1)
+            if previous[-1] in ".!?" and previous.lower() not in ABBREVIATIONS and not re.search(r"\w\.\w", previous):
+                typos += 1
+    return typos
+
+
+def assess(text: str) -> InputAssessment:
+    """Measure a raw description and choose its refine route"""
+    words = len(WORD.findall(text))
+    headings = len(HEADING.findall(text))
+    bullets = len(BULLET.findall(text))
+    paragraphs = len([block for block in re.split(r"\n\s*\n", text) if block.strip()])
+    typos = count_typos(text)
+    typo_rate = typos / words if words else 0.0
+    structured = headings >= SKIP_MIN_HEADINGS or (bullets >= SKIP_MIN_BULLETS and paragraphs >= 2)
+
+    if words < LIGHT_MIN_WORDS:
+        route, reasons = "full", [f"{words} words"]
+    elif typo_rate > LIGHT_MAX_TYPO_RATE:
+        route, reasons = "full", [f"{typos} suspected typos in {words} words"]
+    elif words >= SKIP_MIN_WORDS and structured and typo_rate <= SKIP_MAX_TYPO_RATE:
+        route = "skip"
+        reasons = [f"{words} words", f"{headings} headings, {bullets} bullet points", f"{typos} suspected typos"]
+    else:
+        route = "light"
+        reasons = [f"{words} words", f"{typos} suspected typos"]
+        if not structured:
+            reasons.append("no headings or lists")
+    return InputAssessment(route, words, headings, bullets, paragraphs, typos, typo_rate,
+                           estimate_tokens(text), reasons)
+
+
+def apply_corrections(text: str, answer: str) -> Tuple[str, int]:
+    """
+    Apply the `wrong => right` lines of a light refinement to `text`.
+
+    Only a wrong text that occurs exactly once in `text`, as whole words, is
+    replaced: with several occurrences (a short token like "DB" that is also
+    used correctly elsewhere) the model's correction is ambiguous and skipped.
+
+    Returns:
+        The corrected text and the number of corrections applied; lines whose
+        wrong text does not occur once in `text` are ignored
+    """
+    applied = 0
+    for line in answer.splitlines():
+        if "=>" not in line:
+            continue
+        wrong, right = (part.strip().strip("`\"'") for part in line.split("=>", 1))
+        wrong = re.sub(r"^([-*•]|\d+[.)])\s+", "", wrong)
+        if not wrong or wrong == right:
+            continue
+        matches = list(re.finditer(rf"(?<!\w){re.escape(wrong)}(?!\w)", text))
+        if len(matches) == 1:
+            text = text[:matches[0].start()] + right + text[matches[0].end():]
+            applied += 1
+    return text, applied
+
+
+class InputRouter:
+    """
+    Thread-safe wrapper around assess that counts its routes and what they saved.
+
+    The refine latency saved is estimated from the time per output token of
+    the full refinements seen so far: a skipped or light refinement would have
+    taken its `refine_tokens` at that rate, minus the time it actually took.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {route: 0 for route in ROUTES}
+        self.skipped_tokens = 0
+        self.light_tokens = 0
+        # Output tokens and seconds of full refinements, the rate a saved refinement is valued at
+        self.full_tokens = 0
+        self.full_seconds = 0.0
+        # Full refinement tokens avoided by skipped and light ones, and the seconds the light ones took
+        self.avoided_tokens = 0
+        self.light_seconds = 0.0
+
+    def assess(self, text: str) -> InputAssessment:
+        assessment = assess(text)
+        with self._lock:
+            self.routes[assessment.route] += 1
+            if assessment.route == "skip":
+                self.skipped_tokens += assessment.refine_tokens
+                self.avoided_tokens += assessment.refine_tokens
+        return assessment
+
+    def record_light_refine(self, assessment: Dict[str, Any], answer_tokens: int, seconds: float):
+        """Count the output tokens and time of a light refinement"""
+        with self._lock:
+            self.light_tokens += max(0, assessment["refine_tokens"] - answer_tokens)
+            self.avoided_tokens += assessment["refine_tokens"]
+            self.light_seconds += seconds
+
+    def record_full_refine(self, answer_tokens: int, seconds: float):
+        """Count the output tokens and time of a full refinement"""
+        with self._lock:
+            self.full_tokens += answer_tokens
+            self.full_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(self.routes.values())
+            seconds_saved = None
+            if self.full_tokens:
+                seconds_saved = self.avoided_tokens * self.full_seconds / self.full_tokens - self.light_seconds
+            return {
+                "total": total,
+                "routes": dict(self.routes),
+                "refine_skip_rate": self.routes["skip"] / total if total else 0.0,
+                "refine_tokens_saved": self.skipped_tokens + self.light_tokens,
+                # None until a full refinement has been timed
+                "refine_seconds_saved": seconds_saved,
+            }
+
+
+def evaluate(samples: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compare the chosen routes with labelled ones.
+
+    Args:
+        samples: Records with the raw `text` and the expected `route`
+
+    Returns:
+        Agreement overall and per expected route, the misrouted samples and
+        the refine output tokens the routes save over refining everything
+    """
+    total = agreed = saved = 0
+    per_route = {route: {"samples": 0, "agreed": 0} for route in ROUTES}
+    misrouted = []
+    for sample in samples:
+        total += 1
+        assessment = assess(sample["text"])
+        per_route[sample["route"]]["samples"] += 1
+        if assessment.route == sample["route"]:
+            agreed += 1
+            per_route[sample["route"]]["agreed"] += 1
+        else:
+            misrouted.append({"text": sample["text"][:80], "expected": sample["route"],
+                              "route": assessment.route, "reasons": assessment.reasons})
+        if assessment.route == "skip":
+            saved += assessment.refine_tokens
+    return {
+        "samples": total,
+        "agreement": agreed / total if total else 0.0,
+        "per_route": per_route,
+        "skipped_refine_tokens": saved,
+        "misrouted": misrouted,
+    }
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "fixtures", "input_samples.jsonl"
+    )
+    with open(path, "r", encoding="utf-8") as f:
+        report = evaluate(json.loads(line) for line in f if line.strip())
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessageChunk, BaseMessage, message_chunk_to_message
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+
+# Fields of an AIMessageChunk kept on disk; ids are dropped so every replay gets fresh ones
+_CHUNK_FIELDS = {"content", "additional_kwargs", "response_metadata", "usage_metadata", "tool_call_chunks"}
+
+
+def cache_key(llm: BaseChatModel, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs) -> str:
+    """Content address of a model call: hash of model name/params and the rendered prompt"""
+    llm_string = llm._get_llm_string(stop=stop, **kwargs)
+    payload = llm_string + "\n---\n" + dumps(messages)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def message_to_chunk(message: BaseMessage) -> AIMessageChunk:
+    """Turn a complete AI message into a single chunk that can be replayed through `_stream`"""
+    if isinstance(message, AIMessageChunk):
+        return message
+    return AIMessageChunk(
+        content=message.content,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        usage_metadata=getattr(message, "usage_metadata", None),
+        tool_call_chunks=[
+            tool_call_chunk(name=tc["name"], args=json.dumps(tc["args"]), id=tc.get("id"), index=i)
+            for i, tc in enumerate(getattr(message, "tool_calls", []) or [])
+        ],
+    )
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk store of model responses.
+
+    Every entry is one JSON file named by its key, holding the chunks and the
+    time they were stored. An in-memory index keeps the entries in LRU order
+    so eviction by total size, entry count and age never has to rescan the
+    directory. A file's mtime is its last access, which restores the LRU order
+    after a restart; the age is always taken from the stored `created_at`, so
+    an entry read often still expires `ttl_seconds` after it was written.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entries: int = 10_000,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            # The creation time is read from the entry on its first lookup
+            self._index[key] = {"size": size, "created": None}
+            self._total_bytes += size
+        self._evict()
+
+    def _remove(self, key: str):
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry["size"]
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _expired(self, created: Optional[float]) -> bool:
+        return self.ttl_seconds is not None and created is not None and time.time() - created > self.ttl_seconds
+
+    def _evict(self):
+        while self._index and (self._total_bytes > self.max_bytes or len(self._index) > self.max_entries):
+            key = next(iter(self._index))
+            self._remove(key)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the stored chunk list for a key, or None on a miss"""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self._expired(entry["created"]):
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+                entry["created"] = float(stored["created_at"])
+                chunks = stored["chunks"]
+            except (OSError, ValueError, TypeError, KeyError):
+                # Unreadable, or written without its creation time
+                self._remove(key)
+                self.misses += 1
+                return None
+            if self._expired(entry["created"]):
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            os.utime(self._path(key))
+            self.hits += 1
+            return chunks
+
+    def put(self, key: str, chunks: List[Dict[str, Any]]):
+        """Store the serialized chunks of one response under its key"""
+        created = time.time()
+        data = json.dumps({"created_at": created, "chunks": chunks}).encode("utf-8")
+        with self._lock:
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            self._remove_from_index(key)
+            self._index[key] = {"size": len(data), "created": created}
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _remove_from_index(self, key: str):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry["size"]
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+            }
+
+
+class CachedChatModel(BaseChatModel):
+    """
+    Chat model wrapper that serves repeated calls from a ResponseCache.
+
+    Responses are stored as the list of chunks the wrapped model produced, and
+    cache hits are replayed chunk by chunk through `_stream`. This keeps the
+    LangGraph `messages` stream mode (and therefore the Streamlit streaming
+    path) working for cached calls. The async methods read and write the
+    cache in a worker thread, off the event loop.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    llm: BaseChatModel
+    response_cache: ResponseCache
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cached-{self.llm._llm_type}"
+
+    def bind_tools(self, tools, **kwargs):
+        # Let the wrapped model format the tools, then bind the same kwargs here
+        bound = self.llm.bind_tools(tools, **kwargs)
+        return self.bind(**bound.kwargs)
+
+    @staticmethod
+    def _replay(stored: List[Dict[str, Any]]) -> Iterator[ChatGenerationChunk]:
+        for data in stored:
+            chunk = AIMessageChunk(**data)
+            chunk.response_metadata = {**chunk.response_metadata, "cache_hit": True}
+            yield ChatGenerationChunk(message=chunk)
+
+    @classmethod
+    def _replayed_result(cls, stored: List[Dict[str, Any]]) -> ChatResult:
+        message = None
+        for chunk in cls._replay(stored):
+            message = chunk.message if message is None else message + chunk.message
+        return ChatResult(generations=[ChatGeneration(message=message_chunk_to_message(message))])
+
+    @staticmethod
+    def _serialize(chunk: ChatGenerationChunk) -> Dict[str, Any]:
+        return chunk.message.model_dump(include=_CHUNK_FIELDS)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key = cache_key(self.llm, messages, stop, **kwargs)
+        stored = self.response_cache.get(key)
+        if stored is not None:
+            return self._replayed_result(stored)
+
+        result = self.llm._generate(messages, stop=stop, **kwargs)
+        chunk = ChatGenerationChunk(message=message_to_chunk(result.generations[0].message))
+        self.response_cache.put(key, [self._serialize(chunk)])
+        return result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        key = cache_key(self.llm, messages, stop, **kwargs)
+        stored = self.response_cache.get(key)
+        if stored is not None:
+            yield from self._replay(stored)
+            return
+
+        recorded = []
+        for chunk in self.llm._stream(messages, stop=stop, **kwargs):
+            recorded.append(self._serialize(chunk))
+            yield chunk
+        if recorded:
+            self.response_cache.put(key, recorded)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key = cache_key(self.llm, messages, stop, **kwargs)
+        stored = await asyncio.to_thread(self.response_cache.get, key)
+        if stored is not None:
+            return self._replayed_result(stored)
+
+        result = await self.llm._agenerate(messages, stop=stop, **kwargs)
+        chunk = ChatGenerationChunk(message=message_to_chunk(result.generations[0].message))
+        await asyncio.to_thread(self.response_cache.put, key, [self._serialize(chunk)])
+        return result
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        key = cache_key(self.llm, messages, stop, **kwargs)
+        stored = await asyncio.to_thread(self.response_cache.get, key)
+        if stored is not None:
+            for chunk in self._replay(stored):
+                yield chunk
+            return
+
+        recorded = []
+        async for chunk in self.llm._astream(messages, stop=stop, **kwargs):
+            recorded.append(self._serialize(chunk))
+            yield chunk
+        if recorded:
+            await asyncio.to_thread(self.response_cache.put, key, recorded)
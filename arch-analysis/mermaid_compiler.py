@@ -0,0 +1,151 @@
+import json
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from schema import ArchitectureModel
+
+# The component model the architecture prompts ask for, appended as a fenced json block.
+# A spec may contain json examples of its own, so only the last fence can hold the model
+MODEL_FENCE = "```json"
+MODEL_BLOCK = re.compile(r"```json\s*\n(\{.*\})\s*\n```\s*$", re.DOTALL)
+
+# Identifiers that Mermaid treats as keywords and cannot be used as node ids
+RESERVED_IDS = {"end", "graph", "flowchart", "subgraph", "class", "classdef", "style", "linkstyle",
+                "click", "call", "default", "direction", "href"}
+
+CLASS_DEFS = OrderedDict([
+    ("service", "fill:#f9f,stroke:#333,stroke-width:2px"),
+    ("database", "fill:#f96,stroke:#333,stroke-width:2px"),
+    ("cache", "fill:#fc9,stroke:#333,stroke-width:2px"),
+    ("queue", "fill:#9cf,stroke:#333,stroke-width:2px"),
+    ("storage", "fill:#fd8,stroke:#333,stroke-width:2px"),
+    ("external", "fill:#ccf,stroke:#333,stroke-width:2px"),
+    ("client", "fill:#cfc,stroke:#333,stroke-width:2px"),
+])
+
+# Node shape per component kind, as (opening, closing) brackets
+SHAPES = {
+    "service": ("[", "]"),
+    "database": ("[(", ")]"),
+    "cache": ("[(", ")]"),
+    "storage": ("[(", ")]"),
+    "queue": ("[[", "]]"),
+    "external": ("{{", "}}"),
+    "client": ("([", "])"),
+}
+
+
+def extract_architecture_model(text: str) -> Tuple[str, Optional[ArchitectureModel]]:
+    """
+    Split the trailing component model block off an architecture response.
+
+    Returns:
+        The specification without the block, and the parsed model (None when
+        the block is missing or does not match the schema)
+    """
+    stripped = text.rstrip()
+    start = stripped.rfind(MODEL_FENCE)
+    match = MODEL_BLOCK.match(stripped, start) if start >= 0 else None
+    if not match:
+        return text, None
+    spec = stripped[:start].rstrip() + "\n"
+    try:
+        model = ArchitectureModel.model_validate(json.loads(match.group(1)))
+    except (ValueError, ValidationError) as e:
+        print(f"Ignoring invalid component model: {str(e)[:200]}")
+        return spec, None
+    return spec, model if model.components else None
+
+
+def _mentioned(label: str, spec: str) -> bool:
+    return re.search(rf"(?<!\w){re.escape(label)}(?!\w)", spec, re.IGNORECASE) is not None
+
+
+def merge_architecture_models(previous: ArchitectureModel, revised: Optional[ArchitectureModel],
+                              old_spec: str, new_spec: str) -> ArchitectureModel:
+    """
+    Fold the component model of a section-level update into the model of the whole architecture.
+
+    The model is only shown the revised sections, so its components and
+    relationships are added to the previous model, replacing components with
+    the same id and relationships with the same source and target. A previous
+    component is dropped only when the update removed it from the
+    specification: its label occurs in `old_spec` but not in `new_spec`.
+    """
+    components = OrderedDict(
+        (component.id, component) for component in previous.components
+        if not _mentioned(component.label, old_spec) or _mentioned(component.label, new_spec)
+    )
+    relationships = OrderedDict(((rel.source, rel.target), rel) for rel in previous.relationships)
+    if revised is not None:
+        components.update((component.id, component) for component in revised.components)
+        relationships.update(((rel.source, rel.target), rel) for rel in revised.relationships)
+    return ArchitectureModel(
+        components=list(components.values()),
+        relationships=[rel for (source, target), rel in relationships.items()
+                       if source in components and target in components],
+    )
+
+
+def node_id(raw: str) -> str:
+    """Turn an arbitrary identifier into a safe camelCase Mermaid node id"""
+    words = re.findall(r"[A-Za-z0-9]+", raw)
+    if not words:
+        return "node"
+    identifier = words[0][0].lower() + words[0][1:] + "".join(w[0].upper() + w[1:] for w in words[1:])
+    if identifier[0].isdigit():
+        identifier = f"n{identifier}"
+    if identifier.lower() in RESERVED_IDS:
+        identifier = f"{identifier}Node"
+    return identifier
+
+
+def _label(text: str) -> str:
+    return '"' + re.sub(r"\s+", " ", text).strip().replace('"', "#quot;") + '"'
+
+
+def compile_mermaid(model: ArchitectureModel, direction: str = "TD") -> str:
+    """Compile a component/relationship model into Mermaid flowchart code"""
+    ids: Dict[str, str] = {}
+    for component in model.components:
+        ids.setdefault(component.id, node_id(component.id))
+
+    lines = [f"flowchart {direction}"]
+    for name, style in CLASS_DEFS.items():
+        lines.append(f"    classDef {name} {style};")
+
+    def node(component) -> str:
+        opening, closing = SHAPES.get(component.kind, SHAPES["service"])
+        return f"{ids[component.id]}{opening}{_label(component.label or component.id)}{closing};"
+
+    groups: "OrderedDict[Optional[str], List]" = OrderedDict()
+    for component in model.components:
+        groups.setdefault(component.group or None, []).append(component)
+    for group, components in groups.items():
+        if group is None:
+            lines.extend(f"    {node(component)}" for component in components)
+            continue
+        lines.append(f"    subgraph {node_id(group)}Group[{_label(group)}]")
+        lines.extend(f"        {node(component)}" for component in components)
+        lines.append("    end")
+
+    # Relationships to components the model did not declare get a plain node
+    for relationship in model.relationships:
+        for endpoint in (relationship.source, relationship.target):
+            if endpoint not in ids:
+                ids[endpoint] = node_id(endpoint)
+                lines.append(f"    {ids[endpoint]}[{_label(endpoint)}];")
+    for relationship in model.relationships:
+        arrow = "-.->" if relationship.kind == "async" else "-->"
+        label = f"|{_label(relationship.label)}|" if relationship.label else ""
+        lines.append(f"    {ids[relationship.source]} {arrow}{label} {ids[relationship.target]};")
+
+    by_kind: "OrderedDict[str, List[str]]" = OrderedDict()
+    for component in model.components:
+        by_kind.setdefault(component.kind, []).append(ids[component.id])
+    for kind, members in by_kind.items():
+        lines.append(f"    class {','.join(OrderedDict.fromkeys(members))} {kind};")
+    return "\n".join(lines) + "\n"
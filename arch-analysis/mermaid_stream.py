@@ -0,0 +1,100 @@
+"""
+Incremental extraction of a Mermaid diagram from a streamed LLM answer.
+
+`MermaidStreamExtractor` is fed the token deltas of the `gen_mermaid` node as
+they arrive. It finds the diagram the way `helper.convert_mermaid_block` does
+on the complete text (the ```mermaid fenced block, or the code starting at the
+`flowchart` declaration). `diagram()` returns the statements completed so far
+closed so that they render: subgraphs still open get their `end` and the code
+goes through `mermaid_validator.repair`. Feeding is cheap; the partial diagram
+is only built when it is read (once per UI poll, not once per token), and a
+partial that does not validate is skipped, so the UI keeps the last one that
+does.
+"""
+import re
+from typing import List, Optional
+
+from mermaid_validator import HEADER, repair
+
+FENCE_OPEN = re.compile(r"^```\s*mermaid\s*$", re.IGNORECASE)
+SUBGRAPH = re.compile(r"^subgraph\b")
+SUBGRAPH_END = re.compile(r"^end\s*;?$")
+
+
+class MermaidStreamExtractor:
+    """
+    Turns a token stream into a growing sequence of renderable diagrams.
+
+    Only complete lines are considered, so a statement split across deltas is
+    picked up once its line ends. Text after the closing fence is ignored.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._lines: List[str] = []
+        self._depth = 0
+        self._started = False
+        self._closed = False
+        self._dirty = False
+        self.statements = 0
+        self.partial: Optional[str] = None
+
+    def _add_line(self, line: str) -> bool:
+        """Take one complete line; True when it adds a statement to the diagram"""
+        stripped = line.strip()
+        if not self._started:
+            if FENCE_OPEN.match(stripped):
+                self._started = True
+            elif HEADER.match(stripped):
+                self._started = True
+                self._lines.append(line)
+            return False
+        if stripped.startswith("```"):
+            self._closed = True
+            return False
+        if not stripped:
+            return False
+        self._lines.append(line)
+        if HEADER.match(stripped) or stripped.startswith("%%"):
+            return False
+        if SUBGRAPH.match(stripped):
+            self._depth += 1
+        elif SUBGRAPH_END.match(stripped) and self._depth:
+            self._depth -= 1
+        self.statements += 1
+        return True
+
+    def diagram(self) -> Optional[str]:
+        """The latest renderable partial diagram, None until the first statement validates"""
+        if self._dirty:
+            self._dirty = False
+            result = repair("\n".join(self._lines + ["end"] * self._depth))
+            if result.valid:
+                self.partial = result.code
+        return self.partial
+
+    def feed(self, text: str) -> bool:
+        """Add a token delta; True when it completed at least one statement"""
+        if self._closed or not text:
+            return False
+        self._pending += text
+        if "\n" not in self._pending:
+            return False
+        *lines, self._pending = self._pending.split("\n")
+        added = False
+        for line in lines:
+            added = self._add_line(line) or added
+            if self._closed:
+                break
+        self._dirty = self._dirty or added
+        return added
+
+    def close(self) -> bool:
+        """End of the stream: the last line counts as complete even without a newline"""
+        if self._closed:
+            return False
+        pending, self._pending = self._pending, ""
+        added = self._add_line(pending)
+        self._closed = True
+        self._dirty = self._dirty or added
+        return added
@@ -0,0 +1,537 @@
+"""
+Local validator and deterministic repair for LLM-generated Mermaid flowcharts.
+
+`validate` parses flowchart code statement by statement and reports the
+mistakes models commonly make: a missing or malformed header, prose around
+the code, stray backticks, unbalanced or unquoted node labels, invalid arrows,
+reserved words or spaces in node ids and unbalanced subgraphs. `repair` fixes
+what can be fixed without guessing and re-validates; statements it cannot
+understand are reported so that `generate_mermaid` can ask the LLM for a
+targeted fix. Statements without issues are left byte for byte as they are.
+
+Run `python mermaid_validator.py [samples.jsonl]` to report the detection and
+repair rates on the labelled corpus in `fixtures/mermaid_samples.jsonl`.
+"""
+import json
+import os
+import re
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from mermaid_compiler import RESERVED_IDS, node_id
+
+FENCED_BLOCK = re.compile(r"```\s*mermaid\s*\n(.*?)\n\s*```", re.DOTALL)
+HEADER = re.compile(r"^(flowchart|graph)\b\s*(\S*)\s*;?\s*$", re.IGNORECASE)
+DIRECTIONS = {"TD", "TB", "BT", "RL", "LR"}
+KEYWORDS = {"classdef", "class", "style", "linkstyle", "click", "direction"}
+
+NODE_ID = re.compile(r"[A-Za-z0-9_]+(?:[-.][A-Za-z0-9_]+)*")
+# Openers longest first, with the closer each needs
+SHAPES = [("(((", ")))"), ("([", "])"), ("[[", "]]"), ("[(", ")]"), ("((", "))"), ("{{", "}}"),
+          ("[/", "/]"), ("[\\", "\\]"), ("[", "]"), ("(", ")"), ("{", "}"), (">", "]")]
+CLASS_SHORTHAND = re.compile(r":::[A-Za-z0-9_-]+")
+# Characters that break an unquoted label
+LABEL_SPECIAL = re.compile(r"[()\[\]{}\"|;<>]")
+
+_LINE = r"(?:-{2,}|={2,}|-\.+-)"
+EDGE = re.compile(
+    r"<" + _LINE + r">"                 # <-->, <==>
+    r"|[ox]" + _LINE + r"[ox](?=\s|$)"  # o--o, x--x
+    r"|" + _LINE + r"(?:>|[ox](?=\s|\||$))?"  # -->, ---, -.->, ==>, --o, --x
+    r"|~{3,}"
+)
+TEXT_EDGE = re.compile(r"(?:--|==|-\.)\s+(?P<text>[^-=.|>\s][^|]*?)\s+(?:-{2,}>|-{3,}|\.-+>|\.-+|={2,}>|={3,})")
+PIPE_LABEL = re.compile(r"\s*\|(?P<label>[^|]*)\|")
+# Invalid arrows and their replacement; tried where no valid arrow matches
+BAD_EDGES = [
+    (re.compile(r"(?P<op>--|==)\s*\|(?P<label>[^|]*)\|\s*(?:-{1,}|={1,})>"), None),  # --|label|-->
+    (re.compile(r"-{2,}>>+"), "-->"),
+    (re.compile(r"={2,}>>+"), "==>"),
+    (re.compile(r"[—–−]+>|→|⟶"), "-->"),
+    (re.compile(r"(?:-\s+)?->(?!>)"), "-->"),
+    (re.compile(r"=\s*>"), "==>"),
+    (re.compile(r"<-+(?![->])"), "<--"),
+]
+
+
+@dataclass
+class MermaidIssue:
+    """One problem found in the code; `fixable` when `repair` can fix it without the LLM"""
+    line: int
+    code: str
+    message: str
+    fixable: bool = False
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.message}"
+
+
+@dataclass
+class RepairResult:
+    code: str
+    issues: List[MermaidIssue] = field(default_factory=list)
+    remaining: List[MermaidIssue] = field(default_factory=list)
+
+    @property
+    def valid(self) -> bool:
+        return not self.remaining
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.issues)
+
+
+def strip_fences(text: str) -> str:
+    """The code of a ```mermaid block, or the text itself when it has none"""
+    match = FENCED_BLOCK.search(text)
+    return match.group(1) if match else text
+
+
+def split_statements(line: str, brackets: bool = True) -> List[str]:
+    """Split a line on the semicolons that are outside quotes and brackets"""
+    statements, current, depth, quoted = [], [], 0, False
+    for char in line:
+        if char == '"':
+            quoted = not quoted
+        elif brackets and not quoted and char in "([{":
+            depth += 1
+        elif brackets and not quoted and char in ")]}" and depth:
+            depth -= 1
+        elif char == ";" and not quoted and not depth:
+            statements.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    if depth:
+        # An unclosed bracket swallowed the separators; split on every semicolon instead
+        return split_statements(line, brackets=False)
+    statements.append("".join(current))
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def strip_backticks(text: str) -> str:
+    """Remove backticks outside quoted labels ("`markdown`" strings are kept)"""
+    parts = text.split('"')
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].replace("`", "")
+    return '"'.join(parts)
+
+
+def _quote(label: str) -> str:
+    return '"' + label.strip().strip('"').replace('"', "#quot;") + '"'
+
+
+class _Statement:
+    """Parser for one node/edge statement, rebuilding it when something is fixed"""
+
+    def __init__(self, text: str, line: int, issues: List[MermaidIssue], renames: Dict[str, str]):
+        self.text = text
+        self.pos = 0
+        self.line = line
+        self.issues = issues
+        self.renames = renames
+        self.parts: List[str] = []
+        self.ids: List[str] = []
+        self.fixed = False
+
+    def issue(self, code: str, message: str, fixable: bool):
+        self.issues.append(MermaidIssue(self.line, code, message, fixable))
+        self.fixed = self.fixed or fixable
+
+    def skip_space(self):
+        while self.pos < len(self.text) and self.text[self.pos].isspace():
+            self.pos += 1
+
+    def node(self) -> bool:
+        self.skip_space()
+        match = NODE_ID.match(self.text, self.pos)
+        if not match:
+            return False
+        words = [match.group(0)]
+        end = match.end()
+        # An id written as several words ("User Service[...]")
+        while True:
+            nxt = re.compile(r"\s+(" + NODE_ID.pattern + r")").match(self.text, end)
+            if not nxt or EDGE.match(nxt.group(1)) or TEXT_EDGE.match(self.text, end + 1):
+                break
+            words.append(nxt.group(1))
+            end = nxt.end()
+        raw_id = new_id = " ".join(words)
+        if len(words) > 1:
+            self.issue("spaced_id", f"node id '{raw_id}' contains spaces", True)
+            new_id = self.renames.setdefault(raw_id, node_id(raw_id))
+        elif raw_id.lower() in RESERVED_IDS:
+            self.issue("reserved_id", f"'{raw_id}' is a reserved word and cannot be a node id", True)
+            new_id = self.renames.setdefault(raw_id, node_id(raw_id))
+        self.ids.append(raw_id)
+        self.parts.append(new_id)
+        self.pos = end
+        self.shape()
+        shorthand = CLASS_SHORTHAND.match(self.text, self.pos)
+        if shorthand:
+            self.parts.append(shorthand.group(0))
+            self.pos = shorthand.end()
+        return True
+
+    def _label_end(self) -> int:
+        """Where an unclosed label stops: before the next arrow, or at the end of the statement"""
+        for i in range(self.pos, len(self.text)):
+            if self.text[i].isspace() and (EDGE.match(self.text, i + 1) or TEXT_EDGE.match(self.text, i + 1)):
+                return i
+        return len(self.text)
+
+    def shape(self):
+        for opener, closer in SHAPES:
+            if self.text.startswith(opener, self.pos):
+                break
+        else:
+            return
+        start = self.pos + len(opener)
+        if self.text.startswith('"', start):
+            quote_end = self.text.find('"', start + 1)
+            if quote_end != -1 and self.text.startswith(closer, quote_end + 1):
+                self.parts.append(self.text[self.pos:quote_end + 1 + len(closer)])
+                self.pos = quote_end + 1 + len(closer)
+                return
+        # Scan to the closer that balances the brackets opened inside the label
+        depth, i = 0, start
+        while i < len(self.text):
+            if depth == 0 and self.text.startswith(closer, i):
+                break
+            if self.text[i] in "([{":
+                depth += 1
+            elif self.text[i] in ")]}":
+                depth -= 1
+                if depth < 0:
+                    i = len(self.text)
+                    break
+            i += 1
+        if i < len(self.text):
+            label = self.text[start:i]
+            if LABEL_SPECIAL.search(label) or "`" in label:
+                self.issue("unquoted_label", f"label '{label}' has special characters and must be quoted", True)
+                label = _quote(label.replace("`", ""))
+            self.parts.append(opener + label + closer)
+            self.pos = i + len(closer)
+            return
+        end = self._label_end()
+        label = self.text[start:end].rstrip(")]}> ")
+        self.issue("unbalanced_bracket", f"'{opener}' of node label '{label}' is never closed with '{closer}'", True)
+        self.parts.append(opener + _quote(label) + closer)
+        self.pos = end
+
+    def edge(self) -> Optional[str]:
+        """Parse an arrow with its label; returns the arrow, None at the end of the statement"""
+        self.skip_space()
+        if self.pos >= len(self.text):
+            return None
+        text_edge = TEXT_EDGE.match(self.text, self.pos)
+        match = None if text_edge else EDGE.match(self.text, self.pos)
+        bad = None
+        if not text_edge:
+            for pattern, replacement in BAD_EDGES:
+                bad_match = pattern.match(self.text, self.pos)
+                if bad_match and (match is None or bad_match.end() > match.end()):
+                    bad = (bad_match, replacement)
+                    break
+        if bad:
+            bad_match, replacement = bad
+            if replacement is None:
+                arrow = ("==>" if bad_match.group("op") == "==" else "-->") + f"|{bad_match.group('label')}|"
+            else:
+                arrow = replacement
+            if arrow != "<--":
+                # Left arrows are reported by parse, which can only fix the simple ones
+                self.issue("bad_arrow", f"'{bad_match.group(0)}' is not a Mermaid arrow", True)
+            self.parts.append(f" {arrow} ")
+            self.pos = bad_match.end()
+            return arrow
+        if text_edge:
+            self.parts.append(" " + text_edge.group(0) + " ")
+            self.pos = text_edge.end()
+            return text_edge.group(0)
+        if match:
+            arrow = match.group(0)
+            self.pos = match.end()
+            label = PIPE_LABEL.match(self.text, self.pos)
+            if label:
+                arrow += f"|{label.group('label').strip()}|"
+                self.pos = label.end()
+            self.parts.append(f" {arrow} ")
+            return arrow
+        return ""
+
+    def parse(self) -> bool:
+        """Parse `node (& node)* (arrow node (& node)*)*`; False when the statement is not understood"""
+        left_arrows = []
+        while True:
+            if not self.node():
+                return False
+            self.skip_space()
+            while self.text.startswith("&", self.pos):
+                self.pos += 1
+                self.parts.append(" & ")
+                if not self.node():
+                    return False
+                self.skip_space()
+            arrow = self.edge()
+            if arrow is None:
+                break
+            if arrow == "":
+                return False
+            if arrow == "<--":
+                left_arrows.append(len(self.parts) - 1)
+        if left_arrows:
+            simple = len(left_arrows) == 1 and len(self.ids) == 2
+            self.issue("bad_arrow", "left arrow '<--' is not Mermaid syntax", simple)
+            if simple:
+                # a <-- b  ->  b --> a
+                index = left_arrows[0]
+                self.parts = ["".join(self.parts[index + 1:]).strip(), " --> ", "".join(self.parts[:index])]
+        return True
+
+    def render(self) -> str:
+        return "".join(self.parts).strip()
+
+
+def _rename_references(statement: str, renames: Dict[str, str]) -> str:
+    """Apply node renames to the ids of a class/style/click statement"""
+    words = statement.split(None, 2)
+    if len(words) < 2 or words[0].lower() not in ("class", "style", "click"):
+        return statement
+    ids = [renames.get(node, node) for node in words[1].split(",")]
+    return " ".join([words[0], ",".join(ids)] + words[2:])
+
+
+def _looks_like_prose(line: str) -> bool:
+    """A sentence the model wrote around the code rather than a statement"""
+    if EDGE.search(line) or re.search(r"[\[\](){}|]", line):
+        return False
+    return len(line.split()) >= 4 or line.rstrip().endswith((".", ":"))
+
+
+def _process(code: str, fix: bool) -> Tuple[str, List[MermaidIssue]]:
+    issues: List[MermaidIssue] = []
+    renames: Dict[str, str] = {}
+    lines = strip_fences(code).strip("\n").split("\n")
+    out: List[str] = []
+
+    # Header: the first line that is neither blank nor a comment
+    header_index, prose = None, False
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("%%") or stripped.startswith("```"):
+            continue
+        if HEADER.match(stripped.strip("`")):
+            header_index = i
+            break
+        if not _looks_like_prose(stripped):
+            break
+        prose = True
+    if header_index is not None and prose:
+        issues.append(MermaidIssue(1, "prose", "text before the flowchart declaration", True))
+    if header_index is None:
+        later = next((i for i, line in enumerate(lines) if HEADER.match(line.strip().strip("`"))), None)
+        if later is not None:
+            issues.append(MermaidIssue(1, "prose", "text before the flowchart declaration", True))
+            header_index = later
+        else:
+            issues.append(MermaidIssue(1, "missing_header", "missing 'flowchart TD' declaration", True))
+            out.append("flowchart TD")
+            header_index = -1
+    if header_index >= 0:
+        header = lines[header_index]
+        match = HEADER.match(header.strip().strip("`"))
+        direction = match.group(2).rstrip(";")
+        if "`" in header:
+            issues.append(MermaidIssue(header_index + 1, "stray_backtick", "backtick in the declaration", True))
+            header = header.replace("`", "")
+        if direction and direction.upper() not in DIRECTIONS:
+            issues.append(MermaidIssue(header_index + 1, "bad_direction", f"unknown direction '{direction}'", True))
+            header = f"{match.group(1)} TD"
+        elif direction and direction != direction.upper():
+            header = f"{match.group(1)} {direction.upper()}"
+        out.append(header)
+    # Leading comments are kept, prose is dropped
+    out[0:0] = [line for line in lines[:max(header_index, 0)] if line.strip().startswith("%%")]
+
+    depth = 0
+    for number, line in enumerate(lines[header_index + 1:], start=header_index + 2):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("%%"):
+            out.append(line)
+            continue
+        if stripped.startswith("```"):
+            # A fence left after an unfenced block, or the closing one
+            continue
+        indent = line[:len(line) - len(line.lstrip())]
+        statements, line_fixed = [], False
+        for statement in split_statements(stripped):
+            original = statement
+            if strip_backticks(statement) != statement:
+                issues.append(MermaidIssue(number, "stray_backtick", f"stray backtick in '{statement}'", True))
+                statement = strip_backticks(statement)
+                line_fixed = True
+            keyword = statement.split(None, 1)[0].lower()
+            if keyword == "subgraph":
+                depth += 1
+                statements.append(statement)
+                continue
+            if keyword == "end" and statement.lower().rstrip() == "end":
+                if depth == 0:
+                    issues.append(MermaidIssue(number, "unmatched_end", "'end' without an open subgraph", True))
+                    line_fixed = True
+                    continue
+                depth -= 1
+                statements.append(statement)
+                continue
+            if keyword in KEYWORDS:
+                statements.append(statement)
+                continue
+            if _looks_like_prose(statement):
+                issues.append(MermaidIssue(number, "prose", f"text that is not a statement: '{statement[:60]}'", True))
+                line_fixed = True
+                continue
+            parser = _Statement(statement, number, issues, renames)
+            if parser.parse():
+                if parser.fixed:
+                    line_fixed = True
+                    statement = parser.render()
+                statements.append(statement)
+            else:
+                issues.append(MermaidIssue(number, "unparsable", f"cannot parse '{original[:80]}'", False))
+                statements.append(statement)
+        if not line_fixed:
+            out.append(line)
+        elif statements:
+            out.append(indent + "; ".join(statements) + (";" if stripped.endswith(";") else ""))
+    for _ in range(depth):
+        issues.append(MermaidIssue(len(lines), "unclosed_subgraph", "subgraph without 'end'", True))
+        out.append("    end")
+
+    if not fix:
+        for issue in issues:
+            issue.fixed = False
+        return code, issues
+    if renames:
+        # Statements referring to renamed nodes may come before the node is first seen
+        for i, line in enumerate(out):
+            renamed = "; ".join(_rename_references(statement, renames) for statement in split_statements(line))
+            if renamed != "; ".join(split_statements(line)):
+                out[i] = line[:len(line) - len(line.lstrip())] + renamed + (";" if line.rstrip().endswith(";") else "")
+    return "\n".join(out) + "\n", issues
+
+
+def validate(code: str) -> List[MermaidIssue]:
+    """Issues of a Mermaid flowchart (empty when it looks valid)"""
+    return _process(code, fix=False)[1]
+
+
+def repair(code: str) -> RepairResult:
+    """
+    Fix the issues that can be fixed deterministically.
+
+    Returns:
+        The code (unchanged when there was nothing to fix), the issues found
+        and the issues that remain after the repair
+    """
+    issues = validate(code)
+    if not issues:
+        return RepairResult(code)
+    repaired, _ = _process(code, fix=True)
+    return RepairResult(repaired, issues, validate(repaired))
+
+
+class MermaidRepairer:
+    """Thread-safe wrapper around repair that counts its outcomes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.valid = 0
+        self.repaired = 0
+        self.llm_fixes = 0
+        self.failed = 0
+
+    def repair(self, code: str) -> RepairResult:
+        result = repair(code)
+        with self._lock:
+            self.total += 1
+            if not result.changed:
+                self.valid += 1
+            elif result.valid:
+                self.repaired += 1
+        return result
+
+    def record_llm_fix(self, result: RepairResult):
+        """Count the outcome of the LLM fix requested for code `repair` could not fix"""
+        with self._lock:
+            if result.valid:
+                self.llm_fixes += 1
+            else:
+                self.failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            invalid = self.total - self.valid
+            return {
+                "total": self.total,
+                "valid": self.valid,
+                "repaired": self.repaired,
+                "repair_rate": self.repaired / invalid if invalid else 0.0,
+                "llm_fixes": self.llm_fixes,
+                "failed": self.failed,
+            }
+
+
+def evaluate(samples: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Detection and repair rates on labelled samples.
+
+    Args:
+        samples: Records with the `code` and the issue codes it is known to
+            have (`issues`, empty for valid code)
+
+    Returns:
+        False positives on valid samples, detection rate of the labelled issues
+        and share of invalid samples repaired locally
+    """
+    valid = invalid = false_positives = detected = repaired = 0
+    failures = []
+    for sample in samples:
+        found = validate(sample["code"])
+        if not sample["issues"]:
+            valid += 1
+            if found:
+                false_positives += 1
+                failures.append({"code": sample["code"], "unexpected": [str(issue) for issue in found]})
+            continue
+        invalid += 1
+        codes = {issue.code for issue in found}
+        if set(sample["issues"]) <= codes:
+            detected += 1
+        result = repair(sample["code"])
+        if result.valid:
+            repaired += 1
+        else:
+            failures.append({"code": sample["code"], "remaining": [str(issue) for issue in result.remaining]})
+    return {
+        "samples": valid + invalid,
+        "valid_samples": valid,
+        "false_positives": false_positives,
+        "invalid_samples": invalid,
+        "detection_rate": detected / invalid if invalid else 0.0,
+        "repair_rate": repaired / invalid if invalid else 0.0,
+        "failures": failures,
+    }
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "fixtures", "mermaid_samples.jsonl"
+    )
+    with open(path, "r", encoding="utf-8") as f:
+        report = evaluate(json.loads(line) for line in f if line.strip())
+    print(json.dumps(report, indent=2))
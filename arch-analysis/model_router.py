@@ -0,0 +1,289 @@
+"""
+Latency-SLO routing and failover over a pool of chat model backends.
+
+`RoutedChatModel` is a chat model made of several configured backends
+(`ARCH_LLM_POOL`, see backends.py). For every call, `LatencyRouter` orders the
+backends from their rolling latency: with an SLO, the first backend in
+configuration order whose p95 meets it is tried first, then the others by
+p50; without one, configuration order. A call that fails before its first
+chunk is retried on the next backend, and the failed backend cools down for a
+while. Once a chunk has been streamed an error is raised as is, since the
+tokens cannot be taken back. When every backend is cooling down they are
+still tried, best-ranked first.
+
+The backend that answered is recorded in `response_metadata["routed_backend"]`
+of a result, and of the first chunk of a stream only: chunks are merged with
+langchain's merge_dicts, which concatenates equal string values, so tagging
+every chunk would turn the aggregated message's tag into "openai:gpt-4oopenai:gpt-4o...".
+The first chunk's tag is what the merged message ends up with.
+
+A latency sample is the time to the first streamed chunk, or the whole call
+when it is not streamed. Samples are kept for a rolling window; a backend
+without recent samples is tried again, which is how a demoted backend gets a
+chance to recover.
+"""
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import ConfigDict
+
+WINDOW = 50
+WINDOW_SECONDS = 300.0
+# Below this many samples the median is used instead of the p95
+MIN_SAMPLES = 5
+COOLDOWN_SECONDS = 30.0
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class _BackendStats:
+    def __init__(self, window: int):
+        self.samples: Deque[Tuple[float, float]] = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+
+class LatencyRouter:
+    """
+    Orders the backends of a pool for each call from their rolling latency; thread-safe.
+
+    Args:
+        names: Backends in configuration (preference) order
+        slo: Latency target in seconds for the p95, None to only fail over
+        window: Samples kept per backend
+        window_seconds: Age after which a sample no longer counts
+        min_samples: Samples needed before the p95 is trusted
+        cooldown: Seconds a failed backend is only tried as a last resort
+    """
+
+    def __init__(self, names: List[str], slo: Optional[float] = None, window: int = WINDOW,
+                 window_seconds: float = WINDOW_SECONDS, min_samples: int = MIN_SAMPLES,
+                 cooldown: float = COOLDOWN_SECONDS):
+        self.names = list(names)
+        self.slo = slo
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.failovers = 0
+        self._lock = threading.Lock()
+        self._stats = {name: _BackendStats(window) for name in self.names}
+
+    def _latencies(self, name: str, now: float) -> List[float]:
+        return [latency for at, latency in self._stats[name].samples if now - at <= self.window_seconds]
+
+    def _observed(self, name: str, now: float) -> Optional[float]:
+        """Latency compared with the SLO: p95, the median while there are few samples, None without any"""
+        latencies = self._latencies(name, now)
+        if not latencies:
+            return None
+        return percentile(latencies, 0.95 if len(latencies) >= self.min_samples else 0.5)
+
+    def _ranked(self, names: List[str], now: float) -> List[str]:
+        if self.slo is None:
+            return names
+        observed = {name: self._observed(name, now) for name in names}
+        meeting = [name for name in names if observed[name] is None or observed[name] <= self.slo]
+        # None of the others meets the SLO: the fastest median first
+        others = sorted((name for name in names if name not in meeting),
+                        key=lambda name: percentile(self._latencies(name, now), 0.5))
+        return meeting + others
+
+    def order(self) -> List[str]:
+        """Backends to try for one call, best first; cooling-down backends come last, also ranked"""
+        now = time.monotonic()
+        with self._lock:
+            available = [name for name in self.names if self._stats[name].cooldown_until <= now]
+            cooling = [name for name in self.names if name not in available]
+            return self._ranked(available, now) + self._ranked(cooling, now)
+
+    def record_success(self, name: str, latency: float):
+        with self._lock:
+            stats = self._stats[name]
+            stats.calls += 1
+            stats.samples.append((time.monotonic(), latency))
+
+    def record_failure(self, name: str, failover: bool):
+        with self._lock:
+            stats = self._stats[name]
+            stats.calls += 1
+            stats.failures += 1
+            stats.cooldown_until = time.monotonic() + self.cooldown
+            if failover:
+                self.failovers += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Calls, failures and rolling p50/p95 per backend"""
+        now = time.monotonic()
+        with self._lock:
+            backends = {}
+            for name in self.names:
+                stats = self._stats[name]
+                latencies = self._latencies(name, now)
+                observed = self._observed(name, now)
+                backends[name] = {
+                    "calls": stats.calls,
+                    "failures": stats.failures,
+                    "samples": len(latencies),
+                    "p50_seconds": percentile(latencies, 0.5) if latencies else None,
+                    "p95_seconds": percentile(latencies, 0.95) if latencies else None,
+                    "meets_slo": None if self.slo is None or observed is None else observed <= self.slo,
+                    "cooling_down": stats.cooldown_until > now,
+                }
+            return {"slo_seconds": self.slo, "failovers": self.failovers, "backends": backends}
+
+
+class RoutedChatModel(BaseChatModel):
+    """
+    Chat model that sends each call to the backend chosen by its LatencyRouter.
+
+    `backends` holds the models by name, in the router's configuration order.
+    Tools are bound in the OpenAI format and formatted for each backend when it
+    is called, so a pool may mix providers.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    backends: Dict[str, BaseChatModel]
+    router: LatencyRouter
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"backends": list(self.backends)}
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _call_kwargs(self, name: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        if "tools" not in kwargs:
+            return kwargs
+        rest = {key: value for key, value in kwargs.items() if key != "tools"}
+        return self.backends[name].bind_tools(kwargs["tools"], **rest).kwargs
+
+    @staticmethod
+    def _tagged(chunk: ChatGenerationChunk, name: str) -> ChatGenerationChunk:
+        """Tag the first chunk of a stream only, see the module docstring"""
+        chunk.message.response_metadata = {**chunk.message.response_metadata, "routed_backend": name}
+        return chunk
+
+    def _attempts(self) -> Iterator[Tuple[str, bool]]:
+        """Backend names to try, with whether another one is left after each"""
+        order = self.router.order()
+        for i, name in enumerate(order):
+            yield name, i + 1 < len(order)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        for name, has_next in self._attempts():
+            started = time.perf_counter()
+            try:
+                result = self.backends[name]._generate(messages, stop=stop, **self._call_kwargs(name, kwargs))
+            except Exception:
+                self.router.record_failure(name, failover=has_next)
+                if not has_next:
+                    raise
+                continue
+            self.router.record_success(name, time.perf_counter() - started)
+            message = result.generations[0].message
+            message.response_metadata = {**message.response_metadata, "routed_backend": name}
+            return result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for name, has_next in self._attempts():
+            started = time.perf_counter()
+            stream = self.backends[name]._stream(messages, stop=stop, **self._call_kwargs(name, kwargs))
+            try:
+                first = next(stream, None)
+            except Exception:
+                self.router.record_failure(name, failover=has_next)
+                if not has_next:
+                    raise
+                continue
+            self.router.record_success(name, time.perf_counter() - started)
+            if first is not None:
+                yield self._tagged(first, name)
+            try:
+                yield from stream
+            except Exception:
+                # Tokens were already delivered, the call cannot move to another backend
+                self.router.record_failure(name, failover=False)
+                raise
+            return
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        for name, has_next in self._attempts():
+            started = time.perf_counter()
+            try:
+                result = await self.backends[name]._agenerate(messages, stop=stop, **self._call_kwargs(name, kwargs))
+            except Exception:
+                self.router.record_failure(name, failover=has_next)
+                if not has_next:
+                    raise
+                continue
+            self.router.record_success(name, time.perf_counter() - started)
+            message = result.generations[0].message
+            message.response_metadata = {**message.response_metadata, "routed_backend": name}
+            return result
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for name, has_next in self._attempts():
+            started = time.perf_counter()
+            stream = self.backends[name]._astream(messages, stop=stop, **self._call_kwargs(name, kwargs))
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                first = None
+            except Exception:
+                self.router.record_failure(name, failover=has_next)
+                if not has_next:
+                    raise
+                continue
+            self.router.record_success(name, time.perf_counter() - started)
+            if first is not None:
+                yield self._tagged(first, name)
+            try:
+                async for chunk in stream:
+                    yield chunk
+            except Exception:
+                self.router.record_failure(name, failover=False)
+                raise
+            return
@@ -1,20 +1,52 @@
 # Define prompt templates
-REFINE_PROMPT = """
-You are an expert software architect. Please refine and improve the following project description.
-Fix any typos, clarify ambiguous points, and ensure it's comprehensive.
+#
+# Every prompt is a (system, human) pair laid out for provider-side prompt prefix
+# caching: the system message and the start of the human message are static, and
+# the variable content comes last. The architecture prompts share one system message,
+# so a generation warms the cache for the updates of every feedback round.
+# `python prompt_prefix.py --check` verifies the layout.
+# The component model is asked for in the human message of the prompts that return one:
+# the section calls share the system message but must not write a model, or only a partial one
+COMPONENT_MODEL_FORMAT = """```json
+{{"components": [{{"id": "apiGateway", "label": "API Gateway", "kind": "service", "group": "Edge"}}],
+ "relationships": [{{"source": "apiGateway", "target": "orderService", "label": "REST", "kind": "sync"}}]}}
+```
+* "kind" of a component is one of: service, database, cache, queue, storage, external, client
+* "kind" of a relationship is "sync" or "async"
+* ids are camelCase without spaces and every relationship refers to component ids
+"""
 
-Original description:
-{raw_input}
+COMPONENT_MODEL_INSTRUCTIONS = """
+End your answer with the component model of the whole architecture as a single fenced ```json code block and nothing after it:
+""" + COMPONENT_MODEL_FORMAT + """* list every component of the architecture, not only the changed ones
+"""
 
-Provide a well-structured and clear description.
+SECTION_MODEL_INSTRUCTIONS = """
+End your answer with the component model of the revised sections as a single fenced ```json code block and nothing after it:
+""" + COMPONENT_MODEL_FORMAT + """* list the components and relationships the revised sections describe, with the ids derived from their names; they are merged into the model of the whole architecture by id, and the components of the other sections are kept unless the revised sections remove them
 """
-ARCH_GEN_PROMPT = """
-You are a senior software architect with expertise in designing scalable, maintainable systems. Based on the following project description, create a comprehensive software architecture that balances technical excellence with practical implementation considerations.
+REFINE_PROMPT = ("""
+You are an expert software architect. Please refine and improve the project description provided by the user.
+Fix any typos, clarify ambiguous points, and ensure it's comprehensive.
 
-PROJECT DESCRIPTION:
-{refined_description}
+Provide a well-structured and clear description.
+""", """Original description:
+{raw_input}""")
+
+# Light refinement of long, clean descriptions (input_quality.py): corrections only, applied locally
+LIGHT_REFINE_PROMPT = ("""
+You are an expert software architect proofreading a project description that is already well written and structured.
+List only the typos and clearly wrong terms in the description provided by the user, one per line, in the form:
+wrong text => corrected text
 
-Deliver a professional-grade architecture specification with the following sections:
+Copy the wrong text exactly as it appears. Do not rephrase, restructure or add content. If there is nothing to correct, answer NONE.
+""", """Original description:
+{raw_input}""")
+
+ARCHITECT_SYSTEM_PROMPT = """
+You are a senior software architect with expertise in designing scalable, maintainable systems. You create architecture specifications from project descriptions and revise existing specifications based on stakeholder feedback, balancing technical excellence with practical implementation considerations.
+
+A professional-grade architecture specification has the following sections:
 
 ## 1. CORE COMPONENTS
 * Identify all primary system components (services, interfaces, data stores)
@@ -52,57 +84,72 @@ Deliver a professional-grade architecture specification with the following secti
 * Document environment-specific configurations
 
 Ensure your architecture supports key quality attributes including scalability, security, maintainability, and performance based on the project requirements.
+
+When revising an architecture based on stakeholder feedback, thoughtfully incorporate the feedback while maintaining architectural integrity and coherence:
+* Add, modify, or remove components as needed and highlight changes from the original architecture with a brief rationale
+* Revise interaction patterns and communication protocols so that relationships remain consistent and logical
+* Justify any new or modified technology choices and ensure they remain compatible across the system
+* Address any performance, scalability or availability concerns raised and ensure data consistency across modified components
+* Ensure authentication and authorization remain robust
+* For each significant change, provide a brief explanation of how it addresses the stakeholder feedback while maintaining architectural best practices
 """
-ARCH_UPDATE_PROMPT = """
-You are a senior software architect tasked with refining an existing architecture based on stakeholder feedback. Apply your expertise to thoughtfully incorporate the feedback while maintaining architectural integrity and coherence.
 
+ARCH_GEN_PROMPT = (ARCHITECT_SYSTEM_PROMPT, """Based on the following project description, create a comprehensive software architecture specification with all six sections.
+""" + COMPONENT_MODEL_INSTRUCTIONS + """
+PROJECT DESCRIPTION:
+{refined_description}""")
+
+ARCH_UPDATE_PROMPT = (ARCHITECT_SYSTEM_PROMPT, """Provide a revised architecture specification, with all six sections, that addresses the stakeholder feedback while maintaining system cohesion.
+""" + COMPONENT_MODEL_INSTRUCTIONS + """
 CURRENT ARCHITECTURE:
 {architecture_spec}
 
 STAKEHOLDER FEEDBACK:
-{human_feedback}
+{human_feedback}""")
 
-Provide a revised architecture specification that addresses the feedback while maintaining system cohesion. Your updated architecture must include:
+ARCH_SECTION_UPDATE_PROMPT = (ARCHITECT_SYSTEM_PROMPT, """Revise specific sections of an existing architecture based on stakeholder feedback. Only the sections to revise listed below are affected by the feedback; the rest of the specification stays as it is.
 
-## 1. CORE COMPONENTS
-* Update component definitions based on feedback
-* Add, modify, or remove components as needed
-* Highlight changes from the original architecture with a brief rationale
+Rewrite ONLY the sections to revise so that they address the feedback while staying consistent with the rest of the specification:
+* Start each revised section with exactly the same heading line as given (e.g. `## 3. TECHNOLOGY STACK`)
+* Keep the content that the feedback does not concern
+* Highlight changes with a brief rationale
+* Do not output any other section, introduction or conclusion
+""" + SECTION_MODEL_INSTRUCTIONS + """
+SECTIONS TO REVISE:
+{sections}
 
-## 2. COMPONENT RELATIONSHIPS
-* Revise interaction patterns to address feedback
-* Update communication protocols if necessary
-* Ensure relationships remain consistent and logical
+OTHER SECTIONS OF THE SPECIFICATION (unchanged, for context):
+{outline}
 
-## 3. TECHNOLOGY STACK
-* Revise technology selections based on feedback
-* Justify any new or modified technology choices
-* Ensure technology choices remain compatible across the system
+STAKEHOLDER FEEDBACK:
+{human_feedback}""")
 
-## 4. DATA FLOW
-* Update data flow patterns to accommodate changes
-* Address any performance or scalability concerns raised
-* Ensure data consistency across modified components
+# Parallel generation (create_agent_graph(parallel_sections=True)): one call per section, then a merge call
+ARCH_SECTION_GEN_PROMPT = (ARCHITECT_SYSTEM_PROMPT, """Write ONE section of a comprehensive software architecture specification for the project description below. The other sections are written at the same time by other architects from the same description:
+* Start with exactly the heading line given under SECTION TO WRITE
+* Cover only what belongs in that section, in full detail
+* Name components, technologies and protocols plainly (e.g. "Order Service", "PostgreSQL") so the other sections can use the same names
+* Do not output any other section, introduction, conclusion or component model
 
-## 5. INTEGRATION POINTS
-* Revise external interfaces based on feedback
-* Update API contracts as needed
-* Ensure authentication and authorization remain robust
+PROJECT DESCRIPTION:
+{refined_description}
 
-## 6. DEPLOYMENT CONSIDERATIONS
-* Update deployment recommendations based on feedback
-* Address any scalability or availability concerns raised
-* Revise environment configuration recommendations if needed
+SECTION TO WRITE:
+{section}""")
 
-For each significant change, provide a brief explanation of how it addresses the stakeholder feedback while maintaining architectural best practices.
-"""
+ARCH_MERGE_PROMPT = (ARCHITECT_SYSTEM_PROMPT, """The sections of the architecture specification below were written independently and in parallel. Review them together for consistency:
+* The same component, technology or protocol must have the same name in every section
+* Every component used in the relationships, data flow, integration points or deployment must be one of the core components
+* Technologies mentioned in any section must agree with the technology stack
 
+Output ONLY the sections that must change to resolve an inconsistency, each starting with exactly the same heading line as given, followed by the component model of the whole architecture. If no section needs a change, output only the component model.
+""" + COMPONENT_MODEL_INSTRUCTIONS + """
+ARCHITECTURE SPECIFICATION:
+{architecture_spec}""")
 
-MERMAID_PROMPT = """
-You are a Mermaid.js diagram expert. Transform the following architecture specification into valid, clean Mermaid.js code that prioritizes simplicity and visual clarity.
 
-Architecture Specification to transform:
-{architecture_spec}
+MERMAID_PROMPT = ("""
+You are a Mermaid.js diagram expert. Transform the architecture specification provided by the user into valid, clean Mermaid.js code that prioritizes simplicity and visual clarity.
 
 Follow these strict guidelines to produce error-free Mermaid.js code:
 
@@ -151,4 +198,34 @@ Before submitting your answer, validate your code against these common errors:
 - No special characters in node IDs
 
 Provide ONLY the complete, valid Mermaid.js code. Do not include explanations, comments, or additional text outside the code.
-"""
\ No newline at end of file
+""", """Architecture Specification to transform:
+{architecture_spec}""")
+
+
+MERMAID_FIX_PROMPT = ("""
+You are a Mermaid.js diagram expert. The Mermaid.js flowchart provided by the user fails validation.
+
+Fix ONLY the listed errors and keep every other line exactly as it is. Begin with `flowchart TD` and end every statement with a semicolon (;).
+
+Provide ONLY the complete, corrected Mermaid.js code. Do not include explanations, comments, or additional text outside the code.
+""", """Validation errors:
+{errors}
+
+Mermaid.js code:
+{mermaid_code}""")
+
+
+REVIEW_PROMPT = ("""
+You are an AI assistant tasked with reviewing the architecture stage of a project based on user feedback.
+Your goal is to evaluate the provided content and determine:
+
+1. Whether the user is satisfied with the current architecture
+2. What specific feedback they have provided to improve it
+
+Please return your answer as a JSON object with two keys:
+- "is_satisfied": a boolean indicating if the user is satisfied (true) or wants changes (false)
+- "specific_feedback": a detailed description of what changes the user wants
+
+The user's feedback is their last message.
+""", """Architecture to review:
+{content}""")
@@ -0,0 +1,135 @@
+"""
+Checks that prompts keep their static text in a stable prefix.
+
+Providers cache prompt prefixes (OpenAI automatically from 1024 tokens on, in
+128-token steps; Anthropic up to explicit cache breakpoints): a call reuses an
+earlier call's work only up to the first token that differs. The prompts in
+prompt.py are therefore a static system message followed by a human message
+whose static text comes before its variables.
+
+`python prompt_prefix.py` renders every prompt with two different sets of
+inputs and reports, per prompt, the static tokens of the template, the tokens
+of the prefix shared by both renderings, the tokens of instructions left after
+the first variable (0 when the layout is right; labels such as "STAKEHOLDER
+FEEDBACK:" between variables are allowed) and whether the prefix reaches the
+provider's minimum cacheable length. `--cassette FILE` checks the calls
+recorded in a cassette instead: for every call, the longest prefix it shares
+with an earlier call is what a provider cache could have served.
+
+Usage:
+    python prompt_prefix.py --check
+    python prompt_prefix.py --cassette run.jsonl
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import prompt
+from sections import estimate_tokens
+
+PROMPTS = ["REFINE_PROMPT", "LIGHT_REFINE_PROMPT", "ARCH_GEN_PROMPT", "ARCH_UPDATE_PROMPT", "ARCH_SECTION_UPDATE_PROMPT",
+           "ARCH_SECTION_GEN_PROMPT", "ARCH_MERGE_PROMPT", "MERMAID_PROMPT", "MERMAID_FIX_PROMPT", "REVIEW_PROMPT"]
+# Shortest prefix OpenAI caches; Anthropic's minimum is the same for most models
+MIN_CACHED_TOKENS = 1024
+
+
+def serialize(messages: List[Tuple[str, str]]) -> str:
+    """Messages as one string in prompt order, as the provider tokenizes them"""
+    return "".join(f"<|{role}|>\n{content}\n" for role, content in messages)
+
+
+def _common_prefix(a: str, b: str) -> int:
+    length = min(len(a), len(b))
+    for i in range(length):
+        if a[i] != b[i]:
+            return i
+    return length
+
+
+def render(template: Tuple[str, str], value: str) -> str:
+    """The serialized template with every variable set to `value`"""
+    from workflow import _prompt
+    chat_prompt = _prompt(template)
+    messages = chat_prompt.format_messages(**{name: value for name in chat_prompt.input_variables})
+    return serialize([(message.type, message.content) for message in messages])
+
+
+def check_template(template: Tuple[str, str], min_tokens: int = MIN_CACHED_TOKENS) -> Dict[str, Any]:
+    static = render(template, "")
+    first, second = render(template, "\x00first call"), render(template, "\x01second call")
+    prefix = _common_prefix(first, second)
+    # Labels between variables ("STAKEHOLDER FEEDBACK:") are fine, instructions are not
+    after = [line for line in static[prefix:].splitlines()
+             if line.strip() and not line.rstrip().endswith(":") and not line.startswith("<|")]
+    return {
+        "static_tokens": estimate_tokens(static),
+        "prefix_tokens": estimate_tokens(static[:prefix]),
+        "instructions_after_variables_tokens": estimate_tokens("\n".join(after)) if after else 0,
+        "system_prefix": serialize([("system", template[0])]),
+        "cacheable": estimate_tokens(static[:prefix]) >= min_tokens,
+    }
+
+
+def check_prompts(names: List[str] = PROMPTS, min_tokens: int = MIN_CACHED_TOKENS) -> Dict[str, Dict[str, Any]]:
+    report = {name: check_template(getattr(prompt, name), min_tokens) for name in names}
+    # Prompts with the same system message warm the cache for each other
+    for name, entry in report.items():
+        entry["shares_system_with"] = [other for other in names
+                                       if other != name and report[other]["system_prefix"] == entry["system_prefix"]]
+    for entry in report.values():
+        del entry["system_prefix"]
+    return report
+
+
+def check_cassette(path: str, min_tokens: int = MIN_CACHED_TOKENS) -> Dict[str, Any]:
+    """Prefix each recorded call shares with the earlier calls of the cassette"""
+    calls = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                interaction = json.loads(line)
+                calls.append(serialize([(m["type"], str(m["content"])) for m in interaction["prompt"]]))
+    report_calls = []
+    for i, call in enumerate(calls):
+        shared = max((_common_prefix(call, earlier) for earlier in calls[:i]), default=0)
+        tokens, shared_tokens = estimate_tokens(call), estimate_tokens(call[:shared]) if shared else 0
+        report_calls.append({
+            "call": i,
+            "prompt_tokens": tokens,
+            "shared_prefix_tokens": shared_tokens,
+            "cacheable_tokens": shared_tokens if shared_tokens >= min_tokens else 0,
+        })
+    total = sum(call["prompt_tokens"] for call in report_calls)
+    cacheable = sum(call["cacheable_tokens"] for call in report_calls)
+    return {"calls": report_calls, "prompt_tokens": total, "cacheable_tokens": cacheable,
+            "cacheable_ratio": cacheable / total if total else 0.0}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Verify that prompts keep a stable, cacheable prefix.")
+    parser.add_argument("--cassette", help="Check the prompts recorded in this cassette instead of the templates")
+    parser.add_argument("--min-tokens", type=int, default=MIN_CACHED_TOKENS,
+                        help="Shortest prefix the provider caches")
+    parser.add_argument("--check", action="store_true", help="Fail when a template has instructions after a variable")
+    args = parser.parse_args(argv)
+
+    if args.cassette:
+        print(json.dumps(check_cassette(args.cassette, args.min_tokens), indent=2))
+        return
+    report = check_prompts(min_tokens=args.min_tokens)
+    print(f"{'prompt':<28} {'static':>7} {'prefix':>7} {'after vars':>10} {'cacheable':>9}  shares system with")
+    for name, entry in report.items():
+        print(f"{name:<28} {entry['static_tokens']:>7} {entry['prefix_tokens']:>7} "
+              f"{entry['instructions_after_variables_tokens']:>10} {str(entry['cacheable']):>9}  "
+              f"{', '.join(entry['shares_system_with']) or '-'}")
+    if args.check:
+        failures = [name for name, entry in report.items() if entry["instructions_after_variables_tokens"]]
+        for name in failures:
+            print(f"FAIL {name}: instructions after a variable are not part of the cacheable prefix", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
-from langgraph.graph import add_messages
-from typing import Dict, TypedDict, List, Any
+from typing import Dict, TypedDict, List, Any, Literal, Optional
 from pydantic import BaseModel , Field
 from typing_extensions import TypedDict, Annotated
+from compaction import compact_messages
 
 def replace_operator(old, new):
     return new
 
+def append_or_clear(old, new):
+    """Collects the writes of parallel nodes; an empty list clears the collected ones"""
+    return (old or []) + new if new else []
+
 
 
 class AgentState(TypedDict):
@@ -16,7 +20,10 @@ class AgentState(TypedDict):
     current_state: Annotated[str, replace_operator] 
     next_state: Annotated[str, replace_operator] 
     human_feedback: Annotated[List[Dict], replace_operator]
-    messages: Annotated[List[Dict], add_messages]
+    architecture_model: Annotated[Dict, replace_operator]
+    input_assessment: Annotated[Dict, replace_operator]
+    section_drafts: Annotated[List[Dict], append_or_clear]
+    messages: Annotated[List[Dict], compact_messages]
 
 class HumanFeedback(BaseModel): 
     is_satisfied: bool = Field(
@@ -24,4 +31,41 @@ class HumanFeedback(BaseModel):
     )
     specific_feedback: str = Field(
         description="Detailed feedback or suggestions for improvement"
-    )
\ No newline at end of file
+    )
+
+
+class Component(BaseModel):
+    id: str = Field(
+        description="camelCase identifier of the component, without spaces"
+    )
+    label: str = Field(
+        description="Display name of the component"
+    )
+    kind: Literal["service", "database", "cache", "queue", "storage", "external", "client"] = Field(
+        default="service", description="Kind of component, used for its shape and style"
+    )
+    group: Optional[str] = Field(
+        default=None, description="Layer or subsystem the component belongs to"
+    )
+
+class Relationship(BaseModel):
+    source: str = Field(
+        description="id of the calling/producing component"
+    )
+    target: str = Field(
+        description="id of the called/consuming component"
+    )
+    label: Optional[str] = Field(
+        default=None, description="Protocol or short description of the interaction"
+    )
+    kind: Literal["sync", "async"] = Field(
+        default="sync", description="Whether the interaction is synchronous or asynchronous"
+    )
+
+class ArchitectureModel(BaseModel):
+    components: List[Component] = Field(
+        description="Components of the architecture"
+    )
+    relationships: List[Relationship] = Field(
+        default_factory=list, description="Interactions between components"
+    )
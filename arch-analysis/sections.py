@@ -0,0 +1,129 @@
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Numbered headings mandated by ARCH_GEN_PROMPT/ARCH_UPDATE_PROMPT, e.g. "## 3. TECHNOLOGY STACK"
+SECTION_HEADING = re.compile(r"^(#{1,4})\s*\**\s*(\d+)\.\s*(.+?)\s*\**\s*$", re.MULTILINE)
+
+# Words in feedback that point at a section, keyed by the canonical section title
+SECTION_KEYWORDS = {
+    "CORE COMPONENTS": ["component", "service", "microservice", "module", "boundary", "responsibilit",
+                        "split", "merge", "separate", "monolith", "frontend", "backend", "worker", "store"],
+    "COMPONENT RELATIONSHIPS": ["relationship", "interaction", "communicat", "protocol", "rest", "graphql",
+                                "grpc", "queue", "event", "message", "sync", "async", "depend", "call"],
+    "TECHNOLOGY STACK": ["technolog", "stack", "framework", "language", "library", "database", "postgres",
+                         "mysql", "mongo", "redis", "kafka", "python", "java", "node", "react", "cloud",
+                         "aws", "azure", "gcp", "logging", "monitoring", "observability", "security"],
+    "DATA FLOW": ["data", "flow", "pipeline", "cache", "caching", "persist", "storage", "transform",
+                  "bottleneck", "throughput", "etl", "stream", "consisten"],
+    "INTEGRATION POINTS": ["integrat", "external", "third", "api", "contract", "auth", "oauth", "sso",
+                           "payment", "stripe", "webhook", "error handling", "resilien", "retry"],
+    "DEPLOYMENT CONSIDERATIONS": ["deploy", "kubernetes", "k8s", "docker", "container", "ci/cd", "pipeline",
+                                  "scal", "availability", "region", "environment", "serverless", "infra"],
+}
+
+# Section titles in the order ARCH_GEN_PROMPT numbers them
+SECTION_TITLES = list(SECTION_KEYWORDS)
+
+STOPWORDS = {"the", "and", "for", "with", "that", "this", "from", "into", "instead", "please", "should",
+             "would", "could", "about", "more", "less", "some", "also", "use", "add", "remove", "make"}
+
+
+class Section:
+    """One numbered section of an architecture specification"""
+
+    def __init__(self, number: int, title: str, heading: str, body: str):
+        self.number = number
+        self.title = title
+        self.heading = heading
+        self.body = body
+
+    @property
+    def text(self) -> str:
+        return f"{self.heading}\n{self.body}".rstrip() + "\n"
+
+
+def split_sections(spec: str) -> Tuple[str, "OrderedDict[int, Section]"]:
+    """
+    Split a specification into the text before the first numbered heading and
+    its sections keyed by number. Text after the last heading belongs to the
+    last section.
+    """
+    matches = list(SECTION_HEADING.finditer(spec))
+    sections: "OrderedDict[int, Section]" = OrderedDict()
+    if not matches:
+        return spec, sections
+    # Numbered sub-headings deeper than the first section heading stay inside their section
+    matches = [match for match in matches if len(match.group(1)) == len(matches[0].group(1))]
+    preamble = spec[:matches[0].start()]
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(spec)
+        number = int(match.group(2))
+        if number in sections:
+            # A repeated number is not a new section (e.g. a numbered list inside one)
+            sections[next(reversed(sections))].body += spec[match.start():end]
+            continue
+        sections[number] = Section(number, match.group(3).strip().upper(), match.group(0).strip(),
+                                   spec[match.end():end].strip("\n"))
+    return preamble, sections
+
+
+def join_sections(preamble: str, sections: Dict[int, Section]) -> str:
+    body = "\n".join(section.text for section in sections.values())
+    return f"{preamble.rstrip()}\n\n{body}".lstrip("\n") if preamble.strip() else body
+
+
+def select_sections(feedback: str, sections: Dict[int, Section], max_share: float = 0.7) -> List[int]:
+    """
+    Map feedback to the sections it affects.
+
+    A section is selected when the feedback uses one of its keywords or names
+    something (a technology, a component) that appears in its text. Returns an
+    empty list when nothing matches or so much of the spec is affected that a
+    full regeneration is the better choice.
+    """
+    if not sections:
+        return []
+    lowered = feedback.lower()
+    terms = {word for word in re.findall(r"[a-z][a-z0-9.+#/-]{3,}", lowered) if word not in STOPWORDS}
+    mentions = {
+        number: {term for term in terms if re.search(rf"\b{re.escape(term)}\b", section.body.lower())}
+        for number, section in sections.items()
+    }
+    # Only terms specific to a few sections say where the change belongs ("Kafka", not "service")
+    distinctive = {
+        term for term in terms
+        if 0 < sum(term in found for found in mentions.values()) <= len(sections) // 2
+    }
+    selected = []
+    for number, section in sections.items():
+        keywords = next((words for title, words in SECTION_KEYWORDS.items() if title in section.title), [])
+        if any(re.search(rf"\b{re.escape(keyword)}", lowered) for keyword in keywords) or mentions[number] & distinctive:
+            selected.append(number)
+    if not selected or len(selected) > max_share * len(sections):
+        return []
+    return selected
+
+
+def outline(sections: Dict[int, Section], exclude: List[int]) -> str:
+    """Headings of the sections that are kept as they are"""
+    return "\n".join(section.heading for number, section in sections.items() if number not in exclude)
+
+
+def splice_sections(spec: str, updated: str, numbers: List[int]) -> Optional[str]:
+    """
+    Replace the given sections of `spec` with the ones found in `updated`.
+    Returns None when `updated` does not contain all of them.
+    """
+    preamble, sections = split_sections(spec)
+    _, new_sections = split_sections(updated)
+    if not all(number in new_sections and number in sections for number in numbers):
+        return None
+    for number in numbers:
+        sections[number] = new_sections[number]
+    return join_sections(preamble, sections)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English prose)"""
+    return max(1, len(text) // 4)
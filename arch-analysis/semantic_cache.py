@@ -0,0 +1,289 @@
+"""
+Local similarity index serving near-duplicate requests from earlier results.
+
+Texts are turned into sparse vectors by a hashing vectorizer (stemmed words,
+marked when a negation precedes them in their clause, word bigrams and
+character trigrams, hashed into 2**20 dimensions, sublinear term frequency,
+L2-normalized), so there is no vocabulary to fit. Each vector
+also gets a 128-bit SimHash signature, and the signatures are split into bands
+for locality-sensitive hashing: a lookup only scores the entries that share at
+least one band with the query, then picks the best cosine similarity above
+the threshold. Identical texts are found by hash before any of this.
+
+`SemanticCache` keeps one bounded, LRU-evicted index per workflow step
+("refine", "architecture") and counts hits, misses and evictions. It is opt-in
+(ARCH_SEMANTIC_CACHE=1), because a hit serves the result computed for another
+user's request.
+
+Run `python semantic_cache.py [pairs.jsonl]` to report precision and recall
+per threshold on the labelled pairs in `fixtures/semantic_pairs.jsonl`.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+DIMENSIONS = 2 ** 20
+SIGNATURE_BITS = 128
+BANDS = 16
+STOP_WORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "for", "in", "on", "at", "by", "as", "is", "are", "be",
+    "it", "its", "this", "that", "we", "our", "i", "my", "me", "you", "your", "want", "need", "would",
+    "like", "build", "create", "make", "design", "please", "some", "can", "which", "where", "so",
+}
+# Words negating the rest of their clause
+NEGATIONS = {"no", "not", "without", "except", "excluding", "non"}
+# Character trigrams only refine the word features (plural forms, typos, compounds)
+CHAR_WEIGHT = 0.3
+
+
+def enabled() -> bool:
+    return os.getenv("ARCH_SEMANTIC_CACHE", "0") == "1"
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ies", "es", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def _hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=16).digest(), "big")
+
+
+def vectorize(text: str) -> Tuple[Dict[int, float], int]:
+    """
+    Hashing-vectorizer features of a text.
+
+    Returns:
+        The L2-normalized sparse vector (dimension -> weight) and its SimHash signature
+    """
+    words = []
+    for clause in re.split(r"[,.;:!?()\n]", text.lower()):
+        negated = False
+        for word in re.findall(r"[a-z0-9]+", clause):
+            if word in NEGATIONS:
+                negated = True
+            elif word not in STOP_WORDS:
+                # "without payments" must not match "with payments"
+                words.append(("!" if negated else "") + _stem(word))
+    counts: Counter = Counter(words)
+    counts.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    chars = Counter(f"#{word[i:i + 3]}" for word in words for i in range(max(1, len(word) - 2)))
+
+    weights: Dict[int, float] = defaultdict(float)
+    signature_counts = [0.0] * SIGNATURE_BITS
+    for feature_counts, scale in ((counts, 1.0), (chars, CHAR_WEIGHT)):
+        for feature, count in feature_counts.items():
+            weight = scale * (1.0 + math.log(count))
+            hashed = _hash(feature)
+            weights[hashed % DIMENSIONS] += weight
+            for bit in range(SIGNATURE_BITS):
+                signature_counts[bit] += weight if hashed >> bit & 1 else -weight
+    norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+    signature = sum(1 << bit for bit, total in enumerate(signature_counts) if total > 0)
+    return {index: weight / norm for index, weight in weights.items()}, signature
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    """Cosine similarity of two normalized sparse vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(index, 0.0) for index, weight in a.items())
+
+
+def _bands(signature: int) -> List[Tuple[int, int]]:
+    width = SIGNATURE_BITS // BANDS
+    mask = (1 << width) - 1
+    return [(band, signature >> (band * width) & mask) for band in range(BANDS)]
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha256(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SemanticHit:
+    value: Any
+    similarity: float
+    text: str
+
+
+@dataclass
+class _Entry:
+    text: str
+    vector: Dict[int, float]
+    signature: int
+    value: Any
+
+
+class SemanticIndex:
+    """
+    Bounded similarity index over texts; not thread-safe on its own (SemanticCache locks it).
+
+    Args:
+        threshold: Minimum cosine similarity for a hit
+        max_entries: Entries kept; the least recently used are evicted first
+    """
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 1000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.candidates = 0
+        self.similarity_total = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        for band in _bands(entry.signature):
+            bucket = self._buckets[band]
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[band]
+
+    def lookup(self, text: str) -> Optional[SemanticHit]:
+        """The most similar entry at or above the threshold, or None"""
+        key = _text_key(text)
+        best, best_key = None, None
+        if key in self._entries:
+            entry = self._entries[key]
+            best, best_key = SemanticHit(entry.value, 1.0, entry.text), key
+        else:
+            vector, signature = vectorize(text)
+            candidates = set()
+            for band in _bands(signature):
+                candidates.update(self._buckets.get(band, ()))
+            self.candidates += len(candidates)
+            for candidate in candidates:
+                entry = self._entries[candidate]
+                similarity = cosine(vector, entry.vector)
+                if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                    best, best_key = SemanticHit(entry.value, similarity, entry.text), candidate
+        if best is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(best_key)
+        self.hits += 1
+        self.similarity_total += best.similarity
+        return best
+
+    def add(self, text: str, value: Any):
+        key = _text_key(text)
+        if key in self._entries:
+            self._remove(key)
+        vector, signature = vectorize(text)
+        self._entries[key] = _Entry(text, vector, signature, value)
+        for band in _bands(signature):
+            self._buckets[band].add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "lookups": lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "mean_hit_similarity": self.similarity_total / self.hits if self.hits else 0.0,
+            "candidates_per_lookup": self.candidates / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+        }
+
+
+class SemanticCache:
+    """Thread-safe set of SemanticIndex instances, one per workflow step"""
+
+    def __init__(self, threshold: Optional[float] = None, max_entries: Optional[int] = None):
+        self.threshold = threshold if threshold is not None else float(
+            os.getenv("ARCH_SEMANTIC_CACHE_THRESHOLD", "0.85"))
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv("ARCH_SEMANTIC_CACHE_SIZE", "1000"))
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, SemanticIndex] = {}
+
+    def _index(self, step: str) -> SemanticIndex:
+        if step not in self._indexes:
+            self._indexes[step] = SemanticIndex(self.threshold, self.max_entries)
+        return self._indexes[step]
+
+    def lookup(self, step: str, text: str) -> Optional[SemanticHit]:
+        if not text:
+            return None
+        with self._lock:
+            return self._index(step).lookup(text)
+
+    def add(self, step: str, text: str, value: Any):
+        if not text:
+            return
+        with self._lock:
+            self._index(step).add(text, value)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit rate, evictions and size per step"""
+        with self._lock:
+            return {step: index.stats() for step, index in self._indexes.items()}
+
+
+def evaluate(pairs: Iterable[Dict[str, Any]], thresholds: Iterable[float] = (0.6, 0.7, 0.8, 0.85, 0.9, 0.95)) -> Dict[str, Any]:
+    """
+    Precision and recall of serving `b` from `a` at several thresholds.
+
+    Args:
+        pairs: Records with two texts `a` and `b` and whether they are the
+            same request (`duplicate`)
+
+    Returns:
+        Per threshold: precision and recall of the index (LSH candidates
+        included), and the similarity of every pair
+    """
+    pairs = list(pairs)
+    scored = []
+    for pair in pairs:
+        (a, signature_a), (b, signature_b) = vectorize(pair["a"]), vectorize(pair["b"])
+        shares_band = bool(set(_bands(signature_a)) & set(_bands(signature_b)))
+        scored.append((pair, cosine(a, b), shares_band))
+    report = {"pairs": len(pairs), "duplicates": sum(1 for pair in pairs if pair["duplicate"]), "thresholds": {}}
+    for threshold in thresholds:
+        served = [(pair, similarity) for pair, similarity, shares_band in scored
+                  if shares_band and similarity >= threshold]
+        correct = sum(1 for pair, _ in served if pair["duplicate"])
+        report["thresholds"][str(threshold)] = {
+            "served": len(served),
+            "precision": correct / len(served) if served else 1.0,
+            "recall": correct / report["duplicates"] if report["duplicates"] else 0.0,
+        }
+    report["similarities"] = [
+        {"a": pair["a"], "b": pair["b"], "duplicate": pair["duplicate"], "similarity": round(similarity, 3)}
+        for pair, similarity, _ in scored
+    ]
+    return report
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "fixtures", "semantic_pairs.jsonl"
+    )
+    with open(path, "r", encoding="utf-8") as f:
+        report = evaluate(json.loads(line) for line in f if line.strip())
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,105 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Speculator:
+    """
+    Runs a function ahead of time in background threads, keyed by session and a hash of its input.
+
+    Used to start Mermaid generation while the graph waits at human_review: if
+    the reviewer approves, the node takes the finished (or in-flight) result;
+    if they send feedback, the speculative work is discarded. Entries belong to
+    one session (the graph's thread_id), so sessions reviewing the same spec do
+    not take or cancel each other's work. Sessions abandoned during review never
+    take or discard theirs, so entries older than `ttl_seconds` and the least
+    recently submitted beyond `max_entries` are cancelled and dropped.
+    """
+
+    def __init__(self, fn: Callable[[str], Any], max_workers: int = 4, max_entries: int = 64,
+                 ttl_seconds: float = 1800.0):
+        self.fn = fn
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative")
+        # (session, content hash) -> (submitted at, future), oldest first
+        self._futures: "OrderedDict[Tuple[Optional[str], str], Tuple[float, Future]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.used = 0
+        self.discarded = 0
+        self.evicted = 0
+
+    def _evict(self):
+        """Cancel expired entries and the oldest beyond max_entries; the lock is held"""
+        now = time.monotonic()
+        while self._futures:
+            key, (submitted_at, future) = next(iter(self._futures.items()))
+            if now - submitted_at <= self.ttl_seconds and len(self._futures) <= self.max_entries:
+                break
+            del self._futures[key]
+            future.cancel()
+            self.evicted += 1
+
+    def submit(self, text: str, session: Optional[str] = None) -> str:
+        """Start computing fn(text) for a session in the background unless it is already running"""
+        key = content_hash(text)
+        with self._lock:
+            if (session, key) not in self._futures:
+                self._futures[(session, key)] = (time.monotonic(), self._executor.submit(self.fn, text))
+                self.submitted += 1
+            self._evict()
+        return key
+
+    def take(self, text: str, session: Optional[str] = None, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Return the session's speculative result for `text`, waiting for it if still running.
+        Returns None when nothing was speculated or the background call failed.
+        """
+        with self._lock:
+            entry = self._futures.pop((session, content_hash(text)), None)
+        if entry is None:
+            return None
+        try:
+            result = entry[1].result(timeout=timeout)
+        except Exception as e:
+            print(f"Speculative call failed, running it again: {str(e)}")
+            return None
+        self.used += 1
+        return result
+
+    def discard(self, text: str, session: Optional[str] = None):
+        """Drop the session's speculative result for `text`, cancelling it if it has not started"""
+        with self._lock:
+            entry = self._futures.pop((session, content_hash(text)), None)
+        if entry is not None:
+            entry[1].cancel()
+            self.discarded += 1
+
+    def discard_session(self, session: Optional[str]):
+        """Drop every speculative result of a session, e.g. when it is closed"""
+        with self._lock:
+            keys = [key for key in self._futures if key[0] == session]
+            entries = [self._futures.pop(key) for key in keys]
+        for _, future in entries:
+            future.cancel()
+            self.discarded += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._evict()
+            pending = len(self._futures)
+        return {
+            "submitted": self.submitted,
+            "used": self.used,
+            "discarded": self.discarded,
+            "evicted": self.evicted,
+            "pending": pending,
+        }
@@ -0,0 +1,257 @@
+"""
+Typed streaming events for ArchitectureProcessor.
+
+The processor turns the LangGraph stream into events: `TokenDelta` (new text
+of the assistant message), `NodeStart`/`NodeEnd`, `Interrupt` (human review
+required) and `Completed`. Tokens are collected in a join-based MessageBuffer
+instead of repeated string concatenation, and deltas are coalesced: a
+TokenDelta is emitted once `flush_interval` seconds have passed or
+`flush_bytes` bytes are pending, and always before a node ends or an update
+is handled. Under an event loop (AsyncArchitectureProcessor) a timer on the
+loop also flushes text left pending when no further event arrives, so
+`flush_interval` bounds the delay of every token. A node that
+streams no tokens contributes its assistant message when its update arrives.
+The component model block that architecture answers end with (a ```json
+fence, split off by the node) is kept out of the message: a ```json block is
+held back until it is known to be the trailing one, and released when more
+text follows it, since specs may contain json examples of their own.
+
+`full_text_callback` adapts an event callback to the original API, a callback
+receiving the whole message so far.
+"""
+import asyncio
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+# Start of the component model block appended to architecture answers, and the
+# whole block at the end of an answer (the rule of mermaid_compiler.extract_architecture_model)
+MODEL_FENCE = "```json"
+MODEL_BLOCK = re.compile(r"```json\s*\n\{.*\}\s*\n```\s*$", re.DOTALL)
+FENCE_END = re.compile(r"\n```[ \t]*(?=\n|$)")
+
+
+@dataclass(frozen=True)
+class StreamEvent:
+    """Base class of the events emitted while the graph runs"""
+
+
+@dataclass(frozen=True)
+class TokenDelta(StreamEvent):
+    text: str
+    node: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NodeStart(StreamEvent):
+    node: str
+
+
+@dataclass(frozen=True)
+class NodeEnd(StreamEvent):
+    node: str
+    error: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Interrupt(StreamEvent):
+    state: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Completed(StreamEvent):
+    state: Dict[str, Any] = field(default_factory=dict)
+
+
+EventCallback = Callable[[StreamEvent], None]
+
+
+class MessageBuffer:
+    """Append-only text builder; joins its parts only when the text is read"""
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._length = 0
+
+    def append(self, text: str):
+        self._parts.append(text)
+        self._length += len(text)
+
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def __len__(self) -> int:
+        return self._length
+
+
+def full_text_callback(message_callback: Callable[[str], None]) -> EventCallback:
+    """Adapter calling `message_callback` with the whole message after every delta"""
+    buffer = MessageBuffer()
+
+    def on_event(event: StreamEvent):
+        if isinstance(event, TokenDelta):
+            buffer.append(event.text)
+            message_callback(buffer.text())
+
+    return on_event
+
+
+class EventEmitter:
+    """
+    Coalesces token deltas and dispatches events to the registered callbacks.
+
+    Args:
+        callbacks: Event callbacks, called in order for every event
+        flush_interval: Seconds after which pending text is emitted (0 emits every token)
+        flush_bytes: Pending bytes after which text is emitted regardless of time
+        model_nodes: Nodes whose streamed answers end with the component model block
+    """
+
+    def __init__(self, callbacks: List[EventCallback], flush_interval: float = 0.05, flush_bytes: int = 512,
+                 model_nodes: Sequence[str] = ("architecture",)):
+        self.callbacks = callbacks
+        self.model_nodes = set(model_nodes)
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.message = MessageBuffer()
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._pending_node: Optional[str] = None
+        self._streamed: Set[str] = set()
+        # Text that may start or be the model block, held back per node
+        self._held: Dict[Optional[str], str] = {}
+        self._last_flush = time.perf_counter()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _emit(self, event: StreamEvent):
+        for callback in self.callbacks:
+            callback(event)
+
+    def _without_model(self, text: str, node: Optional[str]) -> str:
+        """The part of a model node's text that cannot belong to the trailing component model block"""
+        text = self._held.pop(node, "") + text
+        released = []
+        while True:
+            index = text.find(MODEL_FENCE)
+            if index < 0:
+                # Hold back a tail that could be the start of the fence
+                for size in range(min(len(text), len(MODEL_FENCE) - 1), 0, -1):
+                    if MODEL_FENCE.startswith(text[-size:]):
+                        self._held[node] = text[-size:]
+                        text = text[:-size]
+                        break
+                released.append(text)
+                break
+            released.append(text[:index])
+            block = text[index:]
+            end = FENCE_END.search(block, len(MODEL_FENCE))
+            if end is None or not block[end.end():].strip():
+                # Open, or closed with nothing after it yet: it may be the trailing model
+                self._held[node] = block
+                break
+            # More text follows, so the block is part of the spec
+            released.append(block[:end.end()])
+            text = block[end.end():]
+        return "".join(released)
+
+    def _release(self, node: Optional[str]):
+        """End of a node's answer: emit the held text unless it is the trailing model block"""
+        held = self._held.pop(node, "")
+        if held and not (node in self.model_nodes and MODEL_BLOCK.match(held)):
+            self._append(held, node)
+
+    def token(self, text: str, node: Optional[str] = None):
+        if node in self.model_nodes:
+            self._streamed.add(node)
+            text = self._without_model(text, node)
+        self._append(text, node)
+
+    def _append(self, text: str, node: Optional[str]):
+        if not text:
+            return
+        if self._pending and node != self._pending_node:
+            self.flush()
+        self._streamed.add(node)
+        self.message.append(text)
+        self._pending.append(text)
+        self._pending_bytes += len(text)
+        self._pending_node = node
+        if (self._pending_bytes >= self.flush_bytes
+                or time.perf_counter() - self._last_flush >= self.flush_interval):
+            self.flush()
+        else:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """Under a running event loop, flush the pending text when it is due even if no event arrives"""
+        if self._timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Synchronous stream: the next token, update or node end flushes
+            return
+        delay = max(0.0, self.flush_interval - (time.perf_counter() - self._last_flush))
+        self._timer = loop.call_later(delay, self.flush)
+
+    def flush(self):
+        """Emit the pending text as one TokenDelta"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._last_flush = time.perf_counter()
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        self._emit(TokenDelta(text, self._pending_node))
+
+    def node_start(self, node: str):
+        self.flush()
+        self._emit(NodeStart(node))
+
+    def node_end(self, node: str, error: Optional[str] = None):
+        self._release(node)
+        self.flush()
+        self._emit(NodeEnd(node, error))
+
+    def interrupt(self, state: Dict[str, Any]):
+        self.flush()
+        self._emit(Interrupt(state))
+
+    def completed(self, state: Dict[str, Any]):
+        self.flush()
+        self._emit(Completed(state))
+
+    def handle(self, mode: str, data: Any):
+        """Feed one item of a `stream_mode=["messages", "updates", "debug"]` stream"""
+        if mode == "messages":
+            msg, metadata = data
+            content = getattr(msg, "content", None)
+            if isinstance(content, str):
+                self.token(content, metadata.get("langgraph_node"))
+        elif mode == "debug":
+            if data["type"] == "task":
+                self.node_start(data["payload"]["name"])
+            elif data["type"] == "task_result":
+                payload = data["payload"]
+                self.node_end(payload["name"], payload.get("error"))
+        elif mode == "updates":
+            # A node that streamed no tokens (cached, compiled or parallel, unstreamed
+            # answers) delivers its assistant message as one delta when it finishes
+            for node, update in data.items():
+                if node in self._streamed:
+                    self._streamed.discard(node)
+                    self._release(node)
+                elif isinstance(update, dict):
+                    for message in update.get("messages", []):
+                        if isinstance(message, dict) and message.get("artifact"):
+                            self.token(message["content"], node)
+                            self._release(node)
+                            self._streamed.discard(node)
+            # Nodes without tokens may run next, do not hold the tail of the last answer until then
+            self.flush()
@@ -0,0 +1,324 @@
+"""
+Spans, token counts and cost per node and per session.
+
+ArchitectureProcessor attaches a SessionTracer's callback handler to every
+graph call. Each node run becomes a span with its wall time, the time to the
+first streamed token, prompt/completion tokens, prompt tokens served from the
+provider's prefix cache, response cache status and estimated cost, and each
+model call inside it a child span. Finished spans go to the configured
+exporter and roll up into the `trace` summary returned with every processor
+result.
+
+Configuration:
+    ARCH_TRACING        Set to 0 to disable tracing
+    ARCH_TRACE_FILE     Append spans to this file as OTLP/JSON lines (JsonlFileExporter)
+    ARCH_TRACE_SERVICE  service.name resource attribute (default "arch-analysis")
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+# USD per million (prompt, completion, cached prompt) tokens; cached responses cost nothing.
+# Prompt tokens served from the provider's prefix cache are billed at the cached price
+COST_PER_MILLION_TOKENS = {
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4.1-mini": (0.40, 1.60, 0.10),
+    "gpt-4.1-nano": (0.10, 0.40, 0.025),
+    "gpt-4.1": (2.00, 8.00, 0.50),
+    "o3-mini": (1.10, 4.40, 0.55),
+    "claude-3-5-haiku": (0.80, 4.00, 0.08),
+    "claude-3-5-sonnet": (3.00, 15.00, 0.30),
+}
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int,
+                  cached_prompt_tokens: int = 0) -> Optional[float]:
+    """Cost in USD, or None for a model without a known price"""
+    if not model:
+        return None
+    # Longest matching prefix, so dated names ("gpt-4o-mini-2024-07-18") find their family
+    matches = [name for name in COST_PER_MILLION_TOKENS if model.startswith(name)]
+    if not matches:
+        return None
+    prompt_price, completion_price, cached_price = COST_PER_MILLION_TOKENS[max(matches, key=len)]
+    uncached = prompt_tokens - cached_prompt_tokens
+    return (uncached * prompt_price + cached_prompt_tokens * cached_price
+            + completion_tokens * completion_price) / 1_000_000
+
+
+def _span_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class SpanExporter:
+    """Receives finished spans; subclasses send them somewhere"""
+
+    def export(self, spans: List[Dict[str, Any]]):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class JsonlFileExporter(SpanExporter):
+    """
+    Appends every batch of spans to a file as one OTLP/JSON ExportTraceServiceRequest
+    per line, the format of the OpenTelemetry collector's file exporter.
+    """
+
+    def __init__(self, path: str, service_name: str = "arch-analysis"):
+        self.path = path
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def _otlp_span(self, span: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "parentSpanId": span["parent_id"] or "",
+            "name": span["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(int(span["start"] * 1e9)),
+            "endTimeUnixNano": str(int(span["end"] * 1e9)),
+            "attributes": [
+                {"key": key, "value": self._value(value)}
+                for key, value in span["attributes"].items() if value is not None
+            ],
+            "status": {"code": 2 if span["status"] == "error" else 1},
+        }
+
+    def export(self, spans: List[Dict[str, Any]]):
+        if not spans:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "arch-analysis.tracing"}, "spans": [self._otlp_span(s) for s in spans]}],
+        }]}
+        line = json.dumps(request)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_exporter: Optional[SpanExporter] = None
+
+
+def get_exporter() -> SpanExporter:
+    """The exporter set with set_exporter, else a JsonlFileExporter for ARCH_TRACE_FILE, else a no-op"""
+    global _exporter
+    if _exporter is None:
+        path = os.getenv("ARCH_TRACE_FILE")
+        service_name = os.getenv("ARCH_TRACE_SERVICE", "arch-analysis")
+        _exporter = JsonlFileExporter(path, service_name) if path else SpanExporter()
+    return _exporter
+
+
+def set_exporter(exporter: Optional[SpanExporter]):
+    """Send spans to `exporter` (None restores the environment default)"""
+    global _exporter
+    _exporter = exporter
+
+
+class TracingHandler(BaseCallbackHandler):
+    """Turns LangGraph node runs and the model calls inside them into spans"""
+
+    # Called in the thread (or event loop) of the run, so timings are not delayed by an executor
+    run_inline = True
+
+    def __init__(self, tracer: "SessionTracer"):
+        self.tracer = tracer
+        self._lock = threading.Lock()
+        self._nodes: Dict[Any, Dict[str, Any]] = {}
+        self._llms: Dict[Any, Dict[str, Any]] = {}
+        # Node span of the run ids nested inside a node (prompt, model, parser runs)
+        self._owner: Dict[Any, Any] = {}
+
+    def _node_of(self, parent_run_id) -> Optional[Dict[str, Any]]:
+        owner = self._owner.get(parent_run_id, parent_run_id)
+        return self._nodes.get(owner)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        with self._lock:
+            if node and kwargs.get("name") == node:
+                self._nodes[run_id] = self.tracer.start_span(node, kind="node")
+                self._owner[run_id] = run_id
+            elif parent_run_id in self._owner:
+                self._owner[run_id] = self._owner[parent_run_id]
+
+    def _end_chain(self, run_id, status: str):
+        with self._lock:
+            span = self._nodes.pop(run_id, None)
+            self._owner.pop(run_id, None)
+        if span is not None:
+            self.tracer.end_span(span, status)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_chain(run_id, "ok")
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        # interrupt() in human_review surfaces as a GraphInterrupt, which is not a failure
+        self._end_chain(run_id, "interrupted" if type(error).__name__ == "GraphInterrupt" else "error")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        with self._lock:
+            parent = self._node_of(parent_run_id)
+            span = self.tracer.start_span("llm", kind="llm", parent=parent)
+            span["attributes"]["llm.model"] = params.get("model_name") or params.get("model") or (metadata or {}).get("ls_model_name")
+            span["first_token"] = None
+            self._llms[run_id] = span
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        span = self._llms.get(run_id)
+        if span is not None and span["first_token"] is None:
+            span["first_token"] = time.time()
+
+    def _end_llm(self, run_id, response, status: str):
+        with self._lock:
+            span = self._llms.pop(run_id, None)
+        if span is None:
+            return
+        attributes = span["attributes"]
+        message = None
+        if response is not None and response.generations and response.generations[0]:
+            message = getattr(response.generations[0][0], "message", None)
+        usage = getattr(message, "usage_metadata", None) or {}
+        response_metadata = getattr(message, "response_metadata", None) or {}
+        attributes["llm.model"] = attributes["llm.model"] or response_metadata.get("model_name")
+        attributes["llm.cache_hit"] = bool(response_metadata.get("cache_hit"))
+        attributes["llm.prompt_tokens"] = usage.get("input_tokens", 0)
+        attributes["llm.completion_tokens"] = usage.get("output_tokens", 0)
+        attributes["llm.cached_prompt_tokens"] = (usage.get("input_token_details") or {}).get("cache_read", 0)
+        attributes["llm.cost_usd"] = 0.0 if attributes["llm.cache_hit"] else estimate_cost(
+            attributes["llm.model"], attributes["llm.prompt_tokens"], attributes["llm.completion_tokens"],
+            attributes["llm.cached_prompt_tokens"])
+        first_token = span.pop("first_token")
+        if first_token is not None:
+            attributes["llm.ttft_seconds"] = first_token - span["start"]
+        self.tracer.end_span(span, status)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end_llm(run_id, response, "ok")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end_llm(run_id, None, "error")
+
+
+class SessionTracer:
+    """Spans of one processor session (one LangGraph thread), exported as they finish"""
+
+    def __init__(self, session_id: Optional[str] = None, exporter: Optional[SpanExporter] = None):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.trace_id = uuid.uuid4().hex
+        self.exporter = exporter
+        self.handler = TracingHandler(self)
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, kind: str, parent: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        span = {
+            "trace_id": self.trace_id,
+            "span_id": _span_id(),
+            "parent_id": parent["span_id"] if parent else None,
+            "name": name,
+            "start": time.time(),
+            "end": None,
+            "status": None,
+            "attributes": {"session.id": self.session_id, "span.kind": kind},
+        }
+        if parent is not None:
+            parent.setdefault("children", []).append(span)
+        return span
+
+    def end_span(self, span: Dict[str, Any], status: str = "ok"):
+        span["end"] = time.time()
+        span["status"] = status
+        attributes = span["attributes"]
+        attributes["duration_seconds"] = span["end"] - span["start"]
+        if attributes["span.kind"] == "node":
+            # Roll the model calls up into their node
+            children = span.pop("children", [])
+            attributes["node.llm_calls"] = len(children)
+            attributes["llm.prompt_tokens"] = sum(c["attributes"].get("llm.prompt_tokens") or 0 for c in children)
+            attributes["llm.completion_tokens"] = sum(c["attributes"].get("llm.completion_tokens") or 0 for c in children)
+            attributes["llm.cached_prompt_tokens"] = sum(
+                c["attributes"].get("llm.cached_prompt_tokens") or 0 for c in children)
+            costs = [c["attributes"].get("llm.cost_usd") for c in children]
+            attributes["llm.cost_usd"] = sum(c for c in costs if c is not None) if children else 0.0
+            hits = sum(1 for c in children if c["attributes"].get("llm.cache_hit"))
+            attributes["llm.cache"] = "none" if not children else "hit" if hits == len(children) else "miss" if not hits else "partial"
+            first_tokens = [c["start"] + c["attributes"]["llm.ttft_seconds"]
+                            for c in children if c["attributes"].get("llm.ttft_seconds") is not None]
+            if first_tokens:
+                attributes["node.ttft_seconds"] = min(first_tokens) - span["start"]
+        with self._lock:
+            self.spans.append(span)
+
+    def flush(self):
+        """Export the spans finished since the last flush"""
+        with self._lock:
+            pending = [span for span in self.spans if not span.get("exported")]
+            for span in pending:
+                span["exported"] = True
+        exporter = self.exporter or get_exporter()
+        exporter.export([{k: v for k, v in span.items() if k != "exported"} for span in pending])
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-node and session totals of the finished node spans"""
+        nodes: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            node_spans = [span for span in self.spans if span["attributes"]["span.kind"] == "node"]
+        for span in node_spans:
+            attributes = span["attributes"]
+            node = nodes.setdefault(span["name"], {
+                "runs": 0, "seconds": 0.0, "ttft_seconds": None, "llm_calls": 0, "prompt_tokens": 0,
+                "completion_tokens": 0, "cached_prompt_tokens": 0, "cost_usd": 0.0, "cache_hits": 0,
+            })
+            node["runs"] += 1
+            node["seconds"] += attributes["duration_seconds"]
+            if attributes.get("node.ttft_seconds") is not None and node["ttft_seconds"] is None:
+                node["ttft_seconds"] = attributes["node.ttft_seconds"]
+            node["llm_calls"] += attributes["node.llm_calls"]
+            node["prompt_tokens"] += attributes["llm.prompt_tokens"]
+            node["completion_tokens"] += attributes["llm.completion_tokens"]
+            node["cached_prompt_tokens"] += attributes["llm.cached_prompt_tokens"]
+            node["cost_usd"] += attributes["llm.cost_usd"]
+            node["cache_hits"] += 1 if attributes["llm.cache"] == "hit" else 0
+        for node in nodes.values():
+            node["prompt_cache_ratio"] = node["cached_prompt_tokens"] / node["prompt_tokens"] if node["prompt_tokens"] else 0.0
+        prompt_tokens = sum(node["prompt_tokens"] for node in nodes.values())
+        cached = sum(node["cached_prompt_tokens"] for node in nodes.values())
+        return {
+            "session_id": self.session_id,
+            "trace_id": self.trace_id,
+            "seconds": sum(node["seconds"] for node in nodes.values()),
+            "llm_calls": sum(node["llm_calls"] for node in nodes.values()),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": sum(node["completion_tokens"] for node in nodes.values()),
+            "cached_prompt_tokens": cached,
+            # Share of the prompt tokens served from the provider's prompt prefix cache
+            "prompt_cache_ratio": cached / prompt_tokens if prompt_tokens else 0.0,
+            "cost_usd": sum(node["cost_usd"] for node in nodes.values()),
+            "nodes": nodes,
+        }
+
+
+def tracing_enabled() -> bool:
+    return os.getenv("ARCH_TRACING", "1") != "0"
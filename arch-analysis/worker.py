@@ -0,0 +1,116 @@
+"""
+Background execution of processor calls for the Streamlit app.
+
+`submit` runs a processor method on a thread pool shared by all sessions of
+the server and returns a Job. The streaming events and status updates of the
+call are put on the job's queue instead of being rendered from the worker
+thread; the page drains them with `Job.poll` on each rerun, so the script
+thread never waits for the model and the user can cancel a running job.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from streaming import StreamEvent
+
+MAX_WORKERS = int(os.getenv("ARCH_WORKERS", "16"))
+
+
+class JobCancelled(Exception):
+    """Raised inside the worker at the next streamed event once a job is cancelled"""
+
+
+class Job:
+    """One processor call running in the background"""
+
+    def __init__(self):
+        self.future: Optional[Future] = None
+        self._updates: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        self._cancelled = threading.Event()
+
+    def on_event(self, event: StreamEvent):
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        self._updates.put(("event", event))
+
+    def on_status(self, status: str):
+        self._updates.put(("status", status))
+
+    def poll(self, timeout: Optional[float] = None) -> List[Tuple[str, Any]]:
+        """
+        The updates queued since the last poll, as ("event", StreamEvent) and
+        ("status", str) pairs. Waits up to `timeout` seconds for the first one.
+        """
+        updates = []
+        try:
+            updates.append(self._updates.get(timeout=timeout) if timeout else self._updates.get_nowait())
+            while True:
+                updates.append(self._updates.get_nowait())
+        except queue.Empty:
+            pass
+        return updates
+
+    def cancel(self):
+        """Stop the call at its next streamed token or node boundary"""
+        self._cancelled.set()
+        if self.future:
+            self.future.cancel()
+
+    def add_done_callback(self, callback: Callable[[], None]):
+        """Call `callback` in the worker once the call has stopped, at once if it already has"""
+        self.future.add_done_callback(lambda _: callback())
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def result(self) -> Dict[str, Any]:
+        """The processor's status dict; raises the call's exception (JobCancelled when cancelled)"""
+        if self.future.cancelled():
+            raise JobCancelled()
+        return self.future.result()
+
+
+class WorkerPool:
+    """Thread pool running processor calls; one instance is shared by every session"""
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="arch-worker")
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.running = 0
+
+    def _run(self, job: Job, method: Callable[..., Dict[str, Any]], args: Tuple) -> Dict[str, Any]:
+        with self._lock:
+            self.running += 1
+        try:
+            if job.cancelled:
+                raise JobCancelled()
+            return method(*args, status_callback=job.on_status, event_callback=job.on_event)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def submit(self, method: Callable[..., Dict[str, Any]], *args: Any) -> Job:
+        """
+        Run e.g. `processor.start_processing` or `processor.continue_with_feedback`
+        with `args` in the background
+        """
+        job = Job()
+        job.future = self._executor.submit(self._run, job, method, args)
+        with self._lock:
+            self.submitted += 1
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"submitted": self.submitted, "running": self.running}
+
+
+# Module-level pool: Streamlit imports this module once per server process
+worker_pool = WorkerPool()
@@ -1,139 +1,469 @@
-from langgraph.graph import StateGraph, END, START, add_messages
-from langchain.prompts import ChatPromptTemplate
-from langchain.chat_models import init_chat_model
-from langgraph.types import interrupt , Command , Literal
-from langchain_core.messages import SystemMessage, HumanMessage
-from langgraph.checkpoint.memory import MemorySaver
-from prompt import REFINE_PROMPT, ARCH_GEN_PROMPT, ARCH_UPDATE_PROMPT, MERMAID_PROMPT
-from schema import AgentState, HumanFeedback
+from prompt import REFINE_PROMPT, LIGHT_REFINE_PROMPT, ARCH_GEN_PROMPT, ARCH_UPDATE_PROMPT, ARCH_SECTION_UPDATE_PROMPT, ARCH_SECTION_GEN_PROMPT, ARCH_MERGE_PROMPT, MERMAID_PROMPT, MERMAID_FIX_PROMPT, REVIEW_PROMPT
+from schema import AgentState, HumanFeedback, ArchitectureModel
+from backends import get_llm
+from speculative import Speculator
+from feedback_classifier import FeedbackClassifier
+from sections import SECTION_TITLES, split_sections, select_sections, splice_sections, outline, estimate_tokens
+from mermaid_compiler import extract_architecture_model, compile_mermaid, merge_architecture_models
+from mermaid_validator import MermaidRepairer, repair as repair_mermaid
+from input_quality import InputRouter, apply_corrections
+import semantic_cache
+from functools import lru_cache
+from typing import Optional, Tuple
+import asyncio
 import os
+import time
 
+# langchain and langgraph are imported where they are first needed, so importing
+# this module stays cheap and the model is only created (by backends.get_llm) on first use
 
 
-# Initialize LLM
-llm = init_chat_model("gpt-4o-mini", model_provider="openai")
-# initialize Prompt 
-refine_prompt = ChatPromptTemplate.from_template(REFINE_PROMPT)
-architecture_gen_prompt = ChatPromptTemplate.from_template(ARCH_GEN_PROMPT)
-architecture_update_prompt = ChatPromptTemplate.from_template(ARCH_UPDATE_PROMPT)
-mermaid_prompt = ChatPromptTemplate.from_template(MERMAID_PROMPT)
 
+@lru_cache(maxsize=None)
+def _prompt(template: Tuple[str, str]):
+    """ChatPromptTemplate for one of the (system, human) prompt.py templates, built on first use"""
+    from langchain.prompts import ChatPromptTemplate
+    system, human = template
+    return ChatPromptTemplate.from_messages([("system", system), ("human", human)])
 
 
 
-def refine_description(state: AgentState) -> AgentState:
-    """Refine and improve the project description using LLM"""
-    chain = refine_prompt | llm
-    refined = chain.invoke({"raw_input": state["raw_input"]})
+
+def _unstreamed(template: Tuple[str, str], node: str):
+    """Chain whose tokens stay out of the message stream; the node's message is emitted when it finishes"""
+    from langgraph.constants import TAG_NOSTREAM
+    return _prompt(template) | get_llm(node).with_config(tags=[TAG_NOSTREAM])
+
+# Decides locally whether a description needs the full, a light or no refinement
+input_router = InputRouter()
+
+def adaptive_refine_enabled() -> bool:
+    return os.getenv("ARCH_ADAPTIVE_REFINE", "0") == "1"
+
+def assess_input(state: AgentState) -> AgentState:
+    """Assess the raw description and record the refine route; a polished spec is used as it is"""
+    assessment = input_router.assess(state["raw_input"])
+    reasons = ", ".join(assessment.reasons)
+    if assessment.route != "skip":
+        print(f"===== Input assessment: {assessment.route} refinement ({reasons}) =====")
+        return {"input_assessment": assessment.as_dict()}
+    print(f"===== Input assessment: skipping refinement ({reasons}, ~{assessment.refine_tokens} output tokens saved) =====")
     return {
-        "refined_description": refined.content,
+        "input_assessment": assessment.as_dict(),
+        "refined_description": state["raw_input"],
         "messages": [{
             "role": "assistant",
-            "content": f"Reined project description:\n\n{refined.content}" 
+            "content": f"The project description is already structured ({reasons}); using it as it is.",
+            "artifact": "refined_description"
         }],
         "current_state": "refined_description",
         "next_state": "architecture"
     }
 
-def generate_architecture(state: AgentState) -> AgentState:
-    """Generate architecture specification using LLM"""
+def route_after_assess(state: AgentState) -> str:
+    return "architecture" if state["input_assessment"]["route"] == "skip" else "refine"
+
+def _refine_update(refined: str) -> AgentState:
+    return {
+        "refined_description": refined,
+        "messages": [{
+            "role": "assistant",
+            "content": f"Reined project description:\n\n{refined}",
+            "artifact": "refined_description"
+        }],
+        "current_state": "refined_description",
+        "next_state": "architecture"
+    }
+
+# Serves near-duplicate descriptions from earlier results (opt-in with ARCH_SEMANTIC_CACHE=1)
+similar_requests = semantic_cache.SemanticCache()
+
+def _similar_result(step: str, text: str):
+    """The result stored for a similar `text`, or None (always None when the cache is disabled)"""
+    if not semantic_cache.enabled():
+        return None
+    hit = similar_requests.lookup(step, text)
+    if hit is None:
+        return None
+    print(f"===== Reusing the {step} result of a similar request (similarity {hit.similarity:.2f}) =====")
+    return hit.value
+
+def _remember_result(step: str, text: str, value):
+    if semantic_cache.enabled():
+        similar_requests.add(step, text, value)
+
+def _light_refine(state: AgentState) -> bool:
+    return state.get("input_assessment", {}).get("route") == "light"
+
+def _corrected(state: AgentState, answer: str, seconds: float) -> str:
+    """The raw description with the corrections of a light refinement applied"""
+    refined, applied = apply_corrections(state["raw_input"], answer)
+    input_router.record_light_refine(state["input_assessment"], estimate_tokens(answer), seconds)
+    print(f"===== Light refinement: {applied} corrections (~{estimate_tokens(answer)} of "
+          f"~{state['input_assessment']['refine_tokens']} output tokens) =====")
+    return refined
+
+def refine_description(state: AgentState) -> AgentState:
+    """Refine and improve the project description using LLM"""
+    refined = _similar_result("refine", state["raw_input"])
+    if refined is None:
+        started = time.perf_counter()
+        if _light_refine(state):
+            chain = _unstreamed(LIGHT_REFINE_PROMPT, "refine")
+            answer = chain.invoke({"raw_input": state["raw_input"]}).content
+            refined = _corrected(state, answer, time.perf_counter() - started)
+        else:
+            chain = _prompt(REFINE_PROMPT) | get_llm("refine")
+            refined = chain.invoke({"raw_input": state["raw_input"]}).content
+            input_router.record_full_refine(estimate_tokens(refined), time.perf_counter() - started)
+        _remember_result("refine", state["raw_input"], refined)
+    return _refine_update(refined)
+
+async def arefine_description(state: AgentState) -> AgentState:
+    """Async version of refine_description"""
+    refined = _similar_result("refine", state["raw_input"])
+    if refined is None:
+        started = time.perf_counter()
+        if _light_refine(state):
+            chain = _unstreamed(LIGHT_REFINE_PROMPT, "refine")
+            answer = (await chain.ainvoke({"raw_input": state["raw_input"]})).content
+            refined = _corrected(state, answer, time.perf_counter() - started)
+        else:
+            chain = _prompt(REFINE_PROMPT) | get_llm("refine")
+            refined = (await chain.ainvoke({"raw_input": state["raw_input"]})).content
+            input_router.record_full_refine(estimate_tokens(refined), time.perf_counter() - started)
+        _remember_result("refine", state["raw_input"], refined)
+    return _refine_update(refined)
+
+def _feedback_text(state: AgentState) -> str:
+    specific_feedback = state["human_feedback"][-1].get("specific_feedback", "")
+    return specific_feedback.specific_feedback if hasattr(specific_feedback, "specific_feedback") else specific_feedback
+
+def _full_update_request(state: AgentState):
+    print("===== Updating architecture based on feedback =====")
+    chain = _prompt(ARCH_UPDATE_PROMPT) | get_llm("architecture")
+    return chain, {
+        "architecture_spec": state["architecture_spec"],
+        "human_feedback": _feedback_text(state)
+    }, {"mode": "update"}
+
+def _architecture_request(state: AgentState):
+    """
+    Pick the chain for the current state and build its inputs.
+
+    On negative feedback only the sections the feedback maps to are sent for
+    regeneration; a full update is used when the spec has no numbered sections
+    or most of them are affected.
+    """
     human_feedback_list = state.get("human_feedback", [])
     
     if human_feedback_list and not human_feedback_list[-1].get("is_satisfied", True):
-        print("===== Updating architecture based on feedback =====")
-        specific_feedback = human_feedback_list[-1].get("specific_feedback", "")
-        feedback_text = specific_feedback.specific_feedback if hasattr(specific_feedback, "specific_feedback") else specific_feedback
-        
-        chain = architecture_update_prompt | llm
-        arch_spec = chain.invoke({
-            "architecture_spec": state["architecture_spec"],
+        feedback_text = _feedback_text(state)
+        _, sections = split_sections(state["architecture_spec"])
+        selected = select_sections(feedback_text, sections)
+        if not selected:
+            return _full_update_request(state)
+
+        affected = "\n".join(sections[number].text for number in selected)
+        print(f"===== Updating sections {', '.join(map(str, selected))} of {len(sections)} "
+              f"(~{estimate_tokens(affected)} of {estimate_tokens(state['architecture_spec'])} spec tokens) =====")
+        chain = _prompt(ARCH_SECTION_UPDATE_PROMPT) | get_llm("architecture")
+        return chain, {
+            "sections": affected,
+            "outline": outline(sections, selected),
             "human_feedback": feedback_text
-        })
-        
-        return {
-            "architecture_spec": arch_spec.content,
-            "messages": [{
-                "role": "assistant",
-                "content": f"Updated architecture specification based on your feedback:\n\n{arch_spec.content}"              
-            }],
-            "human_feedback": [],
-            "current_state": "architecture",
-            "next_state": "human_review"
-        }
+        }, {"mode": "sections", "sections": selected}
     else: 
         print("===== Generating initial architecture =====")
-        chain = architecture_gen_prompt | llm
-        arch_spec = chain.invoke({"refined_description": state["refined_description"]})
-        
+        chain = _prompt(ARCH_GEN_PROMPT) | get_llm("architecture")
+        return chain, {"refined_description": state["refined_description"]}, {"mode": "generate"}
+
+def _architecture_update(arch_spec: str, model, plan: dict) -> AgentState:
+    architecture_model = model.model_dump() if model else {}
+    if plan["mode"] != "generate":
         return {
-            "architecture_spec": arch_spec.content,
+            "architecture_spec": arch_spec,
+            "architecture_model": architecture_model,
             "messages": [{
                 "role": "assistant",
-                "content": f"Generated architecture specification:\n\n{arch_spec.content}"
+                "content": f"Updated architecture specification based on your feedback:\n\n{arch_spec}",
+                "artifact": "architecture_spec"
             }],
+            "human_feedback": [],
             "current_state": "architecture",
             "next_state": "human_review"
         }
+    return {
+        "architecture_spec": arch_spec,
+        "architecture_model": architecture_model,
+        "messages": [{
+            "role": "assistant",
+            "content": f"Generated architecture specification:\n\n{arch_spec}",
+            "artifact": "architecture_spec"
+        }],
+        "current_state": "architecture",
+        "next_state": "human_review"
+    }
 
-def generate_mermaid(state: AgentState) -> AgentState:
-    """Generate Mermaid diagram code using LLM"""
-    chain = mermaid_prompt | llm
-    mermaid_code = chain.invoke({"architecture_spec": state["architecture_spec"]})
-    
+def _spliced_model(state: AgentState, arch_spec: str, model):
+    """The component model of a section update merged into the model of the whole architecture"""
+    if not state.get("architecture_model"):
+        return model
+    previous = ArchitectureModel.model_validate(state["architecture_model"])
+    return merge_architecture_models(previous, model, state["architecture_spec"], arch_spec)
+
+def generate_architecture(state: AgentState) -> AgentState:
+    """Generate architecture specification (and its component model) using LLM"""
+    chain, inputs, plan = _architecture_request(state)
+    if plan["mode"] == "generate":
+        # Only initial generations are shared; updates depend on one user's feedback
+        cached = _similar_result("architecture", state["refined_description"])
+        if cached is None:
+            cached = extract_architecture_model(chain.invoke(inputs).content)
+            _remember_result("architecture", state["refined_description"], cached)
+        return _architecture_update(*cached, plan)
+    arch_spec, model = extract_architecture_model(chain.invoke(inputs).content)
+    if plan["mode"] == "sections":
+        arch_spec = splice_sections(state["architecture_spec"], arch_spec, plan["sections"])
+        if arch_spec is None:
+            # The model did not return every requested section; regenerate the whole spec
+            chain, inputs, plan = _full_update_request(state)
+            arch_spec, model = extract_architecture_model(chain.invoke(inputs).content)
+        else:
+            model = _spliced_model(state, arch_spec, model)
+    return _architecture_update(arch_spec, model, plan)
+
+async def agenerate_architecture(state: AgentState) -> AgentState:
+    """Async version of generate_architecture"""
+    chain, inputs, plan = _architecture_request(state)
+    if plan["mode"] == "generate":
+        cached = _similar_result("architecture", state["refined_description"])
+        if cached is None:
+            cached = extract_architecture_model((await chain.ainvoke(inputs)).content)
+            _remember_result("architecture", state["refined_description"], cached)
+        return _architecture_update(*cached, plan)
+    arch_spec, model = extract_architecture_model((await chain.ainvoke(inputs)).content)
+    if plan["mode"] == "sections":
+        arch_spec = splice_sections(state["architecture_spec"], arch_spec, plan["sections"])
+        if arch_spec is None:
+            chain, inputs, plan = _full_update_request(state)
+            arch_spec, model = extract_architecture_model((await chain.ainvoke(inputs)).content)
+        else:
+            model = _spliced_model(state, arch_spec, model)
+    return _architecture_update(arch_spec, model, plan)
+
+# Parallel generation of the initial architecture, one node run per section
+def parallel_sections_enabled() -> bool:
+    return os.getenv("ARCH_PARALLEL_SECTIONS", "0") == "1"
+
+
+def fan_out_sections(state: AgentState):
+    """Send every numbered section of the specification to its own `arch_section` run"""
+    from langgraph.types import Send
+    print(f"===== Generating {len(SECTION_TITLES)} architecture sections in parallel =====")
+    return [
+        Send("arch_section", {"refined_description": state["refined_description"], "number": number, "title": title})
+        for number, title in enumerate(SECTION_TITLES, 1)
+    ]
+
+def _fan_out_after_assess(state: AgentState):
+    """route_after_assess for the parallel graph: a skipped refinement fans out to the sections at once"""
+    return fan_out_sections(state) if route_after_assess(state) == "architecture" else "refine"
+
+def _section_request(task: dict):
+    heading = f"## {task['number']}. {task['title']}"
+    return heading, {"refined_description": task["refined_description"], "section": heading}
+
+def _section_draft(task: dict, heading: str, answer: str) -> AgentState:
+    text, _ = extract_architecture_model(answer)
+    _, sections = split_sections(text)
+    # Keep only the requested section; restore its heading when the model left it out
+    text = sections[task["number"]].text if task["number"] in sections else f"{heading}\n{text.strip()}\n"
+    return {"section_drafts": [{"number": task["number"], "text": text}]}
+
+def generate_section(task: dict) -> AgentState:
+    """Write one section of the initial architecture from the refined description"""
+    heading, inputs = _section_request(task)
+    return _section_draft(task, heading, _unstreamed(ARCH_SECTION_GEN_PROMPT, "architecture").invoke(inputs).content)
+
+async def agenerate_section(task: dict) -> AgentState:
+    """Async version of generate_section"""
+    heading, inputs = _section_request(task)
+    return _section_draft(task, heading, (await _unstreamed(ARCH_SECTION_GEN_PROMPT, "architecture").ainvoke(inputs)).content)
+
+def _joined_drafts(state: AgentState) -> str:
+    drafts = sorted(state["section_drafts"], key=lambda draft: draft["number"])
+    print(f"===== Merging {len(drafts)} sections (~{sum(estimate_tokens(d['text']) for d in drafts)} tokens) =====")
+    return "\n".join(draft["text"] for draft in drafts)
+
+def _merged_update(arch_spec: str, answer: str) -> AgentState:
+    """Splice the sections the merge call revised into the spec; the answer also carries the component model"""
+    revised, model = extract_architecture_model(answer)
+    _, drafted = split_sections(arch_spec)
+    numbers = [number for number in split_sections(revised)[1] if number in drafted]
+    if numbers:
+        print(f"===== Revised sections {', '.join(map(str, numbers))} for consistency =====")
+        arch_spec = splice_sections(arch_spec, revised, numbers)
+    update = _architecture_update(arch_spec, model, {"mode": "generate"})
+    update["section_drafts"] = []
+    return update
+
+def merge_sections(state: AgentState) -> AgentState:
+    """Join the section drafts, make them consistent and derive the component model"""
+    arch_spec = _joined_drafts(state)
+    return _merged_update(arch_spec, _unstreamed(ARCH_MERGE_PROMPT, "architecture").invoke({"architecture_spec": arch_spec}).content)
+
+async def amerge_sections(state: AgentState) -> AgentState:
+    """Async version of merge_sections"""
+    arch_spec = _joined_drafts(state)
+    answer = (await _unstreamed(ARCH_MERGE_PROMPT, "architecture").ainvoke({"architecture_spec": arch_spec})).content
+    return _merged_update(arch_spec, answer)
+
+def _invoke_mermaid_chain(architecture_spec: str) -> str:
+    """Run the Mermaid chain outside the graph (used for speculative generation)"""
+    chain = _prompt(MERMAID_PROMPT) | get_llm("mermaid")
+    return chain.invoke({"architecture_spec": architecture_spec}).content
+
+# Speculative Mermaid generation, started by ArchitectureProcessor while the graph waits at human_review
+mermaid_speculator = Speculator(_invoke_mermaid_chain)
+
+# Validates and repairs LLM-written Mermaid code before it reaches the browser
+mermaid_repairer = MermaidRepairer()
+
+def _repair_mermaid(mermaid_code: str):
+    """Locally repaired code, and the LLM fix chain input when the repair was not enough"""
+    result = mermaid_repairer.repair(mermaid_code)
+    fixed = sorted({issue.code for issue in result.issues} - {issue.code for issue in result.remaining})
+    if fixed:
+        print(f"===== Repaired Mermaid code: {', '.join(fixed)} =====")
+    if result.valid:
+        return result.code, None
+    print("===== Mermaid code still invalid, asking the LLM to fix it =====")
+    return result.code, {
+        "mermaid_code": result.code,
+        "errors": "\n".join(f"- {issue}" for issue in result.remaining),
+    }
+
+def _fixed_mermaid(fixed_code: str) -> str:
+    result = repair_mermaid(fixed_code)
+    mermaid_repairer.record_llm_fix(result)
+    if not result.valid:
+        print(f"===== Mermaid code still has {len(result.remaining)} issue(s) after the LLM fix =====")
+    return result.code
+
+def _checked_mermaid(mermaid_code: str) -> str:
+    """Repair generated Mermaid code, asking the LLM for a targeted fix as a last resort"""
+    mermaid_code, fix_input = _repair_mermaid(mermaid_code)
+    if fix_input is None:
+        return mermaid_code
+    chain = _prompt(MERMAID_FIX_PROMPT) | get_llm("mermaid")
+    return _fixed_mermaid(chain.invoke(fix_input).content)
+
+async def _achecked_mermaid(mermaid_code: str) -> str:
+    """Async version of _checked_mermaid"""
+    mermaid_code, fix_input = _repair_mermaid(mermaid_code)
+    if fix_input is None:
+        return mermaid_code
+    chain = _prompt(MERMAID_FIX_PROMPT) | get_llm("mermaid")
+    return _fixed_mermaid((await chain.ainvoke(fix_input)).content)
+
+def _mermaid_update(mermaid_code: str) -> AgentState:
     return {
-        "mermaid_code": mermaid_code.content,
+        "mermaid_code": mermaid_code,
         "messages": [{
             "role": "assistant",
-            "content": f"Generated Mermaid JS code for visualization:\n\n{mermaid_code.content}\n\nArchitecture visualization is complete!"
+            "content": f"Generated Mermaid JS code for visualization:\n\n{mermaid_code}\n\nArchitecture visualization is complete!",
+            "artifact": "mermaid_code"
         }],
         "current_state": "mermaid_code",
         "next_state": "end"
     }
 
+def _compile_model(state: AgentState):
+    """Compile the component model to Mermaid code, or None when the state has no model"""
+    if not state.get("architecture_model"):
+        return None
+    print("===== Compiling Mermaid code from the component model =====")
+    return compile_mermaid(ArchitectureModel.model_validate(state["architecture_model"]))
+
+def _session(config) -> Optional[str]:
+    """The thread_id a node runs for, which speculative results are keyed by"""
+    return ((config or {}).get("configurable") or {}).get("thread_id")
+
+def generate_mermaid(state: AgentState, config: Optional[dict] = None) -> AgentState:
+    """Generate Mermaid diagram code from the component model, falling back to the LLM"""
+    mermaid_code = _compile_model(state)
+    if mermaid_code is not None:
+        # Compiled code is valid by construction; only LLM-written code is checked
+        return _mermaid_update(mermaid_code)
+    mermaid_code = mermaid_speculator.take(state["architecture_spec"], session=_session(config))
+    if mermaid_code is not None:
+        print("===== Using speculatively generated Mermaid code =====")
+    else:
+        chain = _prompt(MERMAID_PROMPT) | get_llm("mermaid")
+        mermaid_code = chain.invoke({"architecture_spec": state["architecture_spec"]}).content
+    return _mermaid_update(_checked_mermaid(mermaid_code))
+
+async def agenerate_mermaid(state: AgentState, config: Optional[dict] = None) -> AgentState:
+    """Async version of generate_mermaid"""
+    mermaid_code = _compile_model(state)
+    if mermaid_code is not None:
+        return _mermaid_update(mermaid_code)
+    # Waiting on the speculative future blocks, so do it off the event loop
+    mermaid_code = await asyncio.to_thread(mermaid_speculator.take, state["architecture_spec"], _session(config))
+    if mermaid_code is not None:
+        print("===== Using speculatively generated Mermaid code =====")
+    else:
+        chain = _prompt(MERMAID_PROMPT) | get_llm("mermaid")
+        mermaid_code = (await chain.ainvoke({"architecture_spec": state["architecture_spec"]})).content
+    return _mermaid_update(await _achecked_mermaid(mermaid_code))
+
 
+# Settles obvious approvals/change requests locally before asking the LLM
+feedback_classifier = FeedbackClassifier()
 
-def human_review_node(state: AgentState) -> Command:
+def _review_messages(content: str, human_response: str) -> list:
+    """Static instructions and the architecture first, the reply last (see prompt.py)"""
+    from langchain_core.messages import HumanMessage
+    return _prompt(REVIEW_PROMPT).format_messages(content=content) + [HumanMessage(content=human_response)]
+
+def _review_update(feedback: HumanFeedback) -> AgentState:
+    print(f"User satisfaction: {'Satisfied' if feedback.is_satisfied else 'Not satisfied'}")
+    return {
+        "human_feedback": [{"is_satisfied": feedback.is_satisfied, "specific_feedback": feedback}]
+    }
+
+def human_review_node(state: AgentState) -> AgentState:
     """
     Human review node that checks the current state and provides appropriate prompts.
     """
+    from langgraph.types import interrupt
     current_state = state["current_state"]
-    next_state = state["next_state"]
     content = state.get(current_state, "")
     
-    feedback_evaluator = llm.with_structured_output(HumanFeedback)
-    
     human_response = interrupt(
         {"generated_content": content, "message": "Review the architecture. Provide feedback or type 'done' if satisfied."})
     
-    messages = [
-        SystemMessage(content=f"""
-        You are an AI assistant tasked with reviewing the architecture stage of a project based on user feedback. 
-        Your goal is to evaluate the provided content and determine:
-
-        1. Whether the user is satisfied with the current architecture
-        2. What specific feedback they have provided to improve it
-
-        Architecture to review:
-        {content}
-
-        Please return your answer as a JSON object with two keys:
-        - "is_satisfied": a boolean indicating if the user is satisfied (true) or wants changes (false)
-        - "specific_feedback": a detailed description of what changes the user wants
-        """),
-        HumanMessage(content=human_response)
-    ]
+    feedback = feedback_classifier.classify(human_response)
+    if feedback is None:
+        feedback_evaluator = get_llm("review").with_structured_output(HumanFeedback)
+        feedback = feedback_evaluator.invoke(_review_messages(content, human_response))
+    return _review_update(feedback)
+
+async def ahuman_review_node(state: AgentState) -> AgentState:
+    """Async version of human_review_node"""
+    from langgraph.types import interrupt
+    current_state = state["current_state"]
+    content = state.get(current_state, "")
     
-    feedback = feedback_evaluator.invoke(messages)
+    human_response = interrupt(
+        {"generated_content": content, "message": "Review the architecture. Provide feedback or type 'done' if satisfied."})
     
-    print(f"User satisfaction: {'Satisfied' if feedback.is_satisfied else 'Not satisfied'}")
-    if not feedback.is_satisfied:
-        return {
-            "human_feedback": [{"is_satisfied": feedback.is_satisfied, "specific_feedback": feedback}]
-        }
-        
-    return {
-        "human_feedback": [{"is_satisfied": feedback.is_satisfied, "specific_feedback": feedback}]
-    }
+    feedback = feedback_classifier.classify(human_response)
+    if feedback is None:
+        feedback_evaluator = get_llm("review").with_structured_output(HumanFeedback)
+        feedback = await feedback_evaluator.ainvoke(_review_messages(content, human_response))
+    return _review_update(feedback)
 
 
 def route_after_review(state: AgentState) -> str:
@@ -157,21 +487,68 @@ def route_after_review(state: AgentState) -> str:
 
 
 # Initialize the graph
-def create_agent_graph():
-    """Create and return the agent workflow graph"""
+def create_agent_graph(checkpointer=None, use_async=False, parallel_sections=None, adaptive_refine=None):
+    """
+    Create and return the agent workflow graph.
+
+    Args:
+        checkpointer: Checkpoint saver used for state persistence, e.g. a
+            `checkpoint.SqliteCheckpointer`. Defaults to an in-process
+            `checkpoint.SharedMemorySaver` keeping the ARCH_MAX_THREADS (default
+            1000) most recently written threads.
+        use_async: Build the graph from the async node implementations. Such a
+            graph must be driven with `ainvoke`/`astream` (see AsyncArchitectureProcessor).
+        parallel_sections: Generate the initial architecture with one concurrent
+            `arch_section` run per section and an `arch_merge` node instead of a
+            single `architecture` call; updates after feedback still go through
+            `architecture`. Defaults to ARCH_PARALLEL_SECTIONS=1.
+        adaptive_refine: Start with the local `assess` node, which sends polished
+            specifications straight to architecture generation and long, clean
+            descriptions to a light refinement. Defaults to ARCH_ADAPTIVE_REFINE
+            (off unless set to 1).
+    """
+    from langgraph.graph import StateGraph, END
+
     # Initialize the graph
     workflow = StateGraph(AgentState)
 
     # Add nodes
-    workflow.add_node("refine", refine_description)
-    workflow.add_node("architecture", generate_architecture)
-    workflow.add_node("human_review", human_review_node)
-    workflow.add_node("gen_mermaid", generate_mermaid)
+    if use_async:
+        workflow.add_node("refine", arefine_description)
+        workflow.add_node("architecture", agenerate_architecture)
+        workflow.add_node("human_review", ahuman_review_node)
+        workflow.add_node("gen_mermaid", agenerate_mermaid)
+        section_nodes = (agenerate_section, amerge_sections)
+    else:
+        workflow.add_node("refine", refine_description)
+        workflow.add_node("architecture", generate_architecture)
+        workflow.add_node("human_review", human_review_node)
+        workflow.add_node("gen_mermaid", generate_mermaid)
+        section_nodes = (generate_section, merge_sections)
 
     # Define flow
-    workflow.add_edge("refine", "architecture")
+    if parallel_sections is None:
+        parallel_sections = parallel_sections_enabled()
+    if parallel_sections:
+        workflow.add_node("arch_section", section_nodes[0])
+        workflow.add_node("arch_merge", section_nodes[1])
+        workflow.add_conditional_edges("refine", fan_out_sections, ["arch_section"])
+        workflow.add_edge("arch_section", "arch_merge")
+        workflow.add_edge("arch_merge", "human_review")
+    else:
+        workflow.add_edge("refine", "architecture")
     workflow.add_edge("architecture", "human_review")
 
+    if adaptive_refine is None:
+        adaptive_refine = adaptive_refine_enabled()
+    if adaptive_refine:
+        # The assessment is local and cheap, the same node serves the async graph
+        workflow.add_node("assess", assess_input)
+        if parallel_sections:
+            workflow.add_conditional_edges("assess", _fan_out_after_assess, ["refine", "arch_section"])
+        else:
+            workflow.add_conditional_edges("assess", route_after_assess, {"refine": "refine", "architecture": "architecture"})
+
     # Add conditional routing after human review
     workflow.add_conditional_edges(
         "human_review",
@@ -185,13 +562,19 @@ def create_agent_graph():
     workflow.add_edge("gen_mermaid", END)
 
     # Set the entry point
-    workflow.set_entry_point("refine")
+    workflow.set_entry_point("assess" if adaptive_refine else "refine")
 
     # Set up checkpointer for state persistence
-    checkpointer = MemorySaver()
+    if checkpointer is None:
+        from checkpoint import SharedMemorySaver
+        checkpointer = SharedMemorySaver(max_threads=int(os.getenv("ARCH_MAX_THREADS", "1000")))
 
     # Compile the graph
     graph = workflow.compile(interrupt_before=["human_review"], checkpointer=checkpointer)
+    if parallel_sections:
+        # Room for every section run and the checkpoint writes queued next to them; the
+        # default pool (CPU count + 4 threads) would run the sections in waves on small hosts
+        graph = graph.with_config(max_concurrency=2 * len(SECTION_TITLES))
     
     return graph
 